@@ -0,0 +1,13 @@
+-- Breadcrumbs left out of BreadCrumb by trajectory simplification
+-- ($SIMPLIFY_TOLERANCE, see trajectory.py). BreadCrumb plus this table is
+-- the full trajectory; deviation is the point's distance in meters from the
+-- simplified line, so it is never above the tolerance in use.
+
+CREATE TABLE IF NOT EXISTS breadcrumb_dropped (
+        tstamp timestamp,
+        latitude float,
+        longitude float,
+        speed float,
+        trip_id integer,
+        deviation float
+);
@@ -0,0 +1,33 @@
+-- Per-trip summary, upserted by the breadcrumb pipeline (see tripStats.py).
+-- Each load merges its windows into the trip's row: points are added,
+-- timestamps/meters/speed/bounding box take the min or max, and distance,
+-- duration and avg_speed are recomputed from the merged values.
+-- Each window's part of a trip is merged once: parts already listed in
+-- trip_stats_parts are skipped, so loading the same windows again doesn't
+-- add their points twice.
+
+CREATE TABLE IF NOT EXISTS trip_stats (
+        trip_id integer,
+        points integer,
+        first_tstamp timestamp,
+        last_tstamp timestamp,
+        min_meters float,
+        max_meters float,
+        distance float,         -- meters, max_meters - min_meters
+        duration float,         -- seconds, last_tstamp - first_tstamp
+        avg_speed float,        -- meters/second, distance / duration
+        max_speed float,        -- meters/second
+        min_latitude float,
+        max_latitude float,
+        min_longitude float,
+        max_longitude float,
+        PRIMARY KEY (trip_id)
+);
+
+CREATE TABLE IF NOT EXISTS trip_stats_parts (
+        trip_id integer,
+        first_tstamp timestamp,
+        last_tstamp timestamp,
+        points integer,
+        PRIMARY KEY (trip_id, first_tstamp, last_tstamp, points)
+);
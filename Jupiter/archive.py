@@ -0,0 +1,291 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from decoder import decode_messages, parse_service_dates
+
+# Archive files for the breadcrumb messages.
+#
+# Messages are appended to a gzip-compressed NDJSON segment (one JSON string
+# per line) as they arrive, instead of being dumped as one big JSON document
+# after the window closes. At a window boundary the segment is sealed: the
+# gzip trailer is written, the file is fsync'd and renamed from '.part' to its
+# final name, so anything without the '.part' suffix is complete and safe to
+# upload.
+
+SEGMENT_SUFFIX = ".ndjson.gz"
+PARTIAL_SUFFIX = ".part"
+
+# Decoded windows are archived as Parquet: typed columns, zstd compression,
+# and row groups sorted by vehicle, trip and time so the min/max statistics
+# Parquet keeps per row group let readers skip everything they don't need.
+COLUMNAR_SUFFIX = ".parquet"
+COLUMNAR_SORT = ['VEHICLE_ID', 'EVENT_NO_TRIP', 'ACT_TIME']
+ROW_GROUP_SIZE = 50_000
+
+# Extra column stored only in the columnar archive, so row groups carry a
+# real time range (OPD_DATE + ACT_TIME) in their statistics
+EVENT_TIME = 'EVENT_TIME'
+
+# Columnar windows are split into partitions:
+#   breadcrumb_data/service_date=2025-05-08/hour=13/[shard=3/]data-<window>.parquet
+ARCHIVE_PREFIX = "breadcrumb_data"
+UNKNOWN_PARTITION = "unknown"
+
+# Where the subscriber writes segments, Parquet partitions and manifests
+# before they are uploaded (relative to the working directory)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive-spool")
+
+
+class RollingArchiveWriter:
+    """
+    Appends messages to the current segment file and rotates it at window boundaries.
+    Safe to call write() from the subscriber's callback threads.
+    """
+    def __init__(self, directory, prefix="data", fsync_interval=5.0, compresslevel=6):
+        self.directory = directory
+        self.prefix = prefix
+        self.fsync_interval = fsync_interval
+        self.compresslevel = compresslevel
+
+        self._lock = threading.Lock()
+        self._raw = None
+        self._gz = None
+        self._path = None
+        self._count = 0
+        self._last_sync = 0.0
+
+    def open(self, stamp):
+        """Starts a new segment named '<prefix>-<stamp>.ndjson.gz'."""
+        with self._lock:
+            self._open(stamp)
+
+    def write(self, message):
+        with self._lock:
+            if self._gz is None:
+                # A message arrived between windows; start a segment for it
+                self._open(time.strftime('%Y-%m-%d_%H-%M-%S'))
+
+            self._gz.write(json.dumps(message).encode('utf-8'))
+            self._gz.write(b"\n")
+            self._count += 1
+
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def seal(self):
+        """
+        Closes the current segment and returns (path, message_count),
+        or (None, 0) if no segment is open.
+        """
+        with self._lock:
+            return self._seal()
+
+    def rotate(self, next_stamp):
+        """Seals the current segment and opens the next one in a single step."""
+        with self._lock:
+            sealed = self._seal()
+            self._open(next_stamp)
+            return sealed
+
+    def _open(self, stamp):
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"{self.prefix}-{stamp}{SEGMENT_SUFFIX}")
+        self._raw = open(self._path + PARTIAL_SUFFIX, "wb")
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=self.compresslevel)
+        self._count = 0
+        self._last_sync = time.monotonic()
+
+    def _sync(self):
+        # Z_SYNC_FLUSH keeps everything written so far decodable if we crash
+        self._gz.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._last_sync = time.monotonic()
+
+    def _seal(self):
+        if self._gz is None:
+            return None, 0
+
+        self._gz.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self._path + PARTIAL_SUFFIX, self._path)
+
+        sealed = (self._path, self._count)
+        self._raw = None
+        self._gz = None
+        self._path = None
+        self._count = 0
+        return sealed
+
+
+def write_columnar(df, file_path, compression="zstd", row_group_size=ROW_GROUP_SIZE):
+    """
+    Writes a decoded breadcrumb DataFrame to a Parquet file.
+    Returns the number of rows written.
+    """
+    columnar = df if EVENT_TIME in df.columns else add_event_time(df)
+    sort_by = [col for col in COLUMNAR_SORT if col in columnar.columns]
+    columnar = columnar.sort_values(sort_by, kind='stable')
+
+    # OPD_DATE only has a handful of distinct values per window
+    columnar['OPD_DATE'] = columnar['OPD_DATE'].astype('category')
+
+    columnar.to_parquet(
+        file_path,
+        engine="pyarrow",
+        compression=compression,
+        index=False,
+        row_group_size=row_group_size,
+    )
+    return len(columnar)
+
+
+def add_event_time(df):
+    """Returns a copy of df with the EVENT_TIME column (OPD_DATE + ACT_TIME)."""
+    return df.assign(**{
+        EVENT_TIME: parse_service_dates(df['OPD_DATE']) + pd.to_timedelta(df['ACT_TIME'], unit='s')
+    })
+
+
+def partition_path(service_date, hour, shard=None):
+    """Returns the partition directory, e.g. 'breadcrumb_data/service_date=2025-05-08/hour=13'."""
+    parts = [ARCHIVE_PREFIX, f"service_date={service_date}", f"hour={hour}"]
+    if shard is not None:
+        parts.append(f"shard={shard}")
+    return "/".join(parts)
+
+
+def write_partitioned(df, directory, window_id, vehicle_shards=None, compression="zstd"):
+    """
+    Splits a decoded window by service date and hour (and by VEHICLE_ID % vehicle_shards
+    if given) and writes one Parquet file per partition under `directory`.
+
+    Returns one manifest entry (dict) per file written. 'path' is the file's key
+    relative to `directory`, which is also its name in the bucket.
+    """
+    columnar = add_event_time(df)
+
+    # Partitions follow the transit service day: service_date is OPD_DATE and
+    # hour is ACT_TIME // 3600, which runs past 23 for after-midnight trips
+    service_date = parse_service_dates(columnar['OPD_DATE'])
+    hour = columnar['ACT_TIME'] // 3600
+    keys = {
+        'service_date': service_date.dt.strftime('%Y-%m-%d').fillna(UNKNOWN_PARTITION),
+        'hour': hour.map('{:02.0f}'.format, na_action='ignore').fillna(UNKNOWN_PARTITION),
+    }
+    if vehicle_shards:
+        keys['shard'] = (columnar['VEHICLE_ID'].fillna(-1) % vehicle_shards).astype(int)
+
+    entries = []
+    for key, part in columnar.groupby(list(keys.values()), sort=True):
+        service_date, hour = key[0], key[1]
+        shard = int(key[2]) if vehicle_shards else None
+
+        relative_path = f"{partition_path(service_date, hour, shard)}/data-{window_id}{COLUMNAR_SUFFIX}"
+        local_path = os.path.join(directory, relative_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+        rows = write_columnar(part, local_path, compression=compression)
+        part_time = part[EVENT_TIME]
+        vehicles = part['VEHICLE_ID'].dropna().unique()
+
+        entries.append({
+            'path': relative_path,
+            'local_path': local_path,
+            'window': window_id,
+            'service_date': service_date,
+            'hour': hour,
+            'shard': shard,
+            'rows': rows,
+            'min_time': part_time.min().isoformat() if part_time.notna().any() else None,
+            'max_time': part_time.max().isoformat() if part_time.notna().any() else None,
+            'vehicles': sorted(int(v) for v in vehicles),
+            'trips': int(part['EVENT_NO_TRIP'].nunique()),
+            'bytes': os.path.getsize(local_path),
+            'sha256': file_checksum(local_path),
+        })
+
+    return entries
+
+
+def file_checksum(file_path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_columnar(file_path, columns=None, filters=None):
+    """
+    Reads a Parquet archive back into the DataFrame layout produced by decoder.decode_messages.
+    `columns` limits which columns are read, and `filters` (pyarrow DNF, e.g.
+    [('VEHICLE_ID', '=', 3010)]) skips row groups whose statistics can't match.
+    """
+    df = pd.read_parquet(file_path, engine="pyarrow", columns=columns, filters=filters)
+    return _decoded_layout(df, columns)
+
+
+def iter_columnar(file_path, columns=None, filters=None, batch_rows=ROW_GROUP_SIZE):
+    """
+    Like read_columnar, but yields the file in DataFrames of at most `batch_rows`
+    rows, in file order (sorted by COLUMNAR_SORT), so a large file never has to
+    be in memory at once.
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    dataset = ds.dataset(file_path, format="parquet")
+    expression = pq.filters_to_expression(filters) if filters else None
+
+    for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_rows):
+        if batch.num_rows:
+            yield _decoded_layout(batch.to_pandas(), columns)
+
+
+def _decoded_layout(df, columns):
+    if 'OPD_DATE' in df.columns:
+        df['OPD_DATE'] = df['OPD_DATE'].astype(str)
+    if columns is None or EVENT_TIME not in columns:
+        df = df.drop(columns=[EVENT_TIME], errors='ignore')
+
+    return df.reset_index(drop=True)
+
+
+def read_archive(file_path):
+    """
+    Returns the list of raw message strings stored in an archive file.
+    Reads both NDJSON segments and the older '{"messages": [...]}' JSON dumps.
+    """
+    if file_path.endswith(SEGMENT_SUFFIX):
+        with gzip.open(file_path, "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+
+    messages = payload.get("messages")
+    if not isinstance(messages, list):
+        raise ValueError(
+            f"{file_path} must contain a top-level 'messages' array"
+        )
+    return messages
+
+
+def read_archive_frame(file_path, columns=None, filters=None):
+    """
+    Returns the decoded DataFrame for any archive file: Parquet windows are read
+    directly, raw segments and JSON dumps go through decoder.decode_messages.
+    """
+    if file_path.endswith(COLUMNAR_SUFFIX):
+        return read_columnar(file_path, columns=columns, filters=filters)
+
+    return decode_messages(read_archive(file_path), columns)
@@ -0,0 +1,314 @@
+import contextlib
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dataValidation import Validation
+from legacyValidation import LegacyValidation
+import commonPath
+from common.tripInterpolation import TripGroups
+from common.validationEngine import ValidationEngine
+from breadcrumbRules import BREADCRUMB_RULES
+from transformer import Transformer
+from decoder import decode_messages
+from stages import DECODE_COLUMNS
+from compactTypes import compact_frame, widen_for_insert
+from trajectory import simplify, METERS_PER_DEGREE
+from frameBackend import BACKENDS, frame_backend
+
+# Benchmarks for the breadcrumb pipeline on synthetic windows.
+#
+#   python benchmark.py validation [rows]
+#   python benchmark.py interpolation [rows]
+#   python benchmark.py fastpath [rows]
+#   python benchmark.py speed [rows]
+#   python benchmark.py projection [rows]
+#   python benchmark.py compact [rows]
+#   python benchmark.py simplify [rows]
+#   python benchmark.py backends [rows]
+
+SERVICE_DATES = np.array(['07MAY2025:00:00:00', '08MAY2025:00:00:00'])
+
+
+def make_window(rows=1_000_000, trips=5_000, dirty=0.01, seed=0):
+    """
+    Builds a decoded breadcrumb window (the output of decoder.decode_messages)
+    with `rows` breadcrumbs spread over `trips` trips, interleaved in ACT_TIME
+    order like a real Pub/Sub window. `dirty` is the fraction of rows with an
+    out-of-range coordinate or negative METERS.
+    """
+    rng = np.random.default_rng(seed)
+
+    trip = np.sort(rng.integers(0, trips, rows))
+    starts = np.r_[0, np.flatnonzero(np.diff(trip)) + 1]
+    lengths = np.diff(np.r_[starts, rows])
+    position = np.arange(rows) - np.repeat(starts, lengths)
+
+    trip_start_time = rng.integers(18_000, 80_000, trips)
+    act_time = trip_start_time[trip] + 5 * position
+    odometer = np.cumsum(rng.integers(0, 80, rows))
+    meters = odometer - np.repeat(odometer[starts], lengths)
+
+    df = pd.DataFrame({
+        'EVENT_NO_TRIP': 220_000_000 + trip,
+        'EVENT_NO_STOP': 220_000_000 + trip * 10 + position // 50,
+        'OPD_DATE': SERVICE_DATES[trip % len(SERVICE_DATES)],
+        'VEHICLE_ID': 3000 + trip % 600,
+        'METERS': meters,
+        'ACT_TIME': act_time,
+        'GPS_LONGITUDE': -122.7 + rng.random(trips)[trip] * 0.2 + position * 1e-5,
+        'GPS_LATITUDE': 45.4 + rng.random(trips)[trip] * 0.2 + position * 1e-5,
+        'GPS_SATELLITES': rng.integers(4, 13, rows).astype(float),
+        'GPS_HDOP': rng.random(rows) * 2,
+    })
+
+    bad = rng.random(rows) < dirty
+    which = rng.integers(0, 3, rows)
+    df.loc[bad & (which == 0), 'GPS_LATITUDE'] = 0.0
+    df.loc[bad & (which == 1), 'GPS_LONGITUDE'] = 0.0
+    df.loc[bad & (which == 2), 'METERS'] = -1
+
+    return df.sort_values('ACT_TIME', kind='stable').reset_index(drop=True)
+
+
+def timed(func, *args, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def legacy_validate(df):
+    """The baseline validateBeforeTransform (legacyValidation): nine methods, each rescanning the frame."""
+    validator = LegacyValidation(df.copy())
+    validator.validateBeforeTransform()
+    return validator.get_dataframe()
+
+
+def engine_validate(df):
+    validator = Validation(df.copy())
+    validator.validateBeforeTransform()
+    return validator.get_dataframe()
+
+
+def benchmark_validation(rows):
+    df = make_window(rows)
+    legacy_seconds, legacy_df = timed(legacy_validate, df, repeat=1)
+    engine_seconds, engine_df = timed(engine_validate, df)
+
+    # The baseline interpolates across the whole window, so the repaired
+    # values of the dirty rows differ; everything else must match
+    columns = ['GPS_LATITUDE', 'GPS_LONGITUDE', 'METERS', 'EVENT_NO_TRIP', 'EVENT_NO_STOP']
+    legacy_values = legacy_df[columns].to_numpy(float)
+    engine_values = engine_df[columns].to_numpy(float)
+    dirty = (df[columns].to_numpy(float) != engine_values).any(axis=1)
+    same = np.allclose(legacy_values[~dirty], engine_values[~dirty], equal_nan=True)
+
+    print(f"validation, {rows} rows")
+    print(f"  legacy: {legacy_seconds:.3f}s")
+    print(f"  engine: {engine_seconds:.3f}s ({legacy_seconds / engine_seconds:.1f}x)")
+    print(f"  same rows: {len(legacy_df) == len(engine_df)}, same clean values: {same}")
+
+
+def groupby_interpolate(df, column):
+    """Per-trip interpolation with a Python callback per trip."""
+    ordered = df.sort_values(['EVENT_NO_TRIP', 'ACT_TIME'], kind='stable')
+    repaired = (
+        ordered
+        .groupby('EVENT_NO_TRIP', group_keys=False)[column]
+        .apply(lambda values: values.interpolate(method='linear', limit_direction='both'))
+    )
+    return repaired.sort_index().to_numpy()
+
+
+def kernel_interpolate(df, column):
+    return TripGroups(df['EVENT_NO_TRIP'], df['ACT_TIME']).interpolate(df[column])
+
+
+def benchmark_interpolation(rows):
+    df = make_window(rows)
+    df['GPS_LATITUDE'] = df['GPS_LATITUDE'].where(df['GPS_LATITUDE'] >= 45)
+
+    groupby_seconds, groupby_values = timed(groupby_interpolate, df, 'GPS_LATITUDE')
+    kernel_seconds, kernel_values = timed(kernel_interpolate, df, 'GPS_LATITUDE')
+
+    print(f"per-trip interpolation, {rows} rows, {df['GPS_LATITUDE'].isna().sum()} gaps")
+    print(f"  groupby.apply: {groupby_seconds:.3f}s")
+    print(f"  TripGroups:    {kernel_seconds:.3f}s ({groupby_seconds / kernel_seconds:.1f}x)")
+    print(f"  same output: {np.allclose(groupby_values, kernel_values, equal_nan=True)}")
+
+
+def benchmark_fastpath(rows):
+    clean = make_window(rows, dirty=0.0)
+    dirty = make_window(rows)
+    full = ValidationEngine(BREADCRUMB_RULES, parent_by='VEHICLE_ID', fast_path=False)
+    fast = ValidationEngine(BREADCRUMB_RULES, parent_by='VEHICLE_ID')
+
+    print(f"clean-window fast path, {rows} rows")
+    for label, df in (('clean', clean), ('dirty', dirty)):
+        full_seconds, (full_df, _) = timed(full.run, df)
+        fast_seconds, (fast_df, _) = timed(fast.run, df)
+        print(f"  {label}: full {full_seconds:.3f}s, with fast path {fast_seconds:.3f}s "
+              f"({full_seconds / fast_seconds:.1f}x), same output: {full_df.equals(fast_df)}")
+    print(f"  fast path rate: {fast.fast_path_rate():.0%}")
+
+
+def legacy_speed(df):
+    """The previous Transformer.createSpeed: a Python function per trip."""
+    def compute_speed(group):
+        speed = group['METERS'].diff() / group['ACT_TIME'].diff()
+        if len(speed) > 1:
+            speed.iloc[0] = speed.iloc[1]
+        return speed
+
+    return (
+        df
+        .groupby('EVENT_NO_TRIP', group_keys=False)[['METERS', 'ACT_TIME']]
+        .apply(compute_speed)
+    )
+
+
+def vectorized_speed(df):
+    transformer = Transformer(df.copy())
+    transformer.createSpeed()
+    return transformer.get_dataframe()['speed']
+
+
+def benchmark_speed(rows):
+    df = make_window(rows, dirty=0.0)
+    legacy_seconds, legacy = timed(legacy_speed, df)
+    vectorized_seconds, vectorized = timed(vectorized_speed, df)
+
+    same = np.allclose(legacy.sort_index().to_numpy(), vectorized.to_numpy(), equal_nan=True)
+    print(f"createSpeed, {rows} rows, {df['EVENT_NO_TRIP'].nunique()} trips")
+    print(f"  groupby.apply: {legacy_seconds:.3f}s")
+    print(f"  vectorized:    {vectorized_seconds:.3f}s ({legacy_seconds / vectorized_seconds:.1f}x)")
+    print(f"  same output: {same}")
+
+
+def make_messages(df):
+    """The raw Pub/Sub messages (parse.Vehicle reprs) for a synthetic window."""
+    fields = [df[column].astype(str).radd(f"{column}: ") for column in df.columns]
+    return fields[0].str.cat(fields[1:], sep=', ').tolist()
+
+
+def benchmark_projection(rows):
+    messages = make_messages(make_window(rows))
+    full_seconds, full = timed(decode_messages, messages)
+    projected_seconds, projected = timed(decode_messages, messages, DECODE_COLUMNS)
+
+    full_mb = full.memory_usage(deep=True).sum() / 1e6
+    projected_mb = projected.memory_usage(deep=True).sum() / 1e6
+    same = full[list(DECODE_COLUMNS)].equals(projected)
+    print(f"decode_messages, {rows} messages")
+    print(f"  every column ({full.shape[1]}):  {full_seconds:.3f}s, {full_mb:.0f} MB")
+    print(f"  DECODE_COLUMNS ({projected.shape[1]}): {projected_seconds:.3f}s, {projected_mb:.0f} MB")
+    print(f"  same values: {same}")
+
+
+def breadcrumb_rows(df):
+    """What load_batch would insert for a decoded window, as widen_for_insert passes it on."""
+    validated, _ = ValidationEngine(BREADCRUMB_RULES, parent_by='VEHICLE_ID').run(df)
+    transformer = Transformer(validated)
+    transformer.transform()
+    return widen_for_insert(Transformer.createBreadcrumbDF(transformer.get_dataframe()))
+
+
+def benchmark_compact(rows):
+    df = make_window(rows)[list(DECODE_COLUMNS)]
+    compacted = compact_frame(df, stats=None)
+
+    def megabytes_per_million(frame):
+        return frame.memory_usage(index=False, deep=True).sum() / len(frame)
+
+    seconds, _ = timed(compact_frame, df)
+    same = breadcrumb_rows(df).equals(breadcrumb_rows(compacted))
+    print(f"compact_frame, {rows} rows ({seconds:.3f}s)")
+    for column in df.columns:
+        print(f"  {column:14} {str(df[column].dtype):8} -> {compacted[column].dtype}")
+    print(f"  default dtypes: {megabytes_per_million(df):.1f} MB per million rows")
+    print(f"  compact dtypes: {megabytes_per_million(compacted):.1f} MB per million rows")
+    print(f"  same rows inserted: {same}")
+
+
+def make_trajectories(rows=1_000_000, trips=5_000, seed=0):
+    """
+    Trip ids, times and coordinates of buses that wander (slowly turning
+    heading, 0-60 m per breadcrumb) and stand still about a fifth of the time.
+    """
+    rng = np.random.default_rng(seed)
+    trip = np.sort(rng.integers(0, trips, rows))
+    starts = np.r_[0, np.flatnonzero(np.diff(trip)) + 1]
+    position = np.arange(rows) - np.repeat(starts, np.diff(np.r_[starts, rows]))
+
+    heading = np.cumsum(rng.normal(0, 0.15, rows))
+    step = rng.integers(0, 60, rows) * (rng.random(rows) > 0.2)
+    latitude = 45.5 + np.cumsum(step * np.sin(heading)) / METERS_PER_DEGREE
+    longitude = -122.6 + np.cumsum(step * np.cos(heading)) / (METERS_PER_DEGREE * np.cos(np.radians(45.5)))
+    return trip, position * 5, latitude, longitude
+
+
+def benchmark_simplify(rows):
+    trips, times, latitude, longitude = make_trajectories(rows)
+    print(f"trajectory.simplify, {rows} breadcrumbs")
+    for tolerance in (5.0, 10.0, 25.0):
+        seconds, (keep, deviation) = timed(simplify, trips, times, latitude, longitude, tolerance)
+        print(f"  {tolerance:4.0f} m: {seconds:.3f}s, {keep.mean():.1%} of points kept, "
+              f"max deviation {np.nanmax(deviation):.2f} m")
+
+
+def validate_transform(backend, df):
+    validated, _ = backend.validate(df)
+    transformed, _ = backend.transform(validated.copy())
+    return validated, transformed
+
+
+def benchmark_backends(rows):
+    """Every backend on windows of 1%, 10% and 100% of `rows`, clean and dirty."""
+    backends = {name: frame_backend(name) for name in BACKENDS}
+    print(f"validate + transform, {' vs '.join(backends)}")
+    for size in (rows // 100, rows // 10, rows):
+        for dirty in (0.0, 0.01):
+            df = make_window(size, trips=max(size // 200, 1), dirty=dirty)[list(DECODE_COLUMNS)]
+            results = {name: timed(validate_transform, backend, df) for name, backend in backends.items()}
+            # What archive.iter_columnar hands over, read without going through pandas
+            results['polars, Arrow input'] = timed(
+                validate_transform, backends['polars'], pa.Table.from_pandas(df, preserve_index=False))
+
+            (_, expected), *others = results.values()
+            same = all(
+                validated.equals(expected[0]) and transformed.equals(expected[1])
+                for _, (validated, transformed) in others
+            )
+            times = ", ".join(f"{name} {seconds:.3f}s" for name, (seconds, _) in results.items())
+            print(f"  {size:>9} rows, {dirty:.0%} dirty: {times}, same output: {same}")
+
+
+BENCHMARKS = {
+    'validation': benchmark_validation,
+    'interpolation': benchmark_interpolation,
+    'fastpath': benchmark_fastpath,
+    'speed': benchmark_speed,
+    'projection': benchmark_projection,
+    'compact': benchmark_compact,
+    'simplify': benchmark_simplify,
+    'backends': benchmark_backends,
+}
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else 'validation'
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    BENCHMARKS[name](rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from decoder import parse_service_dates
+import commonPath
+from common.validationEngine import (
+    ValidationEngine, Check, NotNull, Range,
+    DROP, INTERPOLATE, FILL, CHECK,
+)
+
+# The breadcrumb validation rules, run by validationEngine in one pass.
+# A new check is one more entry, e.g.
+#     Range('hdop', 'GPS_HDOP', CHECK, upper=5),
+
+# Speeds (m/s) above this are interpolated by Validation.validateSpeed
+SPEED_LIMIT = 32.0
+
+
+def trip_has_many_vehicles(df):
+    return df.groupby('EVENT_NO_TRIP')['VEHICLE_ID'].transform('nunique') > 1
+
+
+def trips_have_one_vehicle(df):
+    """
+    Fast-path version of trip_has_many_vehicles: True if every row's vehicle
+    matches the first vehicle seen for its trip.
+    """
+    codes, trips = pd.factorize(df['EVENT_NO_TRIP'])
+    vehicles = pd.to_numeric(df['VEHICLE_ID'], errors='coerce').to_numpy(dtype=float)
+    known = (codes >= 0) & ~np.isnan(vehicles)
+    codes = codes[known]
+    vehicles = vehicles[known]
+
+    # Writing in reverse leaves the first vehicle of every trip
+    first = np.empty(len(trips))
+    first[codes[::-1]] = vehicles[::-1]
+    return bool((first[codes] == vehicles).all())
+
+
+def trip_vehicle_changed(index):
+    # Rows whose vehicle differs from the one recorded for the trip in
+    # earlier windows (see tripIndex.TripVehicleIndex)
+    def invalid(df):
+        return pd.Series(index.check(df['EVENT_NO_TRIP'], df['VEHICLE_ID']), index=df.index)
+    return invalid
+
+
+BREADCRUMB_RULES = [
+    NotNull('latitude_present', 'GPS_LATITUDE', DROP),
+    NotNull('longitude_present', 'GPS_LONGITUDE', DROP),
+    # Invalid dates are NaT after parsing
+    NotNull('date_format', 'OPD_DATE', FILL, convert=parse_service_dates),
+    Range('latitude_range', 'GPS_LATITUDE', INTERPOLATE, lower=45, upper=46),
+    Range('longitude_range', 'GPS_LONGITUDE', INTERPOLATE, lower=-124, upper=-122),
+    Check('trip_one_vehicle', 'EVENT_NO_TRIP', CHECK, func=trip_has_many_vehicles,
+          columns=('EVENT_NO_TRIP', 'VEHICLE_ID'), summary=trips_have_one_vehicle),
+    # A bad trip id takes the trip of the vehicle's nearest breadcrumb in
+    # time; interpolating between two trips would make up a trip id
+    Range('event_no_trip', 'EVENT_NO_TRIP', FILL, lower=0, integer=True),
+    Range('event_no_stop', 'EVENT_NO_STOP', INTERPOLATE, lower=0, integer=True),
+    Range('meters', 'METERS', INTERPOLATE, lower=0),
+]
+
+BREADCRUMB_ENGINE = ValidationEngine(BREADCRUMB_RULES, parent_by='VEHICLE_ID')
+
+
+@lru_cache(maxsize=None)
+def breadcrumb_engine(trip_index=None):
+    """
+    The breadcrumb engine, plus a check of every trip's vehicle against
+    `trip_index` when one is given. The same engine is returned for the same
+    index, so its fast-path counters cover every window.
+    """
+    if trip_index is None:
+        return BREADCRUMB_ENGINE
+    return ValidationEngine(BREADCRUMB_RULES + [
+        Check('trip_vehicle_history', 'EVENT_NO_TRIP', CHECK, func=trip_vehicle_changed(trip_index),
+              columns=('EVENT_NO_TRIP', 'VEHICLE_ID')),
+    ], parent_by='VEHICLE_ID')
@@ -0,0 +1,119 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Compact dtypes for decoded breadcrumb windows (memory-budget mode).
+#
+# decode_messages leaves every numeric column as int64/float64 and the
+# service date as Python strings. With $COMPACT_DTYPES=1 the window is
+# shrunk before validation: whole-number columns are downcast to the
+# smallest integer type that holds them, VEHICLE_ID and OPD_DATE become
+# categoricals and GPS_HDOP float32. Coordinates are kept to
+# $COORDINATE_DECIMALS decimals: at 5 or fewer they are rounded and stored as
+# float32 (close enough to be rounded back exactly), at 6 (the feed's own
+# precision, the default) they are left as float64.
+#
+# The downcasts are lossless, and widen_for_insert restores the column types
+# before to_sql, so DataFrameSQLInserter writes the same values.
+
+COMPACT_DTYPES = os.getenv("COMPACT_DTYPES", "0") == "1"
+COORDINATE_DECIMALS = int(os.getenv("COORDINATE_DECIMALS", 6))
+
+# float32 keeps ~7 significant digits, and coordinates have 3 before the point
+FLOAT32_DECIMALS = 5
+
+INTEGER_COLUMNS = ['EVENT_NO_TRIP', 'EVENT_NO_STOP', 'METERS', 'ACT_TIME', 'GPS_SATELLITES']
+CATEGORY_COLUMNS = ['VEHICLE_ID', 'OPD_DATE']
+FLOAT32_COLUMNS = ['GPS_HDOP']
+COORDINATE_COLUMNS = ['GPS_LATITUDE', 'GPS_LONGITUDE', 'latitude', 'longitude']
+
+
+class CompactStats:
+    """Running totals of the memory compact_frame saved."""
+    def __init__(self):
+        self.rows = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self._lock = threading.Lock()
+
+    def add(self, rows, bytes_before, bytes_after):
+        with self._lock:
+            self.rows += rows
+            self.bytes_before += bytes_before
+            self.bytes_after += bytes_after
+
+    def saved_per_million(self):
+        """Bytes saved per million rows so far."""
+        with self._lock:
+            if not self.rows:
+                return 0.0
+            return (self.bytes_before - self.bytes_after) / self.rows * 1_000_000
+
+
+COMPACT_STATS = CompactStats()
+
+
+def compact_frame(df, coordinate_decimals=COORDINATE_DECIMALS, stats=COMPACT_STATS):
+    """
+    Returns df with compact dtypes (see above). Columns that are missing, or
+    whose values wouldn't survive the downcast (NaNs, fractions), are left as
+    they are. The savings are added to `stats` when one is given.
+    """
+    columns = {}
+
+    for column in INTEGER_COLUMNS:
+        if column in df.columns and _whole_numbers(df[column]):
+            columns[column] = pd.to_numeric(df[column], downcast='integer')
+
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            columns[column] = df[column].astype('category')
+
+    for column in FLOAT32_COLUMNS:
+        if column in df.columns and pd.api.types.is_float_dtype(df[column]):
+            columns[column] = df[column].astype(np.float32)
+
+    if coordinate_decimals <= FLOAT32_DECIMALS:
+        for column in COORDINATE_COLUMNS:
+            if column in df.columns and pd.api.types.is_float_dtype(df[column]):
+                columns[column] = df[column].round(coordinate_decimals).astype(np.float32)
+
+    compacted = df.assign(**columns)
+    if stats is not None:
+        stats.add(len(df), _deep_bytes(df), _deep_bytes(compacted))
+    return compacted
+
+
+def widen_for_insert(df, coordinate_decimals=COORDINATE_DECIMALS):
+    """
+    Returns df with the dtypes it would have had without compact dtypes:
+    integers back to int64, categoricals back to their values, and coordinates
+    stored as float32 (or repaired from float32 values) rounded back to
+    `coordinate_decimals` in float64, so to_sql writes exactly the same values
+    (and maps the same SQL types).
+    """
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            columns[column] = values.astype(values.cat.categories.dtype)
+        elif pd.api.types.is_signed_integer_dtype(values) and values.dtype != np.int64:
+            columns[column] = values.astype(np.int64)
+        elif column in COORDINATE_COLUMNS and coordinate_decimals <= FLOAT32_DECIMALS:
+            columns[column] = values.astype(np.float64).round(coordinate_decimals)
+    return df.assign(**columns) if columns else df
+
+
+def _whole_numbers(values):
+    if pd.api.types.is_integer_dtype(values):
+        return True
+    if not pd.api.types.is_float_dtype(values):
+        return False
+    array = values.to_numpy()
+    return bool(np.isfinite(array).all() and (array == np.trunc(array)).all())
+
+
+def _deep_bytes(df):
+    return int(df.memory_usage(index=False, deep=True).sum())
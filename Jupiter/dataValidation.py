@@ -1,12 +1,24 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import re
 import json
 from transformer import Transformer
+from breadcrumbRules import breadcrumb_engine, trip_has_many_vehicles, SPEED_LIMIT
+import commonPath
+from common.validationReport import ValidationReport
+from decoder import parse_service_dates
+from common.tripInterpolation import TripGroups
 
 class Validation:
-    def __init__(self, df):
+    def __init__(self, df, trip_index=None):
         self.df = df
+        # Optional tripIndex.TripVehicleIndex, so trips are also checked
+        # against the vehicles seen for them in earlier windows
+        self.trip_index = trip_index
+        self.rule_counts = {}
+        # Every method below records what it did here instead of printing
+        self.report = ValidationReport('breadcrumb', 'validation', len(df))
     
     def get_dataframe(self):
         """
@@ -15,264 +27,161 @@ class Validation:
         return self.df
     
     def validateBeforeTransform(self):
-        self.removeInvalidLatitude()
-        self.removeInvalidLongitude()
-        self.validateDate()
-        self.validateLatitudeRange()
-        self.validateLongitudeRange()
-        self.validateTripIdOneVehicle()
-        self.validateEventNoTrip()
-        self.validateEventNoStop()
-        self.validateMeters()
+        """
+        Runs every breadcrumb rule (the checks below, from removeInvalidLatitude
+        to validateMeters) in a single vectorized pass. See breadcrumbRules.
+        With a trip_index, trips are also checked against earlier windows.
+        Per-rule counts and timings are kept in self.rule_counts and self.report.
+        Returns True if every invalid value was dropped or repaired.
+        """
+        self.report.stage = 'before_transform'
+        self.df, self.rule_counts = breadcrumb_engine(self.trip_index).run(self.df)
+
+        for name, counts in self.rule_counts.items():
+            self.report.add(name, counts, self.report.rows_in)
+
+        self.report.finish(len(self.df))
+        return self.report.passed()
     
     def validateAfterTransform(self):
+        self.report.stage = 'after_transform'
         self.validateSpeed()
+        self.report.finish(len(self.df))
+        return self.report.passed()
+
+    def tripGroups(self, trip_column='EVENT_NO_TRIP', time_column='ACT_TIME'):
+        """
+        Groups the rows by trip (ordered by time) so repairs never mix values
+        from different trips. Without a trip column the frame is one group.
+        """
+        if trip_column in self.df.columns:
+            trips = self.df[trip_column]
+        else:
+            trips = np.zeros(len(self.df))
+        times = self.df[time_column] if time_column in self.df.columns else None
+        return TripGroups(trips, times)
 
     def validateDate(self):
         """
         Ensures 'OPD_DATE' values match the format 'DDMMMYYYY:HH:MM:SS' (e.g., '08DEC2022:00:00:00').
-        Invalid entries are coerced to NaT and interpolated.
-        Returns True if all values are valid or successfully interpolated.
+        The column is converted to datetime64 (and left that way for the Transformer).
+        Invalid entries are coerced to NaT and filled from the nearest valid row of the same trip.
+        Returns True if all values are valid or successfully filled.
         """
-        print("Running validateDate...")
-
-        if 'OPD_DATE' not in self.df.columns:
-            print("Missing 'OPD_DATE' column in the dataframe!")
-            return False
+        with self.report.rule('date_format', len(self.df)) as result:
+            if 'OPD_DATE' not in self.df.columns:
+                result.missing = True
+                return False
 
-        # Define the regex pattern and function to apply
-        pattern = re.compile(r"^\d{2}[A-Z]{3}\d{4}:\d{2}:\d{2}:\d{2}$")
+            # Each distinct date string is parsed once; invalid ones become NaT
+            self.df['OPD_DATE'] = parse_service_dates(self.df['OPD_DATE'])
 
-        # Convert valid matches to datetime, others to NaT
-        def parse_opd_date(val):
-            if isinstance(val, str) and pattern.match(val):
-                try:
-                    return datetime.strptime(val, "%d%b%Y:%H:%M:%S")
-                except ValueError:
-                    return pd.NaT
-            return pd.NaT
+            # Fill missing (NaT) values
+            result.invalid = int(self.df['OPD_DATE'].isna().sum())
+            if result.invalid:
+                self.df['OPD_DATE'] = self.tripGroups().fill(self.df['OPD_DATE'])
 
-        self.df['OPD_DATE'] = self.df['OPD_DATE'].apply(parse_opd_date)
-
-        # Interpolate missing (NaT) values
-        if self.df['OPD_DATE'].isna().any():
-            print(f"Interpolating {self.df['OPD_DATE'].isna().sum()} invalid 'OPD_DATE' entries...")
-            self.df.reset_index(drop=True, inplace=True)
-            self.df['OPD_DATE'] = self.df['OPD_DATE'].interpolate(method='time', limit_direction='both')
-
-        # Final check
-        if self.df['OPD_DATE'].isna().any():
-            print("Interpolation failed for some 'OPD_DATE' entries.")
-            return False
-
-        # Reformat interpolated datetime values back to original string format
-        self.df['OPD_DATE'] = self.df['OPD_DATE'].dt.strftime("%d%b%Y:%H:%M:%S").str.upper()
-
-        print("All 'OPD_DATE' values are now valid and formatted correctly.")
-        return True
+            result.unrepaired = int(self.df['OPD_DATE'].isna().sum())
+            result.repaired = result.invalid - result.unrepaired
+            return not result.unrepaired
 
     def validateLatitudeRange(self):
         """
         Validates that all GPS_LATITUDE values are within the Portland bus range [45, 46].
-        Out-of-range values are set to NaN and interpolated.
+        Out-of-range values are set to NaN and interpolated within their trip.
         Returns True if 'GPS_LATITUDE' column exists and interpolation succeeds.
         """
-        print("Running validateLatitudeRange...")
-
-        if 'GPS_LATITUDE' not in self.df.columns:
-            print("Missing 'GPS_LATITUDE' column in the dataframe!")
-            return False
-
-        # Mark values out of the acceptable range as NaN
-        mask_out_of_range = (self.df['GPS_LATITUDE'] < 45) | (self.df['GPS_LATITUDE'] > 46)
-        self.df.loc[mask_out_of_range, 'GPS_LATITUDE'] = float('nan')
-
-        if self.df['GPS_LATITUDE'].isna().any():
-            print(f"Interpolating {self.df['GPS_LATITUDE'].isna().sum()} out-of-range GPS_LATITUDE values...")
-            self.df.reset_index(drop=True, inplace=True)
-            self.df['GPS_LATITUDE'] = self.df['GPS_LATITUDE'].interpolate(method='linear', limit_direction='both')
-
-        # Final check to ensure all values are within range after interpolation
-        still_out_of_range = (self.df['GPS_LATITUDE'] < 45) | (self.df['GPS_LATITUDE'] > 46) | self.df['GPS_LATITUDE'].isna()
-        if still_out_of_range.any():
-            print("Some GPS_LATITUDE values remain out of range or could not be interpolated.")
-            return False
-
-        print("All GPS_LATITUDE values are now within the Portland bus range (45 to 46).")
-        return True
+        return self._interpolateOutOfRange('latitude_range', 'GPS_LATITUDE', 45, 46)
 
     def validateLongitudeRange(self):
         """
         Validates that all GPS_LONGITUDE values are within the Portland bus range [-124, -122].
-        Out-of-range values are set to NaN and interpolated.
+        Out-of-range values are set to NaN and interpolated within their trip.
         Returns True if 'GPS_LONGITUDE' column exists and interpolation succeeds.
         """
-        print("Running validateLongitudeRange...")
-
-        if 'GPS_LONGITUDE' not in self.df.columns:
-            print("Missing 'GPS_LONGITUDE' column in the dataframe!")
-            return False
-
-        # Mark out-of-range values as NaN
-        mask_out_of_range = (self.df['GPS_LONGITUDE'] < -124) | (self.df['GPS_LONGITUDE'] > -122)
-        self.df.loc[mask_out_of_range, 'GPS_LONGITUDE'] = float('nan')
-
-        if self.df['GPS_LONGITUDE'].isna().any():
-            print(f"Interpolating {self.df['GPS_LONGITUDE'].isna().sum()} out-of-range GPS_LONGITUDE values...")
-            self.df.reset_index(drop=True, inplace=True)
-            self.df['GPS_LONGITUDE'] = self.df['GPS_LONGITUDE'].interpolate(method='linear', limit_direction='both')
-
-        # Final check
-        still_out_of_range = (
-            (self.df['GPS_LONGITUDE'] < -124) | 
-            (self.df['GPS_LONGITUDE'] > -122) | 
-            self.df['GPS_LONGITUDE'].isna()
-        )
-        if still_out_of_range.any():
-            print("Some GPS_LONGITUDE values remain out of range or could not be interpolated.")
-            return False
-
-        print("All GPS_LONGITUDE values are now within the Portland bus range (-124 to -122).")
-        return True
-
+        return self._interpolateOutOfRange('longitude_range', 'GPS_LONGITUDE', -124, -122)
 
     def validateSummaryStats(self):
         """
         Performs summary statistics checks on GPS_LATITUDE, GPS_LONGITUDE, and SPEED.
         Returns True if valid, False otherwise.
         """
-        print("Running validateSummaryStats...")
-
-        summary_stats = self.df[['GPS_LATITUDE', 'GPS_LONGITUDE', 'SPEED']].describe()
-
-        # Check GPS_LATITUDE range (Portland: 45 to 46)
-        if not (45 <= summary_stats.loc['min', 'GPS_LATITUDE'] <= 46 and 
-                45 <= summary_stats.loc['max', 'GPS_LATITUDE'] <= 46):
-            print("Latitude values are outside the valid Portland range (45 to 46).")
-            return False
-
-        # Check GPS_LONGITUDE range (Portland: -124 to -122)
-        if not (-124 <= summary_stats.loc['min', 'GPS_LONGITUDE'] <= -122 and 
-                -124 <= summary_stats.loc['max', 'GPS_LONGITUDE'] <= -122):
-            print("Longitude values are outside the valid Portland range (-124 to -122).")
-            return False
-
-        # Check SPEED > 0
-        if not (summary_stats.loc['min', 'SPEED'] > 0):
-            print("Speed values should be greater than 0.")
-            return False
-
-        print("Summary statistics are within expected Portland-specific ranges.")
-        return True
-
+        with self.report.rule('summary_stats', len(self.df)) as result:
+            # Latitude within Portland (45 to 46), longitude within (-124 to -122), SPEED > 0
+            outside = (
+                (self.df['GPS_LATITUDE'] < 45) | (self.df['GPS_LATITUDE'] > 46) |
+                (self.df['GPS_LONGITUDE'] < -124) | (self.df['GPS_LONGITUDE'] > -122) |
+                (self.df['SPEED'] <= 0)
+            )
+            result.invalid = result.unrepaired = int(outside.sum())
+            return not result.invalid
 
     def validateTripIdOneVehicle(self):
         """
-        Validates that each EVENT_NO_TRIP is associated with only one VEHICLE_ID.
+        Validates that each EVENT_NO_TRIP is associated with only one VEHICLE_ID,
+        within this frame and, with a trip_index, with the trips recorded from
+        earlier windows (stages.record_trips).
         Returns True if valid, False otherwise.
         """
-        print("Running validateTripIdOneVehicle...")
-
-        if 'EVENT_NO_TRIP' not in self.df.columns or 'VEHICLE_ID' not in self.df.columns:
-            print("Missing 'EVENT_NO_TRIP' or 'VEHICLE_ID' columns!")
-            return False
-
-        trip_vehicle_counts = self.df.groupby('EVENT_NO_TRIP')['VEHICLE_ID'].nunique()
-        multiple_vehicles = trip_vehicle_counts[trip_vehicle_counts > 1]
+        with self.report.rule('trip_one_vehicle', len(self.df)) as result:
+            if 'EVENT_NO_TRIP' not in self.df.columns or 'VEHICLE_ID' not in self.df.columns:
+                result.missing = True
+                return False
 
-        if not multiple_vehicles.empty:
-            print(f"Found {len(multiple_vehicles)} EVENT_NO_TRIP values associated with multiple VEHICLE_IDs.")
-            return False
+            invalid = trip_has_many_vehicles(self.df).to_numpy(copy=True)
+            if self.trip_index is not None:
+                invalid |= self.trip_index.check(self.df['EVENT_NO_TRIP'], self.df['VEHICLE_ID'])
 
-        print("Each EVENT_NO_TRIP is associated with only one VEHICLE_ID.")
-        return True
+            result.invalid = result.unrepaired = int(invalid.sum())
+            return not result.invalid
 
     def validateEventNoTrip(self):
         """
         Validates that all EVENT_NO_TRIP values are non-null and non-negative integers.
-        Invalid values are set to NaN and interpolated.
+        Invalid values take the trip of the same vehicle's nearest valid breadcrumb.
         Returns True if 'EVENT_NO_TRIP' column exists and values are valid.
         """
-        print("Running validateEventNoTrip...")
-
-        if 'EVENT_NO_TRIP' not in self.df.columns:
-            print("Missing 'EVENT_NO_TRIP' column in the dataframe!")
-            return False
-
-        # Mark invalid values (non-integer or negative) as NaN
-        mask_invalid = ~self.df['EVENT_NO_TRIP'].apply(lambda x: isinstance(x, int) and x >= 0)
-        self.df.loc[mask_invalid, 'EVENT_NO_TRIP'] = float('nan')
-
-        if self.df['EVENT_NO_TRIP'].isna().any():
-            print(f"Interpolating {self.df['EVENT_NO_TRIP'].isna().sum()} invalid EVENT_NO_TRIP values...")
-            self.df['EVENT_NO_TRIP'] = self.df['EVENT_NO_TRIP'].interpolate(method='linear', limit_direction='both')
+        with self.report.rule('event_no_trip', len(self.df)) as result:
+            if 'EVENT_NO_TRIP' not in self.df.columns:
+                result.missing = True
+                return False
 
-        # Final check to ensure all values are valid after interpolation
-        still_invalid = self.df['EVENT_NO_TRIP'].isna()
-        if still_invalid.any():
-            print("Some EVENT_NO_TRIP values remain invalid or could not be interpolated.")
-            return False
+            values, invalid = self._invalidIds('EVENT_NO_TRIP')
+            result.invalid = int(invalid.sum())
+            if result.invalid:
+                self.df['EVENT_NO_TRIP'] = self.tripGroups('VEHICLE_ID').fill(values.mask(invalid))
 
-        print("All EVENT_NO_TRIP values are valid.")
-        return True
+            result.unrepaired = int(self._invalidIds('EVENT_NO_TRIP')[1].sum())
+            result.repaired = result.invalid - result.unrepaired
+            return not result.unrepaired
 
     def validateEventNoStop(self):
         """
         Validates that all EVENT_NO_STOP values are non-null and non-negative integers.
-        Invalid values are set to NaN and interpolated.
+        Invalid values are set to NaN and interpolated within their trip.
         Returns True if 'EVENT_NO_STOP' column exists and values are valid.
         """
-        print("Running validateEventNoStop...")
-
-        if 'EVENT_NO_STOP' not in self.df.columns:
-            print("Missing 'EVENT_NO_STOP' column in the dataframe!")
-            return False
-
-        # Mark invalid values (non-integer or negative) as NaN
-        mask_invalid = ~self.df['EVENT_NO_STOP'].apply(lambda x: isinstance(x, int) and x >= 0)
-        self.df.loc[mask_invalid, 'EVENT_NO_STOP'] = float('nan')
-
-        if self.df['EVENT_NO_STOP'].isna().any():
-            print(f"Interpolating {self.df['EVENT_NO_STOP'].isna().sum()} invalid EVENT_NO_STOP values...")
-            self.df['EVENT_NO_STOP'] = self.df['EVENT_NO_STOP'].interpolate(method='linear', limit_direction='both')
+        with self.report.rule('event_no_stop', len(self.df)) as result:
+            if 'EVENT_NO_STOP' not in self.df.columns:
+                result.missing = True
+                return False
 
-        # Final check to ensure all values are valid after interpolation
-        still_invalid = self.df['EVENT_NO_STOP'].isna()
-        if still_invalid.any():
-            print("Some EVENT_NO_STOP values remain invalid or could not be interpolated.")
-            return False
+            values, invalid = self._invalidIds('EVENT_NO_STOP')
+            result.invalid = int(invalid.sum())
+            if result.invalid:
+                self.df['EVENT_NO_STOP'] = self.tripGroups().interpolate(values.mask(invalid))
 
-        print("All EVENT_NO_STOP values are valid.")
-        return True
+            result.unrepaired = int(self._invalidIds('EVENT_NO_STOP')[1].sum())
+            result.repaired = result.invalid - result.unrepaired
+            return not result.unrepaired
 
     def validateMeters(self):
         """
         Validates that all METERS values are non-negative.
-        Invalid values are set to NaN and interpolated.
+        Invalid values are set to NaN and interpolated within their trip.
         Returns True if 'METERS' column exists and values are valid.
         """
-        print("Running validateMeters...")
-
-        if 'METERS' not in self.df.columns:
-            print("Missing 'METERS' column in the dataframe!")
-            return False
-
-        # Mark negative values as NaN
-        mask_negative = self.df['METERS'] < 0
-        self.df.loc[mask_negative, 'METERS'] = float('nan')
-
-        if self.df['METERS'].isna().any():
-            print(f"Interpolating {self.df['METERS'].isna().sum()} invalid METERS values...")
-            self.df['METERS'] = self.df['METERS'].interpolate(method='linear', limit_direction='both')
-
-        # Final check to ensure all values are valid after interpolation
-        still_negative = self.df['METERS'].isna()
-        if still_negative.any():
-            print("Some METERS values remain invalid or could not be interpolated.")
-            return False
-
-        print("All METERS values are valid.")
-        return True
+        return self._interpolateOutOfRange('meters', 'METERS', 0, None)
     
     def validateActTime(self):
         """
@@ -280,93 +189,90 @@ class Validation:
         Invalid values are set to NaN and interpolated.
         Returns True if 'ACT_TIME' column exists and interpolation succeeds.
         """
-        print("Running validateActTime...")
-
-        if 'ACT_TIME' not in self.df.columns:
-            print("Missing 'ACT_TIME' column in the dataframe!")
-            return False
+        with self.report.rule('act_time', len(self.df)) as result:
+            if 'ACT_TIME' not in self.df.columns:
+                result.missing = True
+                return False
 
-        # Ensure that ACT_TIME is a valid timestamp
-        self.df['ACT_TIME'] = pd.to_datetime(self.df['ACT_TIME'], errors='coerce')
+            # Ensure that ACT_TIME is a valid timestamp
+            self.df['ACT_TIME'] = pd.to_datetime(self.df['ACT_TIME'], errors='coerce')
 
-        if self.df['ACT_TIME'].isna().any():
-            print(f"Interpolating {self.df['ACT_TIME'].isna().sum()} invalid ACT_TIME values...")
-            self.df['ACT_TIME'] = self.df['ACT_TIME'].interpolate(method='linear', limit_direction='both')
+            result.invalid = int(self.df['ACT_TIME'].isna().sum())
+            if result.invalid:
+                self.df['ACT_TIME'] = self.df['ACT_TIME'].interpolate(method='linear', limit_direction='both')
 
-        # Final check to ensure all values are valid after interpolation
-        still_invalid = self.df['ACT_TIME'].isna()
-        if still_invalid.any():
-            print("Some ACT_TIME values remain invalid or could not be interpolated.")
-            return False
-
-        print("All ACT_TIME values are valid.")
-        return True
+            result.unrepaired = int(self.df['ACT_TIME'].isna().sum())
+            result.repaired = result.invalid - result.unrepaired
+            return not result.unrepaired
 
     def removeInvalidLatitude(self):
         """
         Removes rows where GPS_LATITUDE is None.
         Returns True if 'GPS_LATITUDE' column exists.
         """
-        print("Running removeInvalidLatitude...")
-
-        if 'GPS_LATITUDE' not in self.df.columns:
-            print("Missing 'GPS_LATITUDE' column in the dataframe!")
-            return False
-
-        initial_count = len(self.df)
-        self.df = self.df[self.df['GPS_LATITUDE'].notna()]
-        removed_count = initial_count - len(self.df)
-
-        print(f"Removed {removed_count} rows with None GPS_LATITUDE.")
-        return True
+        return self._removeMissing('latitude_present', 'GPS_LATITUDE')
 
     def removeInvalidLongitude(self):
         """
         Removes rows where GPS_LONGITUDE is None.
         Returns True if 'GPS_LONGITUDE' column exists.
         """
-        print("Running removeInvalidLongitude...")
-
-        if 'GPS_LONGITUDE' not in self.df.columns:
-            print("Missing 'GPS_LONGITUDE' column in the dataframe!")
-            return False
-
-        initial_count = len(self.df)
-        self.df = self.df[self.df['GPS_LONGITUDE'].notna()]
-        removed_count = initial_count - len(self.df)
-
-        print(f"Removed {removed_count} rows with None GPS_LONGITUDE.")
-        return True
-    
+        return self._removeMissing('longitude_present', 'GPS_LONGITUDE')
 
     def validateSpeed(self):
         """
-        Validates that all speed values are less than or equal to 32.0.
-        Values above 32.0 are set to NaN before interpolation.
+        Validates that all speed values are less than or equal to SPEED_LIMIT (32.0).
+        Values above it are set to NaN and interpolated within their trip.
         Returns True if 'speed' column exists and interpolation succeeds.
         """
-        print("Running validateSpeed...")
-
-        if 'speed' not in self.df.columns:
-            print("Missing 'speed' column in the dataframe!")
-            return False
-
-        # Mark speeds above 32.0 as NaN
-        mask_too_fast = self.df['speed'] > 32.0
-        self.df.loc[mask_too_fast, 'speed'] = float('nan')
-
-        if self.df['speed'].isna().any():
-            print(f"Interpolating {self.df['speed'].isna().sum()} speed values greater than 32.0...")
-            self.df['speed'] = self.df['speed'].interpolate(method='linear', limit_direction='both')
-
-        # Final check to ensure all speed values are now <= 32.0 and not NaN
-        invalid_mask = self.df['speed'].isna() | (self.df['speed'] > 32.0)
-        if invalid_mask.any():
-            print("Some speed values remain invalid or could not be interpolated.")
-            return False
-
-        print("All speed values are now valid (≤ 32.0).")
-        return True
+        # Columns are renamed by the Transformer at this point
+        return self._interpolateOutOfRange('speed', 'speed', None, SPEED_LIMIT, 'trip_id', 'tstamp')
+
+    def _removeMissing(self, name, column):
+        with self.report.rule(name, len(self.df)) as result:
+            if column not in self.df.columns:
+                result.missing = True
+                return False
+
+            initial_count = len(self.df)
+            self.df = self.df[self.df[column].notna()]
+            result.invalid = result.dropped = initial_count - len(self.df)
+            return True
+
+    def _invalidIds(self, column):
+        """The column as numbers, and a mask of the values that aren't non-negative whole numbers."""
+        values = pd.to_numeric(self.df[column], errors='coerce')
+        return values, values.isna() | (values < 0) | (values != np.trunc(values))
+
+    def _interpolateOutOfRange(self, name, column, lower, upper, trip_column='EVENT_NO_TRIP', time_column='ACT_TIME'):
+        """
+        Sets values outside [lower, upper] (None = unbounded) to NaN, interpolates
+        them within their trip and records the outcome under `name`.
+        Returns True if the column exists and every value ends up valid.
+        """
+        with self.report.rule(name, len(self.df)) as result:
+            if column not in self.df.columns:
+                result.missing = True
+                return False
+
+            def out_of_range(values):
+                mask = values.isna()
+                if lower is not None:
+                    mask |= values < lower
+                if upper is not None:
+                    mask |= values > upper
+                return mask
+
+            invalid = out_of_range(self.df[column])
+            result.invalid = int(invalid.sum())
+            if result.invalid:
+                values = self.df[column].mask(invalid)
+                self.df[column] = self.tripGroups(trip_column, time_column).interpolate(values)
+
+            # Final check to ensure all values are valid after interpolation
+            result.unrepaired = int(out_of_range(self.df[column]).sum())
+            result.repaired = result.invalid - result.unrepaired
+            return not result.unrepaired
     
     
 def main():
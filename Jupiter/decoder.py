@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Turns raw breadcrumb messages into a typed DataFrame.
+# Messages are the repr() of parse.Vehicle: 'EVENT_NO_TRIP: 1, EVENT_NO_STOP: 2, ...'
+
+# Every field of a message, in message order
+FIELDS = ['EVENT_NO_TRIP', 'EVENT_NO_STOP', 'OPD_DATE', 'VEHICLE_ID', 'METERS', 'ACT_TIME',
+          'GPS_LONGITUDE', 'GPS_LATITUDE', 'GPS_SATELLITES', 'GPS_HDOP']
+
+NUMERIC_COLUMNS = ['EVENT_NO_TRIP', 'EVENT_NO_STOP', 'VEHICLE_ID', 'METERS', 'ACT_TIME',
+                   'GPS_LONGITUDE', 'GPS_LATITUDE', 'GPS_SATELLITES', 'GPS_HDOP']
+
+# OPD_DATE looks like '08DEC2022:00:00:00'
+DATE_FORMAT = "%d%b%Y:%H:%M:%S"
+DATE_PATTERN = r"\d{2}[A-Z]{3}\d{4}:\d{2}:\d{2}:\d{2}"
+
+
+def _message_pattern(columns):
+    """
+    An anchored regex over FIELDS in message order that captures only `columns`;
+    the other fields are matched past without being captured.
+    """
+    wanted = set(columns)
+    fields = (f"{key}: (?P<{key}>[^,]*)" if key in wanted else f"{key}: [^,]*" for key in FIELDS)
+    return '^' + ', '.join(fields) + '$'
+
+
+def _split_messages(raw_messages, columns):
+    """Splits every field of each message; for messages that don't follow FIELDS order."""
+    wanted = set(columns)
+    parsed_messages = []
+    for msg in raw_messages:
+        pairs = (field.strip().split(': ', 1) for field in msg.split(', '))
+        parsed_messages.append({key: value for key, value in pairs if key in wanted})
+
+    df = pd.DataFrame(parsed_messages, columns=columns)
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def _to_numeric(values):
+    """Casts captured strings to int64, then float64; anything else goes through pd.to_numeric."""
+    for numeric_type in (pa.int64(), pa.float64()):
+        try:
+            return pc.cast(values, numeric_type).to_numpy(zero_copy_only=False)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+    return pd.to_numeric(pd.Series(values.to_numpy(zero_copy_only=False)), errors='coerce').to_numpy()
+
+
+def decode_messages(raw_messages, columns=None):
+    """
+    Converts the raw 'KEY: value, KEY: value' message strings into a DataFrame
+    with numeric columns coerced. With `columns`, only those columns are built
+    (in that order); the other fields are skipped by the regex, never split out
+    or converted. Messages that don't follow FIELDS order are split instead.
+    """
+    columns = list(FIELDS if columns is None else columns)
+    messages = pa.array(raw_messages, pa.string())
+    captured = pc.extract_regex(messages, _message_pattern(columns))
+
+    # Messages the pattern doesn't match come back null
+    matched = captured.is_valid()
+    captured = captured.filter(matched)
+    df = pd.DataFrame({
+        column: _to_numeric(captured.field(column)) if column in NUMERIC_COLUMNS
+        else captured.field(column).to_numpy(zero_copy_only=False)
+        for column in columns
+    })
+
+    unmatched = np.flatnonzero(~matched.to_numpy(zero_copy_only=False))
+    if len(unmatched) == 0:
+        return df
+
+    # Put the split messages back in arrival order
+    df.index = np.flatnonzero(matched.to_numpy(zero_copy_only=False))
+    split = _split_messages([raw_messages[i] for i in unmatched], columns)
+    split.index = unmatched
+    return pd.concat([df, split]).sort_index().reset_index(drop=True)
+
+
+def parse_service_dates(values):
+    """
+    Parses OPD_DATE strings into a datetime64 Series; values that don't match
+    DATE_FORMAT become NaT. A window only holds a few distinct service dates,
+    so each distinct string is parsed once and the result mapped back.
+    Values that are already datetime64 are returned unchanged.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    matches = uniques.astype(str).str.fullmatch(DATE_PATTERN)
+    parsed = pd.to_datetime(uniques.where(matches), format=DATE_FORMAT, errors='coerce')
+
+    # factorize marks missing values with -1, which picks the trailing NaT
+    lookup = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return pd.Series(lookup[codes], index=values.index, name=values.name)
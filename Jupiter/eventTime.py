@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Event-time ordering of breadcrumbs between windows.
+#
+# Pub/Sub doesn't deliver a trip's breadcrumbs in ACT_TIME order, and a point
+# can arrive a window after the ones that follow it. EventTimeBuffer holds
+# every trip's most recent points back until the trip's watermark (the latest
+# ACT_TIME seen for it minus `lateness` seconds) has passed them, and
+# releases them in trip/time order, so the speeds carried between windows
+# (tripState) always go forwards in time. A point that arrives after its
+# trip has already been released past it is late; it is released on its own
+# so the correction path can handle it without touching the carried state.
+
+WATERMARK_LATENESS = float(os.getenv("WATERMARK_LATENESS", 60))
+WATERMARK_IDLE = float(os.getenv("WATERMARK_IDLE", 600))
+
+
+class Release:
+    """The rows a push released: `on_time` in trip/time order, and the `late` ones."""
+    def __init__(self, on_time, late):
+        self.on_time = on_time
+        self.late = late
+
+    def __len__(self):
+        return len(self.on_time) + len(self.late)
+
+
+class EventTimeBuffer:
+    """
+    Per-trip event-time buffer over EVENT_NO_TRIP/ACT_TIME.
+    `lateness` is how far (in ACT_TIME seconds) a point may trail the newest
+    point of its trip and still be put in order. A trip that hasn't received
+    anything for `idle` seconds of wall time has ended and is released in
+    full. Trips are forgotten `retain` seconds after their last point.
+    """
+    def __init__(self, lateness=WATERMARK_LATENESS, idle=WATERMARK_IDLE, retain=3 * 3600, clock=time.time):
+        self.lateness = lateness
+        self.idle = idle
+        self.retain = retain
+        self.clock = clock
+        self.late_rows = 0
+        self._lock = threading.Lock()
+        self._pending = None
+        # Per trip: newest ACT_TIME seen, newest released, wall time last seen
+        self._trips = pd.DataFrame(
+            {'max_time': pd.Series(dtype=float), 'released': pd.Series(dtype=float), 'seen': pd.Series(dtype=float)},
+            index=pd.Index([], dtype=float, name='trip'),
+        )
+
+    def push(self, df):
+        """
+        Adds a validated window and returns the Release of every buffered row
+        that is now behind its trip's watermark. Rows without a trip or time
+        can't be ordered and are released straight away.
+        """
+        now = self.clock()
+        trips = _numeric(df['EVENT_NO_TRIP'])
+        times = _numeric(df['ACT_TIME'])
+        unordered = np.isnan(trips) | np.isnan(times)
+
+        with self._lock:
+            released = self._trips['released'].reindex(trips).to_numpy()
+            late = ~unordered & (times <= released)
+            self.late_rows += int(late.sum())
+
+            buffered = ~(unordered | late)
+            self._record(trips[buffered], times[buffered], now)
+            pending = df[buffered]
+            if self._pending is not None:
+                pending = pd.concat([self._pending, pending])
+
+            ready = self._ready(pending, now)
+            self._pending = pending[~ready]
+            on_time = self._release(pending[ready])
+            self._forget(now)
+
+        on_time = pd.concat([df[unordered], on_time]) if unordered.any() else on_time
+        return Release(on_time, df[late])
+
+    def flush(self):
+        """Releases everything still buffered (e.g. when the subscriber stops)."""
+        with self._lock:
+            if self._pending is None:
+                return Release(pd.DataFrame(), pd.DataFrame())
+            on_time = self._release(self._pending)
+            self._pending = None
+        return Release(on_time, on_time.iloc[:0])
+
+    def pending_rows(self):
+        with self._lock:
+            return 0 if self._pending is None else len(self._pending)
+
+    def _record(self, trips, times, now):
+        if len(trips) == 0:
+            return
+        newest = pd.Series(times).groupby(trips).max()
+        state = self._trips.reindex(self._trips.index.union(newest.index))
+        state.loc[newest.index, 'max_time'] = np.fmax(state.loc[newest.index, 'max_time'], newest)
+        state.loc[newest.index, 'seen'] = now
+        self._trips = state
+
+    def _ready(self, pending, now):
+        """True for the pending rows at or behind their trip's watermark."""
+        state = self._trips.reindex(_numeric(pending['EVENT_NO_TRIP']))
+        watermark = state['max_time'].to_numpy() - self.lateness
+        watermark[state['seen'].to_numpy() < now - self.idle] = np.inf
+        return _numeric(pending['ACT_TIME']) <= watermark
+
+    def _release(self, rows):
+        trips = _numeric(rows['EVENT_NO_TRIP'])
+        times = _numeric(rows['ACT_TIME'])
+        if len(rows):
+            newest = pd.Series(times).groupby(trips).max()
+            self._trips.loc[newest.index, 'released'] = np.fmax(self._trips.loc[newest.index, 'released'], newest)
+        return rows.iloc[np.lexsort((times, trips))]
+
+    def _forget(self, now):
+        # Forgetting a trip also forgets its late-point detection, so `retain`
+        # is kept well above the idle timeout
+        if self._pending is not None:
+            waiting = set(_numeric(self._pending['EVENT_NO_TRIP']))
+        else:
+            waiting = set()
+        stale = (self._trips['seen'] < now - self.retain) & ~self._trips.index.isin(waiting)
+        self._trips = self._trips[~stale]
+
+
+def _numeric(values):
+    return pd.to_numeric(pd.Series(np.asarray(values)), errors='coerce').to_numpy(dtype=float)
@@ -0,0 +1,355 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from decoder import DATE_FORMAT, DATE_PATTERN, parse_service_dates
+from transformer import Transformer
+from dataValidation import Validation
+from breadcrumbRules import breadcrumb_engine, SPEED_LIMIT
+import commonPath
+from common.validationEngine import PandasFrames, Range, NotNull, OneOf
+from common.validationReport import ValidationReport
+from common.tripInterpolation import TripGroups
+from tripState import carry_speed
+from tripStats import MERGE
+
+# DataFrame backends for the validate and transform steps.
+#
+# The plan is the same for every backend: the breadcrumb rules in
+# breadcrumbRules and the Transformer steps. A backend decides what runs it.
+# "pandas" runs ValidationEngine and Transformer as they are. "polars" runs
+# the same ValidationEngine through PolarsFrames, which compiles the
+# Range/NotNull/OneOf rules into Polars expressions evaluated together in one
+# multi-threaded pass over Arrow memory and does the filter in Polars; the
+# policies, repairs and counts are the engine's own. The transform does the
+# speed differences and the timestamps in Polars, with the same TripGroups
+# kernels and trip state as Transformer, so both backends produce the same
+# rows, values and report counts (tests/test_frameBackend.py checks this).
+#
+# The polars backend also takes Polars DataFrames and pyarrow Tables (e.g.
+# archive.iter_columnar batches) without converting them to pandas first.
+# Both return pandas DataFrames, so the other stages don't change.
+
+FRAME_BACKEND = os.getenv("FRAME_BACKEND", "pandas")
+
+
+class PandasBackend:
+    name = "pandas"
+
+    def validate(self, df, trip_index=None):
+        """Runs the breadcrumb rules. Returns (validated_df, report)."""
+        validator = Validation(_to_pandas(df), trip_index)
+        validator.validateBeforeTransform()
+        return validator.get_dataframe(), validator.report
+
+    def transform(self, df, trip_state=None, trip_stats=None):
+        """Transforms a validated window and checks its speeds. Returns (transformed_df, report)."""
+        transformer = Transformer(_to_pandas(df), trip_state, trip_stats)
+        transformer.transform()
+
+        validator = Validation(transformer.get_dataframe())
+        validator.validateAfterTransform()
+        return validator.get_dataframe(), validator.report
+
+
+class PolarsFrames(PandasFrames):
+    """
+    ValidationEngine on Polars frames. Range/NotNull/OneOf rules are compiled
+    into expressions evaluated together in one pass; everything else (Check
+    rules, repairs) goes through the pandas Series of just the columns it reads.
+    """
+    def __init__(self, polars):
+        self.pl = polars
+
+    def wrap(self, df):
+        pl = self.pl
+        if isinstance(df, pl.DataFrame):
+            return df
+        if isinstance(df, pd.DataFrame):
+            return pl.from_pandas(df)
+        # pyarrow Table or RecordBatch, without a copy
+        return pl.from_arrow(df)
+
+    def unwrap(self, frame, df):
+        return _with_categories(frame.to_pandas(), _categories(df))
+
+    def columns(self, frame):
+        return frame.columns
+
+    def height(self, frame):
+        return frame.height
+
+    def values(self, frame, column):
+        return frame[column].to_pandas()
+
+    def assign(self, frame, columns):
+        return frame.with_columns([self.pl.Series(column, values) for column, values in columns.items()])
+
+    def filter(self, frame, keep):
+        return frame.filter(self.pl.Series(keep))
+
+    def convert(self, frame, rules):
+        pl = self.pl
+        converted = []
+        for rule in rules:
+            if rule.convert is parse_service_dates:
+                converted.append(self.service_dates(frame[rule.column]).alias(rule.column))
+            else:
+                converted.append(pl.Series(rule.column, rule.convert(frame[rule.column].to_pandas())))
+        return frame.with_columns(converted)
+
+    def scan(self, frame, rules, charge):
+        # Every mask comes out of the same pass, so there's nothing to save
+        # by stopping at the first rule that fails
+        masks = self.invalid(frame, rules, charge)
+        return not any(mask.any() for mask in masks.values()), masks
+
+    def invalid(self, frame, rules, charge):
+        masks = {}
+        compiled = []
+        for rule in rules:
+            expression = self._invalid(rule, frame)
+            if expression is not None:
+                compiled.append((rule, expression.alias(rule.name)))
+                continue
+
+            # e.g. Check rules: their own pandas code on the columns they
+            # read, starting with the summary check if the rule has one
+            started = time.perf_counter()
+            pdf = frame.select(rule.requires()).to_pandas()
+            values = pdf[rule.column]
+            if rule.numeric:
+                values = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+            if rule.clean(values, pdf):
+                masks[rule.name] = np.zeros(frame.height, dtype=bool)
+            else:
+                masks[rule.name] = np.asarray(rule.invalid(values, pdf), dtype=bool)
+            charge([rule], started)
+
+        if compiled:
+            started = time.perf_counter()
+            computed = frame.lazy().select([expression for _, expression in compiled]).collect()
+            for name in computed.columns:
+                masks[name] = computed[name].to_numpy()
+            charge([rule for rule, _ in compiled], started)
+        return masks
+
+    def _invalid(self, rule, frame):
+        """The rule as a boolean Polars expression, or None if it doesn't compile to one."""
+        pl = self.pl
+        column = pl.col(rule.column)
+        dtype = frame.schema[rule.column]
+
+        if type(rule) is Range and dtype.is_integer():
+            # Whole numbers, and only nulls can be missing
+            mask = pl.lit(False) if rule.missing_ok else column.is_null()
+            if rule.lower is not None:
+                mask = mask | (column < rule.lower).fill_null(False)
+            if rule.upper is not None:
+                mask = mask | (column > rule.upper).fill_null(False)
+            return mask
+
+        if type(rule) is Range:
+            values = self.numeric(frame, rule.column)
+            # NaN compares greater than every number in Polars
+            missing = values.is_null() | values.is_nan()
+            mask = pl.lit(False) if rule.missing_ok else missing
+            if rule.lower is not None:
+                mask = mask | (~missing & (values < rule.lower))
+            if rule.upper is not None:
+                mask = mask | (~missing & (values > rule.upper))
+            if rule.integer:
+                mask = mask | (~missing & (values.floor() != values))
+            return mask
+
+        if type(rule) is NotNull and not rule.placeholders:
+            if dtype.is_float():
+                return column.is_null() | column.is_nan()
+            return column.is_null()
+
+        if type(rule) is OneOf and dtype.is_numeric() and all(
+                isinstance(value, (int, float)) for value in rule.values):
+            values = column.cast(pl.Float64)
+            return ~values.is_in([float(value) for value in rule.values]).fill_null(False)
+
+        return None
+
+    def service_dates(self, values):
+        """parse_service_dates for a Polars Series: each distinct string is parsed once."""
+        pl = self.pl
+        if values.dtype == pl.Datetime('ns'):
+            return values
+        text = values.cast(pl.Utf8)
+        uniques = text.unique().drop_nulls()
+        # strptime on its own also takes e.g. '8MAY2025:...', which parse_service_dates doesn't
+        parsed = pl.select(
+            pl.when(pl.lit(uniques).str.contains(f"^{DATE_PATTERN}$"))
+            .then(pl.lit(uniques).str.strptime(pl.Datetime('ns'), DATE_FORMAT, strict=False))
+        ).to_series()
+        return text.replace_strict(uniques, parsed, default=None, return_dtype=pl.Datetime('ns'))
+
+    def numeric(self, frame, column):
+        """pd.to_numeric(errors='coerce') as an expression."""
+        pl = self.pl
+        if frame.schema[column].is_numeric():
+            return pl.col(column).cast(pl.Float64)
+        return pl.col(column).cast(pl.Utf8).cast(pl.Float64, strict=False)
+
+
+class PolarsBackend:
+    name = "polars"
+
+    def __init__(self):
+        import polars
+        self.pl = polars
+        self.frames = PolarsFrames(polars)
+
+    def validate(self, df, trip_index=None):
+        """Runs the breadcrumb rules. Returns (validated_df, report), like PandasBackend."""
+        report = ValidationReport('breadcrumb', 'before_transform', len(df))
+        validated, counts = breadcrumb_engine(trip_index).run(df, self.frames)
+        for name, rule_counts in counts.items():
+            report.add(name, rule_counts, report.rows_in)
+        report.finish(len(validated))
+        return validated, report
+
+    def transform(self, df, trip_state=None, trip_stats=None):
+        """Transforms a validated window and checks its speeds, like PandasBackend."""
+        pl = self.pl
+        categories = _categories(df)
+        frame = self.frames.wrap(df)
+
+        # createSpeed: differences over the window in trip/time order (the
+        # TripGroups sort), with the first row of every trip fixed up as in
+        # Transformer
+        groups = self._groups(frame, 'EVENT_NO_TRIP', 'ACT_TIME')
+        ordered = frame.select(
+            pl.col('EVENT_NO_TRIP'),
+            pl.col('METERS').cast(pl.Float64, strict=False).fill_nan(None),
+            pl.col('ACT_TIME').cast(pl.Float64, strict=False).fill_nan(None),
+        )[groups.order]
+        trip = pl.col('EVENT_NO_TRIP')
+        is_first = pl.Series(groups.is_first)
+        has_second = is_first & trip.eq_missing(trip.shift(-1)).fill_null(False)
+        speed = (pl.col('METERS').diff() / pl.col('ACT_TIME').diff()).fill_null(np.nan)
+        ordered = ordered.with_columns(
+            pl.when(has_second).then(speed.shift(-1))
+            .when(is_first).then(np.nan)
+            .otherwise(speed).fill_null(np.nan).alias('speed')
+        )
+
+        speed = ordered['speed'].to_numpy().copy()
+        if trip_state is not None:
+            first = np.flatnonzero(groups.is_first)
+            carry_speed(trip_state, ordered['EVENT_NO_TRIP'].to_numpy()[first], ordered['METERS'].to_numpy(),
+                        ordered['ACT_TIME'].to_numpy(), speed, first, groups.last[first])
+        speed = groups.unsort(speed)
+        # Rows without a trip aren't part of any trip
+        speed[frame['EVENT_NO_TRIP'].is_null().to_numpy()] = np.nan
+        frame = frame.with_columns(pl.Series('speed', speed))
+
+        # createTimestamp
+        opd_date = self.frames.service_dates(frame['OPD_DATE'])
+        offset = (pl.col('ACT_TIME').cast(pl.Float64) * 1e9).round().cast(pl.Int64).cast(pl.Duration('ns'))
+        frame = frame.with_columns((pl.lit(opd_date) + offset).alias('tstamp'))
+
+        renamed = {
+            'EVENT_NO_TRIP': 'trip_id',
+            'GPS_LONGITUDE': 'longitude',
+            'GPS_LATITUDE': 'latitude',
+            'VEHICLE_ID': 'vehicle_id',
+        }
+        frame = frame.rename(renamed, strict=False)
+        categories = {renamed.get(column, column): dtype for column, dtype in categories.items()}
+        if trip_stats is not None:
+            trip_stats.add(self._summarize(frame))
+
+        dropped = ['EVENT_NO_STOP', 'OPD_DATE', 'METERS', 'ACT_TIME', 'GPS_SATELLITES', 'GPS_HDOP']
+        frame = frame.drop([column for column in dropped if column in frame.columns])
+
+        # validateAfterTransform
+        report = ValidationReport('breadcrumb', 'after_transform', frame.height)
+        with report.rule('speed', frame.height) as result:
+            speed = pl.col('speed')
+            out_of_range = speed.is_nan() | (speed > SPEED_LIMIT)
+            invalid = frame.select(out_of_range).to_series().to_numpy()
+            result.invalid = int(invalid.sum())
+            if result.invalid:
+                groups = TripGroups(frame['trip_id'].to_numpy(), frame['tstamp'].to_numpy())
+                values = np.where(invalid, np.nan, frame['speed'].to_numpy())
+                frame = frame.with_columns(pl.Series('speed', groups.interpolate(values)))
+            result.unrepaired = int(frame.select(out_of_range.sum()).item())
+            result.repaired = result.invalid - result.unrepaired
+        report.finish(frame.height)
+        return _with_categories(frame.to_pandas(), categories), report
+
+    def _groups(self, frame, group_by, order_by):
+        if group_by in frame.columns:
+            trips = frame[group_by].to_numpy()
+        else:
+            trips = np.zeros(frame.height)
+        times = frame[order_by].to_numpy() if order_by in frame.columns else None
+        return TripGroups(trips, times)
+
+    def _summarize(self, frame):
+        """tripStats.summarize_trips on the renamed frame."""
+        pl = self.pl
+        speed = pl.col('speed').fill_nan(None)
+        meters = pl.col('METERS')
+        if not frame.schema['METERS'].is_integer():
+            meters = self.frames.numeric(frame, 'METERS').fill_nan(None)
+        trips = frame.filter(pl.col('trip_id').is_not_null()).group_by('trip_id', maintain_order=True)
+        summary = trips.agg(
+            pl.len().cast(pl.Int64).alias('points'),
+            pl.col('tstamp').min().alias('first_tstamp'),
+            pl.col('tstamp').max().alias('last_tstamp'),
+            meters.min().alias('min_meters'),
+            meters.max().alias('max_meters'),
+            pl.when(speed <= SPEED_LIMIT).then(speed).max().alias('max_speed'),
+            pl.col('latitude').min().alias('min_latitude'),
+            pl.col('latitude').max().alias('max_latitude'),
+            pl.col('longitude').min().alias('min_longitude'),
+            pl.col('longitude').max().alias('max_longitude'),
+        )
+        return summary.select(['trip_id'] + list(MERGE)).to_pandas()
+
+
+BACKENDS = {
+    'pandas': PandasBackend,
+    'polars': PolarsBackend,
+}
+
+_backends = {}
+
+
+def frame_backend(name=None):
+    """The backend called `name` ($FRAME_BACKEND by default), created once per process."""
+    name = name or FRAME_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown frame backend {name!r}; expected one of {sorted(BACKENDS)}")
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+
+def _to_pandas(df):
+    if isinstance(df, pd.DataFrame):
+        return df
+    return df.to_pandas()
+
+
+def _categories(df):
+    # Polars only keeps string categoricals, so the categorical columns of a
+    # compact (compactTypes) window are cast back on the way out
+    if not isinstance(df, pd.DataFrame):
+        return {}
+    return {column: dtype for column, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)}
+
+
+def _with_categories(df, categories):
+    # Columns a rule converted (OPD_DATE strings to datetime64) stay converted
+    columns = {column: df[column].astype(dtype) for column, dtype in categories.items()
+               if column in df.columns and df[column].dtype != dtype and df[column].dtype.kind != 'M'}
+    return df.assign(**columns) if columns else df
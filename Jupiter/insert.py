@@ -3,6 +3,7 @@ from sqlalchemy import create_engine, exc
 from sqlalchemy.engine.base import Engine
 from typing import Optional, Dict, Any
 import csv
+from contextlib import contextmanager
 from io import StringIO
 import os
 
@@ -34,6 +35,8 @@ class DataFrameSQLInserter:
         self.batch_size = batch_size
         self.engine_kwargs = engine_kwargs
         self.engine: Optional[Engine] = None
+        # Set inside transaction(); the inserts then share its connection
+        self.connection = None
         
     def connect(self):
         try:
@@ -54,7 +57,7 @@ class DataFrameSQLInserter:
         try:
             rows_inserted = df.to_sql(
                 table_name,
-                con=self.engine,
+                con=self.engine if self.connection is None else self.connection,
                 if_exists=if_exists,
                 index=index,
                 dtype=dtype,
@@ -67,6 +70,22 @@ class DataFrameSQLInserter:
         
         return rows_inserted
     
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the insert_dataframe calls made inside the block in one
+        transaction: they are committed together, or rolled back together
+        if one of them fails.
+        """
+        if self.engine is None:
+            self.connect()
+        with self.engine.begin() as connection:
+            self.connection = connection
+            try:
+                yield self
+            finally:
+                self.connection = None
+
     def __enter__(self):
         """Context manager entry (for 'with' statement)."""
         self.connect()
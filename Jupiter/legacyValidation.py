@@ -0,0 +1,278 @@
+import pandas as pd
+from datetime import datetime
+import re
+
+# A frozen copy of Validation.validateBeforeTransform as it was before the
+# rule engine (dataValidation.py at commit 6098559): nine methods, each
+# rescanning the frame, with per-row apply() calls for the dates and the
+# trip/stop ids. benchmark.py times the engine against it, so it is kept
+# exactly as it was -- don't fix or speed it up.
+
+class LegacyValidation:
+    def __init__(self, df):
+        self.df = df
+
+    def get_dataframe(self):
+        return self.df
+
+    def validateBeforeTransform(self):
+        self.removeInvalidLatitude()
+        self.removeInvalidLongitude()
+        self.validateDate()
+        self.validateLatitudeRange()
+        self.validateLongitudeRange()
+        self.validateTripIdOneVehicle()
+        self.validateEventNoTrip()
+        self.validateEventNoStop()
+        self.validateMeters()
+
+    def removeInvalidLatitude(self):
+        """
+        Removes rows where GPS_LATITUDE is None.
+        Returns True if 'GPS_LATITUDE' column exists.
+        """
+        print("Running removeInvalidLatitude...")
+
+        if 'GPS_LATITUDE' not in self.df.columns:
+            print("Missing 'GPS_LATITUDE' column in the dataframe!")
+            return False
+
+        initial_count = len(self.df)
+        self.df = self.df[self.df['GPS_LATITUDE'].notna()]
+        removed_count = initial_count - len(self.df)
+
+        print(f"Removed {removed_count} rows with None GPS_LATITUDE.")
+        return True
+
+    def removeInvalidLongitude(self):
+        """
+        Removes rows where GPS_LONGITUDE is None.
+        Returns True if 'GPS_LONGITUDE' column exists.
+        """
+        print("Running removeInvalidLongitude...")
+
+        if 'GPS_LONGITUDE' not in self.df.columns:
+            print("Missing 'GPS_LONGITUDE' column in the dataframe!")
+            return False
+
+        initial_count = len(self.df)
+        self.df = self.df[self.df['GPS_LONGITUDE'].notna()]
+        removed_count = initial_count - len(self.df)
+
+        print(f"Removed {removed_count} rows with None GPS_LONGITUDE.")
+        return True
+
+    def validateDate(self):
+        """
+        Ensures 'OPD_DATE' values match the format 'DDMMMYYYY:HH:MM:SS' (e.g., '08DEC2022:00:00:00').
+        Invalid entries are coerced to NaT and interpolated.
+        Returns True if all values are valid or successfully interpolated.
+        """
+        print("Running validateDate...")
+
+        if 'OPD_DATE' not in self.df.columns:
+            print("Missing 'OPD_DATE' column in the dataframe!")
+            return False
+
+        # Define the regex pattern and function to apply
+        pattern = re.compile(r"^\d{2}[A-Z]{3}\d{4}:\d{2}:\d{2}:\d{2}$")
+
+        # Convert valid matches to datetime, others to NaT
+        def parse_opd_date(val):
+            if isinstance(val, str) and pattern.match(val):
+                try:
+                    return datetime.strptime(val, "%d%b%Y:%H:%M:%S")
+                except ValueError:
+                    return pd.NaT
+            return pd.NaT
+
+        self.df['OPD_DATE'] = self.df['OPD_DATE'].apply(parse_opd_date)
+
+        # Interpolate missing (NaT) values
+        if self.df['OPD_DATE'].isna().any():
+            print(f"Interpolating {self.df['OPD_DATE'].isna().sum()} invalid 'OPD_DATE' entries...")
+            self.df.reset_index(drop=True, inplace=True)
+            self.df['OPD_DATE'] = self.df['OPD_DATE'].interpolate(method='time', limit_direction='both')
+
+        # Final check
+        if self.df['OPD_DATE'].isna().any():
+            print("Interpolation failed for some 'OPD_DATE' entries.")
+            return False
+
+        # Reformat interpolated datetime values back to original string format
+        self.df['OPD_DATE'] = self.df['OPD_DATE'].dt.strftime("%d%b%Y:%H:%M:%S").str.upper()
+
+        print("All 'OPD_DATE' values are now valid and formatted correctly.")
+        return True
+
+    def validateLatitudeRange(self):
+        """
+        Validates that all GPS_LATITUDE values are within the Portland bus range [45, 46].
+        Out-of-range values are set to NaN and interpolated.
+        Returns True if 'GPS_LATITUDE' column exists and interpolation succeeds.
+        """
+        print("Running validateLatitudeRange...")
+
+        if 'GPS_LATITUDE' not in self.df.columns:
+            print("Missing 'GPS_LATITUDE' column in the dataframe!")
+            return False
+
+        # Mark values out of the acceptable range as NaN
+        mask_out_of_range = (self.df['GPS_LATITUDE'] < 45) | (self.df['GPS_LATITUDE'] > 46)
+        self.df.loc[mask_out_of_range, 'GPS_LATITUDE'] = float('nan')
+
+        if self.df['GPS_LATITUDE'].isna().any():
+            print(f"Interpolating {self.df['GPS_LATITUDE'].isna().sum()} out-of-range GPS_LATITUDE values...")
+            self.df.reset_index(drop=True, inplace=True)
+            self.df['GPS_LATITUDE'] = self.df['GPS_LATITUDE'].interpolate(method='linear', limit_direction='both')
+
+        # Final check to ensure all values are within range after interpolation
+        still_out_of_range = (self.df['GPS_LATITUDE'] < 45) | (self.df['GPS_LATITUDE'] > 46) | self.df['GPS_LATITUDE'].isna()
+        if still_out_of_range.any():
+            print("Some GPS_LATITUDE values remain out of range or could not be interpolated.")
+            return False
+
+        print("All GPS_LATITUDE values are now within the Portland bus range (45 to 46).")
+        return True
+
+    def validateLongitudeRange(self):
+        """
+        Validates that all GPS_LONGITUDE values are within the Portland bus range [-124, -122].
+        Out-of-range values are set to NaN and interpolated.
+        Returns True if 'GPS_LONGITUDE' column exists and interpolation succeeds.
+        """
+        print("Running validateLongitudeRange...")
+
+        if 'GPS_LONGITUDE' not in self.df.columns:
+            print("Missing 'GPS_LONGITUDE' column in the dataframe!")
+            return False
+
+        # Mark out-of-range values as NaN
+        mask_out_of_range = (self.df['GPS_LONGITUDE'] < -124) | (self.df['GPS_LONGITUDE'] > -122)
+        self.df.loc[mask_out_of_range, 'GPS_LONGITUDE'] = float('nan')
+
+        if self.df['GPS_LONGITUDE'].isna().any():
+            print(f"Interpolating {self.df['GPS_LONGITUDE'].isna().sum()} out-of-range GPS_LONGITUDE values...")
+            self.df.reset_index(drop=True, inplace=True)
+            self.df['GPS_LONGITUDE'] = self.df['GPS_LONGITUDE'].interpolate(method='linear', limit_direction='both')
+
+        # Final check
+        still_out_of_range = (
+            (self.df['GPS_LONGITUDE'] < -124) | 
+            (self.df['GPS_LONGITUDE'] > -122) | 
+            self.df['GPS_LONGITUDE'].isna()
+        )
+        if still_out_of_range.any():
+            print("Some GPS_LONGITUDE values remain out of range or could not be interpolated.")
+            return False
+
+        print("All GPS_LONGITUDE values are now within the Portland bus range (-124 to -122).")
+        return True
+
+    def validateTripIdOneVehicle(self):
+        """
+        Validates that each EVENT_NO_TRIP is associated with only one VEHICLE_ID.
+        Returns True if valid, False otherwise.
+        """
+        print("Running validateTripIdOneVehicle...")
+
+        if 'EVENT_NO_TRIP' not in self.df.columns or 'VEHICLE_ID' not in self.df.columns:
+            print("Missing 'EVENT_NO_TRIP' or 'VEHICLE_ID' columns!")
+            return False
+
+        trip_vehicle_counts = self.df.groupby('EVENT_NO_TRIP')['VEHICLE_ID'].nunique()
+        multiple_vehicles = trip_vehicle_counts[trip_vehicle_counts > 1]
+
+        if not multiple_vehicles.empty:
+            print(f"Found {len(multiple_vehicles)} EVENT_NO_TRIP values associated with multiple VEHICLE_IDs.")
+            return False
+
+        print("Each EVENT_NO_TRIP is associated with only one VEHICLE_ID.")
+        return True
+
+    def validateEventNoTrip(self):
+        """
+        Validates that all EVENT_NO_TRIP values are non-null and non-negative integers.
+        Invalid values are set to NaN and interpolated.
+        Returns True if 'EVENT_NO_TRIP' column exists and values are valid.
+        """
+        print("Running validateEventNoTrip...")
+
+        if 'EVENT_NO_TRIP' not in self.df.columns:
+            print("Missing 'EVENT_NO_TRIP' column in the dataframe!")
+            return False
+
+        # Mark invalid values (non-integer or negative) as NaN
+        mask_invalid = ~self.df['EVENT_NO_TRIP'].apply(lambda x: isinstance(x, int) and x >= 0)
+        self.df.loc[mask_invalid, 'EVENT_NO_TRIP'] = float('nan')
+
+        if self.df['EVENT_NO_TRIP'].isna().any():
+            print(f"Interpolating {self.df['EVENT_NO_TRIP'].isna().sum()} invalid EVENT_NO_TRIP values...")
+            self.df['EVENT_NO_TRIP'] = self.df['EVENT_NO_TRIP'].interpolate(method='linear', limit_direction='both')
+
+        # Final check to ensure all values are valid after interpolation
+        still_invalid = self.df['EVENT_NO_TRIP'].isna()
+        if still_invalid.any():
+            print("Some EVENT_NO_TRIP values remain invalid or could not be interpolated.")
+            return False
+
+        print("All EVENT_NO_TRIP values are valid.")
+        return True
+
+    def validateEventNoStop(self):
+        """
+        Validates that all EVENT_NO_STOP values are non-null and non-negative integers.
+        Invalid values are set to NaN and interpolated.
+        Returns True if 'EVENT_NO_STOP' column exists and values are valid.
+        """
+        print("Running validateEventNoStop...")
+
+        if 'EVENT_NO_STOP' not in self.df.columns:
+            print("Missing 'EVENT_NO_STOP' column in the dataframe!")
+            return False
+
+        # Mark invalid values (non-integer or negative) as NaN
+        mask_invalid = ~self.df['EVENT_NO_STOP'].apply(lambda x: isinstance(x, int) and x >= 0)
+        self.df.loc[mask_invalid, 'EVENT_NO_STOP'] = float('nan')
+
+        if self.df['EVENT_NO_STOP'].isna().any():
+            print(f"Interpolating {self.df['EVENT_NO_STOP'].isna().sum()} invalid EVENT_NO_STOP values...")
+            self.df['EVENT_NO_STOP'] = self.df['EVENT_NO_STOP'].interpolate(method='linear', limit_direction='both')
+
+        # Final check to ensure all values are valid after interpolation
+        still_invalid = self.df['EVENT_NO_STOP'].isna()
+        if still_invalid.any():
+            print("Some EVENT_NO_STOP values remain invalid or could not be interpolated.")
+            return False
+
+        print("All EVENT_NO_STOP values are valid.")
+        return True
+
+    def validateMeters(self):
+        """
+        Validates that all METERS values are non-negative.
+        Invalid values are set to NaN and interpolated.
+        Returns True if 'METERS' column exists and values are valid.
+        """
+        print("Running validateMeters...")
+
+        if 'METERS' not in self.df.columns:
+            print("Missing 'METERS' column in the dataframe!")
+            return False
+
+        # Mark negative values as NaN
+        mask_negative = self.df['METERS'] < 0
+        self.df.loc[mask_negative, 'METERS'] = float('nan')
+
+        if self.df['METERS'].isna().any():
+            print(f"Interpolating {self.df['METERS'].isna().sum()} invalid METERS values...")
+            self.df['METERS'] = self.df['METERS'].interpolate(method='linear', limit_direction='both')
+
+        # Final check to ensure all values are valid after interpolation
+        still_negative = self.df['METERS'].isna()
+        if still_negative.any():
+            print("Some METERS values remain invalid or could not be interpolated.")
+            return False
+
+        print("All METERS values are valid.")
+        return True
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+from archive import ARCHIVE_PREFIX, UNKNOWN_PARTITION
+
+# Index of the partitioned breadcrumb archive.
+#
+# Every uploaded Parquet file gets one JSON line in the manifest for its
+# service date (breadcrumb_data/_manifest/service_date=<date>.ndjson) with its
+# row count, time range, vehicles and checksum. A replay reads the manifests
+# for the dates it needs and gets back only the files that can contain
+# matching rows, instead of listing and downloading every window.
+
+MANIFEST_DIR = f"{ARCHIVE_PREFIX}/_manifest"
+
+
+def manifest_path(service_date):
+    """Returns the manifest key for a service date, relative to the archive root."""
+    return f"{MANIFEST_DIR}/service_date={service_date}.ndjson"
+
+
+class ArchiveManifest:
+    """
+    Reads and appends manifest entries stored under a local root directory
+    (the subscriber's working directory, or a downloaded copy of the bucket).
+    """
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        # Manifest keys already merged with the copy in the bucket
+        self._seeded = set()
+
+    def add(self, entry):
+        """Appends an entry to its service date's manifest and returns the manifest key."""
+        with self._lock:
+            return self._append(entry)
+
+    def publish(self, entry, backend):
+        """
+        Appends an entry and uploads the updated manifest file with `backend`.
+        Both happen under the lock so concurrent uploads can't overwrite a
+        newer manifest with an older one. The first time a manifest is
+        published, the local file is merged with the bucket's copy, so a
+        fresh working directory (new host, restarted container) doesn't
+        replace the entries already uploaded. One subscriber is assumed to
+        publish at a time.
+        """
+        with self._lock:
+            key = manifest_path(entry['service_date'])
+            if key not in self._seeded:
+                self._seed(key, backend)
+                self._seeded.add(key)
+            key = self._append(entry)
+            backend.upload_file(os.path.join(self.root, key), key)
+            return key
+
+    def entries(self, service_dates=None):
+        """Returns every entry, or only those for the given service dates."""
+        if service_dates is None:
+            service_dates = self.service_dates()
+
+        entries = []
+        for service_date in service_dates:
+            path = os.path.join(self.root, manifest_path(service_date))
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                entries.extend(json.loads(line) for line in f if line.strip())
+        return entries
+
+    def service_dates(self):
+        directory = os.path.join(self.root, MANIFEST_DIR)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            name[len("service_date="):-len(".ndjson")]
+            for name in os.listdir(directory)
+            if name.startswith("service_date=") and name.endswith(".ndjson")
+        )
+
+    def select(self, start=None, end=None, vehicles=None):
+        """
+        Returns the entries of the files a replay needs: those whose time range
+        overlaps [start, end] and that contain at least one of `vehicles`.
+        start/end are datetimes (or ISO strings); None means unbounded.
+        Only the manifests for service dates that can overlap the range are read.
+        """
+        start = _isoformat(start)
+        end = _isoformat(end)
+        wanted_vehicles = set(int(v) for v in vehicles) if vehicles is not None else None
+
+        service_dates = overlapping_service_dates(self.service_dates(), start, end)
+
+        selected = []
+        for entry in self.entries(service_dates):
+            if entry['min_time'] is None:
+                continue
+            if start is not None and entry['max_time'] < start:
+                continue
+            if end is not None and entry['min_time'] > end:
+                continue
+            if wanted_vehicles is not None and wanted_vehicles.isdisjoint(entry['vehicles']):
+                continue
+            selected.append(entry)
+
+        return sorted(selected, key=lambda entry: (entry['min_time'], entry['path']))
+
+    def _seed(self, key, backend):
+        """Adds the bucket's entries for `key` that the local manifest doesn't have yet."""
+        path = os.path.join(self.root, key)
+        remote_path = f"{path}.remote"
+        if not backend.download_file(key, remote_path):
+            return
+        try:
+            with open(remote_path, "r", encoding="utf-8") as f:
+                remote = [line.rstrip("\n") for line in f if line.strip()]
+            local = []
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    local = [line.rstrip("\n") for line in f if line.strip()]
+
+            known = set(remote)
+            merged = remote + [line for line in local if line not in known]
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.writelines(line + "\n" for line in merged)
+            os.replace(f"{path}.tmp", path)
+        finally:
+            os.remove(remote_path)
+
+    def _append(self, entry):
+        key = manifest_path(entry['service_date'])
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        record = {k: v for k, v in entry.items() if k != 'local_path'}
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        return key
+
+
+def overlapping_service_dates(service_dates, start=None, end=None):
+    """Returns the service dates whose trips can fall inside [start, end]."""
+    start = _isoformat(start)
+    end = _isoformat(end)
+
+    # A service day's trips can run a few hours past midnight, so the
+    # previous service date can still overlap `start`
+    return [
+        service_date for service_date in service_dates
+        if service_date != UNKNOWN_PARTITION
+        and (start is None or service_date >= _previous_day(start[:10]))
+        and (end is None or service_date <= end[:10])
+    ]
+
+
+def _isoformat(value):
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+
+def _previous_day(service_date):
+    return (date.fromisoformat(service_date) - timedelta(days=1)).isoformat()
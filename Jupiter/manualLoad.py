@@ -1,64 +1,27 @@
-import json
-import os
-from datetime import datetime          # still here in case your Transformer uses it
-import pandas as pd
+from archive import read_archive_frame
+from stages import validate_batch, transform_batch, simplify_batch, load_batch, DECODE_COLUMNS
 
-from transformer import Transformer
-from dataValidation import Validation
-from insert import DataFrameSQLInserter
+# Loads a single archive file by hand. To reload a time range or a set of
+# vehicles from the partitioned archive, use replay.py instead.
 
 
 def validate_transform_load(json_file_path: str) -> None:
-
-    # ────────────────── 1. LOAD ──────────────────
-    with open(json_file_path, "r", encoding="utf-8") as f:
-        payload = json.load(f)
-
-    messages = payload.get("messages")
-    if not isinstance(messages, list):
-        raise ValueError(
-            f"{json_file_path} must contain a top-level 'messages' array"
-        )
-
-    # ────────────────── 2. PARSE STRINGS → LIST[DICT] ──────────────────
-    parsed = [
-        dict(field.strip().split(": ", 1) for field in msg.split(", "))
-        for msg in messages
-    ]
-    df = pd.DataFrame(parsed)
-
-    # ───── Optional numeric coercions ─────
-    numeric_cols = [
-        "EVENT_NO_TRIP",
-        "EVENT_NO_STOP",
-        "VEHICLE_ID",
-        "METERS",
-        "ACT_TIME",
-        "GPS_LONGITUDE",
-        "GPS_LATITUDE",
-        "GPS_SATELLITES",
-        "GPS_HDOP",
-    ]
-    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
-
-    # ────────────────── 3. VALIDATE, TRANSFORM, RE-VALIDATE ──────────────────
-    validator = Validation(df)
-    validator.validateBeforeTransform()
-    validated_df = validator.get_dataframe()
-
-    transformer = Transformer(validated_df)
-    transformer.transform()
-    transformed_df = transformer.get_dataframe()
-
-    Validation(transformed_df).validateAfterTransform()
+    """
+    Validates, transforms and inserts one archive file.
+    """
+
+    # ────────────────── 1. LOAD + DECODE ──────────────────
+    # Accepts Parquet windows, .ndjson.gz segments and the old JSON dumps.
+    # Parquet archives are already typed, so there is nothing to parse.
+    # Only the columns the later steps read are built.
+    df = read_archive_frame(json_file_path, columns=list(DECODE_COLUMNS))
+
+    # ────────────────── 2. VALIDATE, TRANSFORM, RE-VALIDATE ──────────────────
+    transformed_df = transform_batch(validate_batch(df), summarize=True)
     print(transformed_df)
 
-    # ────────────────── 4. INSERT INTO DB ──────────────────
-    db_uri = os.getenv("DB_URI")
-    breadcrumb_df = Transformer.createBreadcrumbDF(transformed_df)
-    
-    with DataFrameSQLInserter(db_uri) as inserter:
-        inserter.insert_dataframe(breadcrumb_df, "breadcrumb")
+    # ────────────────── 3. INSERT INTO DB (breadcrumb and trip_stats) ──────────────────
+    load_batch(simplify_batch(transformed_df))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+import queue
+import threading
+import time
+
+# Used to run the subscriber's per-window work as a chain of stages
+# (e.g. decode -> validate -> transform -> load). Every stage runs on its
+# own worker thread and hands its output to the next stage through a
+# bounded queue, so a slow stage pushes back on the ones before it instead
+# of letting windows pile up in memory.
+
+_STOP = object()
+
+
+class StageStats:
+    """
+    Counters for a single stage. Updated only by the stage's worker thread.
+    """
+    def __init__(self):
+        self.items = 0
+        self.rows = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def throughput(self):
+        """Rows processed per second of time spent inside the stage function."""
+        if self.busy_seconds == 0:
+            return 0.0
+        return self.rows / self.busy_seconds
+
+
+class Stage:
+    """
+    Wraps a function that takes one item and returns the item for the next stage.
+    Returning None drops the item (e.g. an empty window).
+    """
+    def __init__(self, name, func, maxsize=2):
+        self.name = name
+        self.func = func
+        self.inbox = queue.Queue(maxsize=maxsize)
+        self.stats = StageStats()
+        self.next_stage = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def put(self, item):
+        """Blocks while the stage's queue is full (backpressure)."""
+        self.inbox.put(item)
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.inbox.qsize())
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                if self.next_stage is not None:
+                    self.next_stage.put(_STOP)
+                return
+
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                self.stats.errors += 1
+                print(f"Error in stage '{self.name}': {e}")
+                continue
+            finally:
+                self.stats.busy_seconds += time.perf_counter() - start
+
+            self.stats.items += 1
+            self.stats.rows += _row_count(item)
+
+            if result is not None and self.next_stage is not None:
+                self.next_stage.put(result)
+
+
+class Pipeline:
+    """
+    Chains stages together and reports per-stage throughput and queue depth.
+    """
+    def __init__(self, stages, report_interval=None):
+        self.stages = stages
+        self.report_interval = report_interval
+        self._stop_reporting = threading.Event()
+        self._reporter = None
+
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+        if self.report_interval:
+            self._reporter = threading.Thread(target=self._report_loop, name="pipeline-report", daemon=True)
+            self._reporter.start()
+
+    def submit(self, item):
+        """Hands an item to the first stage. Blocks if that stage is backed up."""
+        self.stages[0].put(item)
+
+    def stop(self):
+        """Lets every queued item drain through the stages, then stops the workers."""
+        self.stages[0].put(_STOP)
+        for stage in self.stages:
+            stage.join()
+
+        self._stop_reporting.set()
+        if self._reporter is not None:
+            self._reporter.join()
+
+    def report(self):
+        """
+        Returns one dict per stage with its counters and current queue depth.
+        The stage with the lowest throughput is the bottleneck.
+        """
+        return [
+            {
+                "stage": stage.name,
+                "items": stage.stats.items,
+                "rows": stage.stats.rows,
+                "errors": stage.stats.errors,
+                "busy_seconds": round(stage.stats.busy_seconds, 3),
+                "rows_per_second": round(stage.stats.throughput(), 1),
+                "queue_depth": stage.inbox.qsize(),
+                "max_queue_depth": stage.stats.max_queue_depth,
+            }
+            for stage in self.stages
+        ]
+
+    def print_report(self):
+        for line in self.report():
+            print(
+                f"[{line['stage']}] items={line['items']} rows={line['rows']} "
+                f"errors={line['errors']} rows/s={line['rows_per_second']} "
+                f"queue={line['queue_depth']} (max {line['max_queue_depth']})"
+            )
+
+    def _report_loop(self):
+        while not self._stop_reporting.wait(self.report_interval):
+            self.print_report()
+
+
+def _row_count(item):
+    try:
+        return len(item)
+    except TypeError:
+        return 1
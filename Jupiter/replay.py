@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from archive import read_columnar, iter_columnar, file_checksum, EVENT_TIME
+from manifest import ArchiveManifest, MANIFEST_DIR, overlapping_service_dates
+from stages import validate_batch, validate_chunks, transform_batch, simplify_batch, load_batch, DECODE_COLUMNS
+import commonPath
+from common.uploader import GCSBackend, LocalBackend
+
+# Reloads a time range and/or a set of vehicles from the partitioned Parquet
+# archive into the DB.
+#
+#   python replay.py --start 2025-05-08T00:00 --end 2025-05-15T00:00
+#   python replay.py --start 2025-05-08 --end 2025-05-09 --vehicles 3010,3022 --workers 8
+#   python replay.py --archive /path/to/bucket/copy --start 2025-05-08 --dry-run
+#   python replay.py --start 2025-05-01 --end 2025-06-01 --chunk-rows 100000
+#
+# The manifests pick the minimal set of files, and each file is downloaded,
+# checksum-verified, read with row-group filters and validated/transformed/
+# inserted in a worker process. Finished files are recorded in a checkpoint
+# file, so re-running the same command after a failure picks up where it
+# stopped. With --chunk-rows, each file is streamed through
+# validate/transform/load a chunk of whole trips at a time, which bounds the
+# memory a worker needs for very large files.
+
+DEFAULT_BUCKET = "jakira-bucket"
+
+# Set once per worker process by _init_worker
+_backend = None
+_workdir = None
+
+
+def make_backend(bucket=None, archive=None):
+    if archive is not None:
+        return LocalBackend(archive)
+    return GCSBackend(bucket or DEFAULT_BUCKET)
+
+
+def sync_manifests(backend, root, start=None, end=None):
+    """
+    Downloads the manifests for the service dates overlapping [start, end] into `root`
+    and returns an ArchiveManifest over them.
+    """
+    names = backend.list(MANIFEST_DIR)
+    dates = [
+        os.path.basename(name)[len("service_date="):-len(".ndjson")]
+        for name in names
+        if os.path.basename(name).startswith("service_date=")
+    ]
+    for service_date in overlapping_service_dates(dates, start, end):
+        key = f"{MANIFEST_DIR}/service_date={service_date}.ndjson"
+        backend.download_file(key, os.path.join(root, key))
+
+    return ArchiveManifest(root)
+
+
+class Checkpoint:
+    """
+    Append-only record of the archive files that have been loaded.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+
+        if path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.done.add((record['path'], record['sha256']))
+
+    def is_done(self, entry):
+        return (entry['path'], entry['sha256']) in self.done
+
+    def mark(self, entry, rows):
+        self.done.add((entry['path'], entry['sha256']))
+        if self.path is None:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({'path': entry['path'], 'sha256': entry['sha256'], 'rows': rows}) + "\n")
+
+
+def row_filters(start=None, end=None, vehicles=None):
+    """Builds pyarrow filters so row groups outside the range/vehicles are skipped."""
+    filters = []
+    if start is not None:
+        filters.append((EVENT_TIME, '>=', pd.Timestamp(start)))
+    if end is not None:
+        filters.append((EVENT_TIME, '<=', pd.Timestamp(end)))
+    if vehicles is not None:
+        filters.append(('VEHICLE_ID', 'in', [int(v) for v in vehicles]))
+    return filters or None
+
+
+def _init_worker(bucket, archive, workdir):
+    global _backend, _workdir
+    _backend = make_backend(bucket, archive)
+    _workdir = workdir
+
+
+def replay_file(entry, start=None, end=None, vehicles=None, db_uri=None, chunk_rows=None):
+    """
+    Downloads one archive file and runs validate/transform/load on the matching rows,
+    in chunks of about `chunk_rows` rows if given. Runs inside a worker process.
+    Returns the number of rows inserted.
+    """
+    local_path = os.path.join(_workdir, f"{os.getpid()}-{os.path.basename(entry['path'])}")
+    if not _backend.download_file(entry['path'], local_path):
+        raise FileNotFoundError(f"{entry['path']} is in the manifest but not in the archive")
+
+    try:
+        if file_checksum(local_path) != entry['sha256']:
+            raise ValueError(f"Checksum mismatch for {entry['path']}")
+
+        # Only the columns some step reads are read from the file
+        columns = list(DECODE_COLUMNS)
+        filters = row_filters(start, end, vehicles)
+        if chunk_rows is not None:
+            # Archive files are sorted by vehicle, trip and time, so the
+            # chunks arrive in the order validate_chunks needs
+            chunks = iter_columnar(local_path, columns, filters, batch_rows=chunk_rows)
+            return sum(
+                load_batch(simplify_batch(transform_batch(validated_df, summarize=True)), db_uri)
+                for validated_df in validate_chunks(chunks)
+            )
+
+        df = read_columnar(local_path, columns, filters)
+    finally:
+        os.remove(local_path)
+
+    if df.empty:
+        return 0
+    transformed_df = transform_batch(validate_batch(df), summarize=True)
+    return load_batch(simplify_batch(transformed_df), db_uri)
+
+
+def replay(entries, bucket=None, archive=None, workdir=".", workers=None, checkpoint=None,
+           start=None, end=None, vehicles=None, db_uri=None, chunk_rows=None):
+    """
+    Replays the given manifest entries across a process pool.
+    Returns (files_loaded, rows_loaded, files_failed).
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    pending = [entry for entry in entries if not checkpoint.is_done(entry)]
+    skipped = len(entries) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} files already loaded according to the checkpoint.")
+
+    total_rows = sum(entry['rows'] for entry in pending)
+    print(f"Replaying {len(pending)} files ({total_rows} archived rows) with {workers or os.cpu_count()} workers...")
+
+    started = time.perf_counter()
+    files_loaded = 0
+    rows_loaded = 0
+    rows_read = 0
+    failed = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(bucket, archive, workdir)) as executor:
+        futures = {
+            executor.submit(replay_file, entry, start, end, vehicles, db_uri, chunk_rows): entry
+            for entry in pending
+        }
+        for future in as_completed(futures):
+            entry = futures[future]
+            rows_read += entry['rows']
+            try:
+                rows = future.result()
+            except Exception as e:
+                failed.append(entry)
+                print(f"Error replaying {entry['path']}: {e}")
+                continue
+
+            checkpoint.mark(entry, rows)
+            files_loaded += 1
+            rows_loaded += rows
+
+            elapsed = time.perf_counter() - started
+            rate = rows_read / elapsed if elapsed else 0.0
+            eta = (total_rows - rows_read) / rate if rate else 0.0
+            print(
+                f"[{files_loaded + len(failed)}/{len(pending)}] {entry['path']}: {rows} rows loaded "
+                f"({rate:.0f} rows/s, ETA {eta:.0f}s)"
+            )
+
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {rows_loaded} rows from {files_loaded} files in {elapsed:.1f}s; {len(failed)} files failed.")
+    return files_loaded, rows_loaded, len(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reload breadcrumbs from the partitioned archive.")
+    parser.add_argument("--start", help="ISO start time, e.g. 2025-05-08T00:00")
+    parser.add_argument("--end", help="ISO end time, e.g. 2025-05-09T00:00")
+    parser.add_argument("--vehicles", help="Comma-separated VEHICLE_IDs")
+    parser.add_argument("--bucket", default=DEFAULT_BUCKET, help="GCS bucket holding the archive")
+    parser.add_argument("--archive", help="Local directory to read the archive from instead of GCS")
+    parser.add_argument("--workdir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay"),
+                        help="Where manifests and downloaded files are kept")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--checkpoint", default="replay-checkpoint.ndjson",
+                        help="File recording which archive files have been loaded")
+    parser.add_argument("--chunk-rows", type=int, default=None,
+                        help="Validate and load each file in chunks of about this many rows")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the files that would be loaded")
+    args = parser.parse_args()
+
+    vehicles = [int(v) for v in args.vehicles.split(",")] if args.vehicles else None
+    os.makedirs(args.workdir, exist_ok=True)
+
+    backend = make_backend(args.bucket, args.archive)
+    manifest = sync_manifests(backend, args.workdir, args.start, args.end)
+    entries = manifest.select(args.start, args.end, vehicles)
+
+    if args.dry_run:
+        for entry in entries:
+            print(f"{entry['path']}  rows={entry['rows']}  {entry['min_time']} -> {entry['max_time']}")
+        print(f"{len(entries)} files, {sum(entry['rows'] for entry in entries)} rows.")
+        return
+
+    replay(
+        entries,
+        bucket=args.bucket,
+        archive=args.archive,
+        workdir=args.workdir,
+        workers=args.workers,
+        checkpoint=Checkpoint(args.checkpoint),
+        start=args.start,
+        end=args.end,
+        vehicles=vehicles,
+        chunk_rows=args.chunk_rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from transformer import Transformer
+from insert import DataFrameSQLInserter
+import commonPath
+from common.validationReport import ValidationReport, emit_report
+from tripIndex import default_trip_index
+from breadcrumbRules import breadcrumb_engine, BREADCRUMB_ENGINE, SPEED_LIMIT
+from decoder import FIELDS
+from compactTypes import COMPACT_DTYPES, compact_frame, widen_for_insert
+from tripStats import TRIP_STATS_TABLE, TripStats, merge_summaries, upsert_trip_stats, with_derived
+from trajectory import SIMPLIFY_TOLERANCE, DROPPED_TABLE, simplify_frame
+from frameBackend import frame_backend
+from tripState import correct_late, update_speeds
+
+# The per-window steps that come after decoding. Shared by the live
+# subscriber (subLoop) and the archive replay (replay / manualLoad).
+
+# Projection pushdown: the decoded columns each step reads. Windows are
+# decoded (or read from the archive) with DECODE_COLUMNS only, and
+# validation hands on just TRANSFORM_COLUMNS, so e.g. GPS_SATELLITES and
+# GPS_HDOP are never built and EVENT_NO_STOP is gone once it's validated.
+VALIDATE_COLUMNS = BREADCRUMB_ENGINE.columns()
+TRANSFORM_COLUMNS = Transformer.INPUT_COLUMNS
+DECODE_COLUMNS = tuple(field for field in FIELDS if field in VALIDATE_COLUMNS + TRANSFORM_COLUMNS)
+
+# transform_release leaves the corrected speeds of breadcrumbs that were
+# already loaded (trip_id, tstamp, speed) in the window's attrs under this key
+SPEED_CORRECTIONS = 'speed_corrections'
+# transform_batch leaves the window's trip_stats rows in its attrs under this
+# key, so load_batch upserts them in the transaction of their breadcrumbs
+TRIP_SUMMARY = 'trip_stats'
+
+# The engines validate_batch/validate_chunks have run (one per trip index),
+# so fast_path_rate reads the counters of the windows actually validated
+_engines_used = set()
+
+def project(df, columns):
+    """Drops the columns of df that aren't in `columns` (without copying the rest)."""
+    unused = [column for column in df.columns if column not in columns]
+    return df.drop(columns=unused) if unused else df
+
+def prepare_batch(df):
+    """Projects a decoded window to DECODE_COLUMNS and, with $COMPACT_DTYPES, shrinks its dtypes."""
+    df = project(df, DECODE_COLUMNS)
+    return compact_frame(df) if COMPACT_DTYPES else df
+
+def validate_batch(df, trip_index=None):
+    """
+    Validates a decoded window. Trips are checked against the vehicles seen
+    in earlier windows with `trip_index` (by default the one at $TRIP_INDEX).
+    Runs on the $FRAME_BACKEND backend (see frameBackend).
+    """
+    if trip_index is None:
+        trip_index = default_trip_index()
+    _engines_used.add(breadcrumb_engine(trip_index))
+    validated_df, report = frame_backend().validate(prepare_batch(df), trip_index)
+    emit_report(report)
+    record_trips(trip_index, validated_df)
+    return project(validated_df, TRANSFORM_COLUMNS)
+
+def validate_chunks(chunks, trip_index=None):
+    """
+    Chunked validate_batch for windows too large to validate in one piece.
+    `chunks` are DataFrames ordered by trip and time (e.g. archive.iter_columnar);
+    yields validated DataFrames that each hold whole trips, so they can be
+    transformed and loaded one at a time. One report covers all the chunks.
+    """
+    if trip_index is None:
+        trip_index = default_trip_index()
+    engine = breadcrumb_engine(trip_index)
+    _engines_used.add(engine)
+    report = ValidationReport('breadcrumb', 'before_transform', 0)
+    rows_out = 0
+
+    def counted(chunks):
+        for chunk in chunks:
+            report.rows_in += len(chunk)
+            yield prepare_batch(chunk)
+
+    for validated_df, counts in engine.run_chunks(counted(chunks)):
+        for name, rule_counts in counts.items():
+            report.add(name, rule_counts, rule_counts.get('checked', 0))
+        rows_out += len(validated_df)
+        record_trips(trip_index, validated_df)
+        yield project(validated_df, TRANSFORM_COLUMNS)
+
+    report.finish(rows_out)
+    emit_report(report)
+
+def record_trips(trip_index, validated_df):
+    """Adds the trips of a validated (repaired) window to `trip_index` for the next windows to be checked against."""
+    if 'EVENT_NO_TRIP' in validated_df.columns and 'VEHICLE_ID' in validated_df.columns:
+        trip_index.record(validated_df['EVENT_NO_TRIP'], validated_df['VEHICLE_ID'])
+
+def fast_path_rate():
+    """Fraction of windows validate_batch/validate_chunks found clean and passed straight through."""
+    engines = list(_engines_used)
+    runs = sum(engine.runs for engine in engines)
+    return sum(engine.fast_path_runs for engine in engines) / runs if runs else 0.0
+
+def transform_batch(validated_df, trip_state=None, summarize=False):
+    """
+    Transforms a validated window. With a `trip_state` (tripState.TripStateStore)
+    the speeds continue from the trips' last points in earlier windows, so
+    windows must be passed in order. With `summarize`, the window's per-trip
+    summary (see tripStats) is left in its attrs under TRIP_SUMMARY for
+    load_batch. Runs on the $FRAME_BACKEND backend (see frameBackend).
+    """
+    trip_stats = TripStats() if summarize else None
+    transformed_df, report = frame_backend().transform(validated_df, trip_state, trip_stats)
+    if trip_state is not None:
+        trip_state.checkpoint()
+    emit_report(report)
+    if trip_stats is not None:
+        summaries = trip_stats.drain()
+        if summaries is not None:
+            transformed_df.attrs[TRIP_SUMMARY] = summaries
+    return transformed_df
+
+def transform_release(release, trip_state=None, summarize=False):
+    """
+    Transforms what an eventTime.EventTimeBuffer released. The on-time rows
+    are in order, so their speeds carry over through `trip_state`. Late rows
+    are transformed on their own, so they never move the carried state
+    backwards; with a `trip_state` they are then measured against the points
+    it remembers (tripState.correct_late). A late row takes the speed since
+    the point before it, and the corrected speed of the point after it, which
+    was loaded already, is left under SPEED_CORRECTIONS for load_batch.
+    With `summarize`, the summary of both is left under TRIP_SUMMARY.
+    Returns None when nothing was released.
+    """
+    transformed = []
+    corrections = None
+    if len(release.on_time):
+        transformed.append(transform_batch(release.on_time, trip_state, summarize))
+    if len(release.late):
+        print(f"Correcting {len(release.late)} late breadcrumbs")
+        late = release.late
+        if trip_state is not None:
+            # Before transform_batch renames and drops the columns
+            late_times = pd.to_numeric(late['ACT_TIME'], errors='coerce').to_numpy(dtype=float)
+            late_speed, successors = correct_late(trip_state, late['EVENT_NO_TRIP'], late['METERS'], late_times)
+        late_df = transform_batch(late, summarize=summarize)
+        if trip_state is not None:
+            late_df, corrections = _correct_speeds(late_df, late_times, late_speed, successors)
+        transformed.append(late_df)
+
+    if not transformed:
+        return None
+    # concat can't compare attrs that hold DataFrames, so they're set afterwards
+    summaries = [df.attrs.pop(TRIP_SUMMARY) for df in transformed if TRIP_SUMMARY in df.attrs]
+    transformed_df = pd.concat(transformed, ignore_index=True)
+    if summaries:
+        transformed_df.attrs[TRIP_SUMMARY] = with_derived(merge_summaries(summaries))
+    if corrections is not None and len(corrections):
+        transformed_df.attrs[SPEED_CORRECTIONS] = corrections
+    return transformed_df
+
+def _correct_speeds(late_df, late_times, late_speed, successors):
+    """
+    Puts correct_late's speeds into the transformed late rows, and turns its
+    successors into (trip_id, tstamp, speed) rows for load_batch. Speeds the
+    after-transform check would reject are left as they were.
+    """
+    def plausible(speed):
+        return np.isfinite(speed) & (speed <= SPEED_LIMIT)
+
+    speed = late_df['speed'].to_numpy(dtype=float, copy=True)
+    corrected = plausible(late_speed)
+    speed[corrected] = late_speed[corrected]
+    late_df = late_df.assign(speed=speed)
+
+    trips = successors['trip_id'].to_numpy()
+    successors = successors[plausible(successors['speed'].to_numpy()) & (trips == np.trunc(trips))]
+    after = successors['after'].to_numpy()
+    # The successor is on the late point's service date
+    offset = pd.to_timedelta(successors['act_time'].to_numpy() - late_times[after], unit='s')
+    corrections = pd.DataFrame({
+        'trip_id': successors['trip_id'].to_numpy(dtype=np.int64),
+        'tstamp': late_df['tstamp'].to_numpy()[after] + offset.to_numpy(),
+        'speed': successors['speed'].to_numpy(),
+    })
+    return late_df, corrections
+
+def simplify_batch(transformed_df, tolerance=SIMPLIFY_TOLERANCE):
+    """
+    Marks the breadcrumbs that lie within `tolerance` meters of their trip's
+    simplified line (see trajectory); load_batch stores those in
+    breadcrumb_dropped instead of breadcrumb. Off when tolerance is 0.
+    """
+    if tolerance <= 0 or transformed_df.empty:
+        return transformed_df
+    return simplify_frame(transformed_df, tolerance)
+
+def load_batch(transformed_df, db_uri=None):
+    """
+    Inserts the breadcrumbs into the DB, and upserts the window's trip summary
+    (TRIP_SUMMARY, see transform_batch) into trip_stats. Breadcrumbs
+    simplified away by simplify_batch go to breadcrumb_dropped. The speeds
+    transform_release corrected for breadcrumbs loaded earlier are updated in
+    breadcrumb. All of it is one transaction, so a window's trip_stats are
+    never committed without its breadcrumbs. Returns the number of
+    breadcrumbs inserted into breadcrumb.
+    """
+    if db_uri is None:
+        db_uri = os.getenv("DB_URI")
+    corrections = transformed_df.attrs.get(SPEED_CORRECTIONS)
+    summaries = transformed_df.attrs.get(TRIP_SUMMARY)
+
+    dataframe_dropped = None
+    if 'deviation' in transformed_df.columns:
+        dropped = transformed_df['deviation'].notna()
+        dataframe_dropped = Transformer.createDroppedDF(transformed_df[dropped])
+        transformed_df = transformed_df[~dropped]
+
+    #dataframe_trip = Transformer.createTripDF(transformed_df)
+    dataframe_breadcrumb = Transformer.createBreadcrumbDF(transformed_df)
+    if COMPACT_DTYPES:
+        # Same values as without compact dtypes
+        dataframe_breadcrumb = widen_for_insert(dataframe_breadcrumb)
+        if dataframe_dropped is not None:
+            dataframe_dropped = widen_for_insert(dataframe_dropped)
+
+    with DataFrameSQLInserter(db_uri) as inserter, inserter.transaction():
+        # We no longer insert into 'trip' table after Milestone2.
+        #inserter.insert_dataframe(dataframe_trip, "trip")
+        inserter.insert_dataframe(dataframe_breadcrumb, "breadcrumb")
+        if dataframe_dropped is not None and len(dataframe_dropped):
+            inserter.insert_dataframe(dataframe_dropped, DROPPED_TABLE)
+        if corrections is not None:
+            inserter.insert_dataframe(corrections, "breadcrumb", method=update_speeds)
+
+        if summaries is not None:
+            if COMPACT_DTYPES:
+                summaries = widen_for_insert(summaries)
+            inserter.insert_dataframe(summaries, TRIP_STATS_TABLE, method=upsert_trip_stats)
+
+    return len(dataframe_breadcrumb)
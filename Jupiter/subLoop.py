@@ -1,113 +1,212 @@
-import json
 import os
-from google.cloud import pubsub_v1, storage
+from google.cloud import pubsub_v1
 from concurrent.futures import TimeoutError
 from datetime import datetime
-import pandas as pd
-from transformer import Transformer
-from dataValidation import Validation
-from insert import DataFrameSQLInserter
-from json import load
-
-def upload_to_gcs(bucket_name, source_file_path, destination_blob_name):
-    """Uploads a file to the bucket."""
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
-    blob.upload_from_filename(source_file_path)
-    print(f"File {source_file_path} uploaded to {destination_blob_name}.")
-    return f"gs://{bucket_name}/{destination_blob_name}"
+from stages import validate_batch, transform_batch, transform_release, simplify_batch, load_batch, fast_path_rate, project, DECODE_COLUMNS
+from pipeline import Pipeline, Stage
+import commonPath
+from common.messageBuffer import MessageBuffer
+from archive import RollingArchiveWriter, write_partitioned, ARCHIVE_PREFIX, ARCHIVE_DIR
+from manifest import ArchiveManifest
+from decoder import decode_messages
+from common.uploader import BackgroundUploader, GCSBackend
+from tripState import default_trip_state
+from trajectory import SIMPLIFY_TOLERANCE
+from compactTypes import COMPACT_DTYPES, COMPACT_STATS
+from eventTime import EventTimeBuffer
+
+class Window:
+    """
+    One pull window as it moves through the pipeline: the raw messages, the
+    sealed segment they were written to as they arrived, and, once decoded,
+    the DataFrame.
+    """
+    def __init__(self, started_at, messages, archive_path=None):
+        self.started_at = started_at
+        self.messages = messages
+        self.archive_path = archive_path
+        self.df = None
+
+    def __len__(self):
+        if self.df is not None:
+            return len(self.df)
+        return len(self.messages)
 
 def fetch():
     project_id = "data-engineering-455419"
     subscription_id = "Breadcrumb_Storage-sub"
     timeout = 1800.0
     bucket_name = "jakira-bucket"
+    fsync_interval = 5.0
+    archive_format = "parquet"
 
-    messages = []
+    messages = MessageBuffer()
+    archive_writer = RollingArchiveWriter(ARCHIVE_DIR, fsync_interval=fsync_interval)
 
     def callback(message: pubsub_v1.subscriber.message.Message) -> None:
-        messages.append(message.data.decode('utf-8'))
+        data = message.data.decode('utf-8')
+        archive_writer.write(data)
+        messages.append(data)
         message.ack()
 
-    while True:
-        today_date = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        filename = os.path.join(script_dir, f"data-{today_date}.json")
-        gcs_filename = f"breadcrumb_data/data-{today_date}.json"
+    # Archives go to GCS in the background so DB loads never wait on an upload
+    uploader = BackgroundUploader(GCSBackend(bucket_name))
+    uploader.start()
 
-        subscriber = pubsub_v1.SubscriberClient()
-        subscription_path = subscriber.subscription_path(project_id, subscription_id)
-        streaming_pull_future = subscriber.subscribe(subscription_path, callback=callback)
-        print(f"Listening for messages on {subscription_path}..\n")
+    # Breadcrumbs are put back in ACT_TIME order per trip (up to
+    # $WATERMARK_LATENESS seconds late) and speeds carry over between windows
+    # through the trip state at $TRIP_STATE
+    trip_state = default_trip_state()
+    event_buffer = EventTimeBuffer()
+    pipeline = build_pipeline(uploader, archive_format, archive_dir=ARCHIVE_DIR, trip_state=trip_state,
+                              event_buffer=event_buffer, summarize=True)
+    pipeline.start()
 
-        with subscriber:
-            try:
-                streaming_pull_future.result(timeout=timeout)
-            except TimeoutError:
-                streaming_pull_future.cancel()
-                streaming_pull_future.result()
-
-        data_to_save = {
-            "message_count": len(messages),
-            "messages": messages
-        }
-        with open(filename, "w") as f:
-            json.dump(data_to_save, f, indent=2)
-
-        print(f"{len(messages)} messages saved to {filename}.")
-
-        # Upload to GCS
-        gcs_path = upload_to_gcs(bucket_name, filename, gcs_filename)
-
-        # Optional: validate/load using local file
-        validateTransformLoad(messages)
+    today_date = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    archive_writer.open(today_date)
 
-        # Delete local file
-        os.remove(filename)
-        print(f"Deleted local file: {filename}")
+    try:
+        while True:
+            subscriber = pubsub_v1.SubscriberClient()
+            subscription_path = subscriber.subscription_path(project_id, subscription_id)
+            streaming_pull_future = subscriber.subscribe(subscription_path, callback=callback)
+            print(f"Listening for messages on {subscription_path}..\n")
+
+            with subscriber:
+                try:
+                    streaming_pull_future.result(timeout=timeout)
+                except TimeoutError:
+                    streaming_pull_future.cancel()
+                    streaming_pull_future.result()
+
+            # Seal this window's archive segment and start the next one. The
+            # messages were already written as they arrived, so this is only
+            # a flush and a rename.
+            next_date = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+            archive_path, archived_count = archive_writer.rotate(next_date)
+            print(f"{archived_count} messages saved to {archive_path}.")
+
+            # Swap in a fresh buffer and hand the finished window to the pipeline,
+            # so the next window is received while this one is archived and loaded.
+            # Blocks here if the pipeline is still backed up.
+            pipeline.submit(Window(today_date, messages.swap(), archive_path))
+            pipeline.print_report()
+            print(f"Validation fast path (clean windows): {fast_path_rate():.0%}")
+            if COMPACT_DTYPES:
+                print(f"Compact dtypes: {COMPACT_STATS.saved_per_million() / 1e6:.1f} MB saved per million rows")
+            today_date = next_date
+    finally:
+        # The messages received since the last swap, and their segment, go
+        # through the pipeline (and to the uploader) before everything stops
+        archive_path, archived_count = archive_writer.seal()
+        remaining = messages.swap()
+        if remaining or archive_path is not None:
+            print(f"Flushing {len(remaining)} messages received before shutdown.")
+            pipeline.submit(Window(today_date, remaining, archive_path))
+        pipeline.stop()
+        _flush_event_buffer(event_buffer, trip_state, summarize=True)
+        pipeline.print_report()
+        uploader.stop()
+
+def build_pipeline(uploader, archive_format="parquet", vehicle_shards=None, report_interval=None,
+                   archive_dir=ARCHIVE_DIR, trip_state=None, event_buffer=None, summarize=False):
+    """
+    Builds the decode -> archive -> validate -> transform -> load pipeline.
+    Each stage runs on its own thread with a bounded queue in front of it.
+    The archive stage only writes the files and queues them on `uploader`.
+    archive_format is "parquet" (decoded columns, partitioned by service date,
+    hour and optionally VEHICLE_ID % vehicle_shards) or "ndjson" (the raw segment).
+    Files are written under archive_dir ($ARCHIVE_DIR) until they're uploaded.
+    trip_state carries each trip's last point into the next window's speeds.
+    With an event_buffer (eventTime.EventTimeBuffer) an order stage holds
+    breadcrumbs back until their trip's watermark passes them.
+    With summarize, every window carries its per-trip summary, which the
+    load stage upserts into trip_stats with the window's breadcrumbs. With
+    $SIMPLIFY_TOLERANCE set, a simplify stage moves the breadcrumbs on a
+    straight line to breadcrumb_dropped.
+    """
+    manifest = ArchiveManifest(archive_dir)
+
+    def decode(window):
+        if not window.messages:
+            _remove_local(window.archive_path)
+            return None
+
+        # The Parquet archive keeps every field, so the projection only
+        # applies to the ndjson path; there only the columns the later
+        # stages read are decoded
+        columns = None if archive_format == "parquet" else DECODE_COLUMNS
+        window.df = decode_messages(window.messages, columns)
+        window.messages = None
+        return window
+
+    def archive(window):
+        # Upload the decoded window as partitioned Parquet; fall back to the
+        # raw segment if the columnar files can't be written.
+        if archive_format == "parquet":
+            try:
+                entries = write_partitioned(window.df, archive_dir, window.started_at, vehicle_shards)
+            except Exception as e:
+                print(f"Could not write Parquet archive, archiving raw segment instead: {e}")
+            else:
+                # The raw segment is no longer needed once the Parquet files are on disk
+                _remove_local(window.archive_path)
+
+                # Queued for upload; the uploader deletes each file once it's in GCS
+                # and only then records it in the manifest
+                for entry in entries:
+                    uploader.submit(
+                        entry['local_path'],
+                        entry['path'],
+                        on_success=lambda backend, entry=entry: manifest.publish(entry, backend),
+                    )
+                return project(window.df, DECODE_COLUMNS)
+
+        if window.archive_path is not None:
+            uploader.submit(window.archive_path, f"{ARCHIVE_PREFIX}/{os.path.basename(window.archive_path)}")
+
+        return project(window.df, DECODE_COLUMNS)
+
+    if event_buffer is None:
+        ordering = []
+        transform = lambda df: transform_batch(df, trip_state, summarize)
+    else:
+        ordering = [Stage("order", event_buffer.push)]
+        transform = lambda release: transform_release(release, trip_state, summarize)
+
+    simplifying = [Stage("simplify", simplify_batch)] if SIMPLIFY_TOLERANCE > 0 else []
+
+    return Pipeline([
+        Stage("decode", decode),
+        Stage("archive", archive),
+        Stage("validate", validate_batch),
+        *ordering,
+        Stage("transform", transform),
+        *simplifying,
+        Stage("load", load_batch),
+    ], report_interval=report_interval)
+
+def _flush_event_buffer(event_buffer, trip_state, summarize=False):
+    """Loads the breadcrumbs still waiting for their watermark once the pipeline has stopped."""
+    try:
+        transformed_df = transform_release(event_buffer.flush(), trip_state, summarize)
+        if transformed_df is not None:
+            load_batch(simplify_batch(transformed_df))
+    except Exception as e:
+        print(f"Could not load the buffered breadcrumbs: {e}")
 
-        # Clear message buffer
-        messages.clear()
+def _remove_local(file_path):
+    if file_path is not None and os.path.exists(file_path):
+        os.remove(file_path)
+        print(f"Deleted local file: {file_path}")
 
 def validateTransformLoad(raw_messages):
+    """
+    Runs every stage serially on the calling thread.
+    """
     try:
-        # Step 1: Convert list of strings to list of dictionaries
-        parsed_messages = []
-        for msg in raw_messages:
-            fields = dict(field.strip().split(': ', 1) for field in msg.split(', '))
-            parsed_messages.append(fields)
-
-        # Step 2: Convert to DataFrame
-        df = pd.DataFrame(parsed_messages)
-
-        # Optional: Convert numeric columns
-        numeric_cols = ['EVENT_NO_TRIP', 'EVENT_NO_STOP', 'VEHICLE_ID', 'METERS', 'ACT_TIME',
-                        'GPS_LONGITUDE', 'GPS_LATITUDE', 'GPS_SATELLITES', 'GPS_HDOP']
-        for col in numeric_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-        # Instantiate the Validator
-        validator = Validation(df)
-        validator.validateBeforeTransform()
-        validated_df = validator.get_dataframe()
-
-        transformer = Transformer(validated_df)
-        transformer.transform()
-        transformed_df = transformer.get_dataframe()
-
-        Validation(transformed_df).validateAfterTransform()
-
-        db_uri = os.getenv("DB_URI")
-
-        #dataframe_trip = Transformer.createTripDF(transformed_df)
-        dataframe_breadcrumb = Transformer.createBreadcrumbDF(transformed_df)
-
-        with DataFrameSQLInserter(db_uri) as inserter:
-            # We no longer insert into 'trip' table after Milestone2.
-            #inserter.insert_dataframe(dataframe_trip, "trip")
-            inserter.insert_dataframe(dataframe_breadcrumb, "breadcrumb")
-
+        transformed_df = transform_batch(validate_batch(decode_messages(raw_messages, DECODE_COLUMNS)), summarize=True)
+        load_batch(simplify_batch(transformed_df))
     except Exception as e:
         print(f"Error in validateTransformLoad: {e}")
 
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+
+import commonPath
+from common.tripInterpolation import TripGroups
+
+# Trajectory simplification for the breadcrumb table.
+#
+# A bus reports every 5 seconds whether it is moving or not, so long runs
+# of breadcrumbs lie on a straight line (or on one spot). simplify() is
+# Douglas-Peucker with a tolerance in meters, run on every trip of a window
+# at once: each pass looks at every segment between two kept points, finds
+# the point furthest from it and keeps that point if it is further than the
+# tolerance, until no segment needs splitting. The first and last point of
+# every trip are always kept.
+#
+# Dropped points aren't lost: load_batch writes them to breadcrumb_dropped
+# (SQL/breadcrumb_dropped.sql) with their distance from the simplified line,
+# so the full trajectory is the union of the two tables.
+
+# 0 (the default) turns simplification off
+SIMPLIFY_TOLERANCE = float(os.getenv("SIMPLIFY_TOLERANCE", 0))
+
+DROPPED_TABLE = "breadcrumb_dropped"
+
+# Meters per degree of latitude; a degree of longitude is this times cos(latitude)
+METERS_PER_DEGREE = 111_320.0
+
+
+def simplify(trips, times, latitude, longitude, tolerance):
+    """
+    Returns (keep, deviation) in row order: `keep` is True for the points of
+    the simplified trajectories, `deviation` is the distance in meters of
+    every dropped point from its simplified segment (NaN for kept points).
+    Points with a missing coordinate are always kept.
+    """
+    groups = TripGroups(trips, times)
+    latitude = groups.sort(np.asarray(latitude, dtype=float))
+    longitude = groups.sort(np.asarray(longitude, dtype=float))
+
+    # Local flat projection; a window covers a small area
+    scale = np.cos(np.radians(np.nanmean(latitude))) if len(latitude) else 1.0
+    x = longitude * METERS_PER_DEGREE * scale
+    y = latitude * METERS_PER_DEGREE
+
+    # Trip ends, and points with a missing coordinate together with their
+    # neighbours, so no segment has an end that can't be measured from
+    missing = np.isnan(x) | np.isnan(y)
+    keep = groups.is_first | (groups.positions == groups.last) | missing
+    keep[:-1] |= missing[1:]
+    keep[1:] |= missing[:-1]
+    deviation = np.full(len(x), np.nan)
+
+    # Sorted positions of the points in segments that may still be split,
+    # with the kept points at both ends of those segments
+    active = groups.positions
+    while len(active):
+        kept = keep[active]
+        starts = np.flatnonzero(kept)
+        # Every point's segment: from the kept point at or before it to the
+        # next kept one (always in the same trip, since trip ends are kept)
+        segment = np.cumsum(kept) - 1
+        start = active[starts[segment]]
+        end = active[starts[np.minimum(segment + 1, len(starts) - 1)]]
+
+        distance = _segment_distance(x, y, active, start, end)
+        distance[kept] = -1.0
+        deviation[active[~kept]] = distance[~kept]
+
+        worst = np.maximum.reduceat(distance, starts)
+        split = worst > tolerance
+        if not split.any():
+            break
+
+        # The first point at the maximum of every segment that is split
+        in_split = split[segment]
+        furthest = np.flatnonzero(in_split & (distance == worst[segment]))
+        _, first = np.unique(segment[furthest], return_index=True)
+        keep[active[furthest[first]]] = True
+
+        # Segments that weren't split are final
+        ends_split = np.r_[False, in_split[:-1]] & kept
+        active = active[in_split | ends_split]
+
+    deviation[keep] = np.nan
+    return groups.unsort(keep), groups.unsort(deviation)
+
+
+def simplify_frame(df, tolerance=SIMPLIFY_TOLERANCE):
+    """
+    Simplifies a transformed window (trip_id, tstamp, latitude, longitude).
+    Returns df with a 'deviation' column: NaN for the points that are kept,
+    the distance from the simplified line for the ones load_batch moves to
+    DROPPED_TABLE.
+    """
+    _, deviation = simplify(df['trip_id'], df['tstamp'], df['latitude'], df['longitude'], tolerance)
+    return df.assign(deviation=deviation)
+
+
+def _segment_distance(x, y, points, start, end):
+    """Distance of each of `points` from the segment between positions start and end."""
+    px, py = x[points], y[points]
+    ax, ay = x[start], y[start]
+    dx, dy = x[end] - ax, y[end] - ay
+    length = dx * dx + dy * dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        along = np.clip(((px - ax) * dx + (py - ay) * dy) / length, 0.0, 1.0)
+    # A segment of zero length (the bus didn't move) is a point
+    along[length == 0] = 0.0
+    return np.hypot(px - (ax + along * dx), py - (ay + along * dy))
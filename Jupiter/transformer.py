@@ -1,12 +1,28 @@
+import numpy as np
 import pandas as pd
 import json
 
+from decoder import parse_service_dates
+import commonPath
+from common.tripInterpolation import TripGroups
+from tripStats import summarize_trips
+from tripState import carry_speed
+
 # Used to transform data in a dataframe to 
 # match validations and adhere to the database schema
 
 class Transformer:
-    def __init__(self, df):
+    # The decoded columns transform() reads; the rest are dropped before it runs
+    INPUT_COLUMNS = ('EVENT_NO_TRIP', 'VEHICLE_ID', 'GPS_LATITUDE', 'GPS_LONGITUDE',
+                     'METERS', 'ACT_TIME', 'OPD_DATE')
+
+    def __init__(self, df, trip_state=None, trip_stats=None):
         self.df = df
+        # tripState.TripStateStore with the last point of every trip seen in
+        # earlier windows; None treats every window on its own
+        self.trip_state = trip_state
+        # tripStats.TripStats that the window's per-trip summary is added to
+        self.trip_stats = trip_stats
     
     def get_dataframe(self):
         """Returns the internal DataFrame. Used for testing this class"""
@@ -22,6 +38,9 @@ class Transformer:
         self.createSpeed()
         self.createTimestamp()
         self.renameColumns()
+        if self.trip_stats is not None:
+            # Before dropColumns, while METERS is still there
+            self.trip_stats.add(self.createTripStats())
         self.dropColumns()
         
     def createSpeed(self):
@@ -32,30 +51,52 @@ class Transformer:
 
         This is computed within each EVENT_NO_TRIP group (i.e., per trip).
         The first row of each group will have its speed set equal to the next row's speed if available.
-        """
+        With a trip_state, the first row is measured from the trip's last point
+        in an earlier window instead, and the state is updated with this window.
 
-        def compute_speed(group):
-            delta_meters = group['METERS'].diff()
-            delta_time = group['ACT_TIME'].diff()
-            speed = delta_meters / delta_time
-
-            # Fill first row's speed with second row's speed if available
-            if len(speed) > 1:
-                speed.iloc[0] = speed.iloc[1]
-            return speed
-
-        self.df['speed'] = (
-            self.df
-            .groupby('EVENT_NO_TRIP', group_keys=False)[['METERS', 'ACT_TIME']]
-            .apply(compute_speed)
-        )
+        The window is sorted once by (trip, ACT_TIME) and the differences are
+        taken over the whole array; the rows where a new trip starts are then
+        fixed up with masks, so there is no Python call per trip.
+        """
+        groups = TripGroups(self.df['EVENT_NO_TRIP'], self.df['ACT_TIME'])
+        meters = groups.sort(pd.to_numeric(self.df['METERS'], errors='coerce').to_numpy(dtype=float))
+        times = groups.sort(pd.to_numeric(self.df['ACT_TIME'], errors='coerce').to_numpy(dtype=float))
+
+        speed = np.full(len(meters), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed[1:] = np.diff(meters) / np.diff(times)
+
+        # The first row of a trip has no previous row; it takes the second row's
+        # speed, or stays NaN for single-row trips
+        speed[groups.is_first] = np.nan
+        has_second = groups.is_first & (groups.last > groups.positions)
+        speed[has_second] = speed[np.flatnonzero(has_second) + 1]
+
+        if self.trip_state is not None:
+            self._carrySpeed(groups, meters, times, speed)
+
+        speed = groups.unsort(speed)
+        # Rows without a trip aren't part of any trip
+        speed[self.df['EVENT_NO_TRIP'].isna().to_numpy()] = np.nan
+        self.df['speed'] = speed
     
+    def _carrySpeed(self, groups, meters, times, speed):
+        """
+        Replaces the first speed of every trip with the speed since the trip's
+        last point in the state store, and stores this window's last points.
+        The arrays are in trip/time order.
+        """
+        first = np.flatnonzero(groups.is_first)
+        trips = groups.sort(self.df['EVENT_NO_TRIP'].to_numpy())[first]
+        carry_speed(self.trip_state, trips, meters, times, speed, first, groups.last[first])
+
     def createTimestamp(self):
         """
         Compute timestamp (tstamp) from ODP_DATE and ACT_TIME
         """
-        # Convert 'OPD_DATE' to datetime objects
-        base_dates = pd.to_datetime(self.df['OPD_DATE'], format='%d%b%Y:%H:%M:%S')
+        # Convert 'OPD_DATE' to datetime objects. Validation already leaves it
+        # as datetime64, in which case this is a no-op
+        base_dates = parse_service_dates(self.df['OPD_DATE'])
 
         # Convert 'ACT_TIME' to timedelta (seconds)
         time_offsets = pd.to_timedelta(self.df['ACT_TIME'], unit='s')
@@ -63,6 +104,13 @@ class Transformer:
         # Compute the final TIMESTAMP by adding the time offset to the base date
         self.df['tstamp'] = base_dates + time_offsets
     
+    def createTripStats(self):
+        """
+        Summarizes the window per trip (points, time span, meters, max speed,
+        bounding box) for the trip_stats table. See tripStats.
+        """
+        return summarize_trips(self.df)
+
     def renameColumns(self):
         """
         Renames columns to match database schema.
@@ -99,6 +147,13 @@ class Transformer:
             
             return breadcrumb_df
 
+    def createDroppedDF(df):
+            # Breadcrumbs removed by trajectory simplification, with their
+            # distance (meters) from the simplified line
+            dropped_df = df[['tstamp', 'latitude', 'longitude', 'speed', 'trip_id', 'deviation']].copy()
+
+            return dropped_df
+
 def main():
     """
         Main function used for TESTING purposes. Include a local json file
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Persistent trip -> vehicle index.
+#
+# validateTripIdOneVehicle can only compare rows inside one window, so a trip
+# that is split across two windows was never cross-checked. The index keeps
+# the vehicle first seen for every trip in a local SQLite file. Each batch
+# sends its distinct trips in one statement, gets back the recorded vehicles
+# and compares them to every row with a vectorized lookup, without a round
+# trip to Postgres. New trips are recorded only once their window has been
+# validated and repaired, so a bad trip id is never remembered.
+
+INDEX_PATH = os.getenv("TRIP_INDEX", "trip-index.sqlite")
+
+
+class TripVehicleIndex:
+    """
+    Maps EVENT_NO_TRIP to the VEHICLE_ID first seen for it, across all batches.
+    Safe to share between threads; separate processes can open the same file.
+    """
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS trip_vehicle ("
+                "trip_id INTEGER PRIMARY KEY, vehicle_id INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            self.connection.execute(
+                "CREATE TEMP TABLE batch (trip_id INTEGER PRIMARY KEY, vehicle_id INTEGER NOT NULL)"
+            )
+
+    def check(self, trips, vehicles):
+        """
+        Returns a boolean array that is True for the rows whose vehicle differs
+        from the one recorded for their trip (or, for a trip not recorded yet,
+        from the vehicle of its first row here). Nothing is recorded; see
+        record(). Rows with a missing vehicle, or a trip id that isn't a
+        non-negative whole number, are never flagged.
+        """
+        trip_ids, vehicle_ids, known = _ids(trips, vehicles)
+        conflicts = np.zeros(len(known), dtype=bool)
+        if not known.any():
+            return conflicts
+
+        unique_trips, first_vehicles = _first_vehicles(trip_ids, vehicle_ids)
+        with self._lock, self.connection:
+            self._load_batch(unique_trips, first_vehicles)
+            recorded = self.connection.execute(
+                "SELECT t.trip_id, t.vehicle_id FROM trip_vehicle t JOIN batch b USING (trip_id)"
+            ).fetchall()
+
+        expected = pd.Series(first_vehicles, index=unique_trips)
+        if recorded:
+            recorded = np.array(recorded, dtype=np.int64)
+            expected.loc[recorded[:, 0]] = recorded[:, 1]
+        conflicts[known] = expected.to_numpy()[np.searchsorted(unique_trips, trip_ids)] != vehicle_ids
+        return conflicts
+
+    def record(self, trips, vehicles):
+        """
+        Records the trips not seen before, with the vehicle of their first row.
+        Called with a window once it's validated and repaired, so only real
+        trip ids are kept.
+        """
+        trip_ids, vehicle_ids, known = _ids(trips, vehicles)
+        if not known.any():
+            return
+
+        unique_trips, first_vehicles = _first_vehicles(trip_ids, vehicle_ids)
+        with self._lock, self.connection:
+            self._load_batch(unique_trips, first_vehicles)
+            self.connection.execute("INSERT OR IGNORE INTO trip_vehicle SELECT trip_id, vehicle_id FROM batch")
+
+    def _load_batch(self, unique_trips, first_vehicles):
+        self.connection.execute("DELETE FROM batch")
+        self.connection.executemany("INSERT INTO batch VALUES (?, ?)",
+                                    zip(unique_trips.tolist(), first_vehicles.tolist()))
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM trip_vehicle").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+def _ids(trips, vehicles):
+    """
+    The trip and vehicle ids as int64 for the rows that have both, and the
+    mask of those rows. Trip ids must be non-negative whole numbers.
+    """
+    trips = pd.to_numeric(pd.Series(np.asarray(trips)), errors='coerce').to_numpy(dtype=float)
+    vehicles = pd.to_numeric(pd.Series(np.asarray(vehicles)), errors='coerce').to_numpy(dtype=float)
+    known = ~np.isnan(vehicles) & (trips >= 0) & (np.trunc(trips) == trips)
+    return trips[known].astype(np.int64), vehicles[known].astype(np.int64), known
+
+
+def _first_vehicles(trip_ids, vehicle_ids):
+    """The distinct trips (sorted) and the vehicle of each trip's first row."""
+    unique_trips, first = np.unique(trip_ids, return_index=True)
+    return unique_trips, vehicle_ids[first]
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def default_trip_index():
+    """The process-wide index at INDEX_PATH, opened on first use."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = TripVehicleIndex(INDEX_PATH)
+        return _default_index
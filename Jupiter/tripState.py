@@ -0,0 +1,277 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import commonPath
+from common.tripInterpolation import TripGroups
+
+# Per-trip carry-over state between windows.
+#
+# createSpeed only sees one window, so without this the first breadcrumb of
+# every trip in a window borrowed the next row's speed even when the previous
+# point had arrived in the window before. The store keeps the last
+# (METERS, ACT_TIME) of every active trip, so the first speed of a window is
+# the real difference to that point and windows can be made small.
+#
+# Trips that haven't been seen for `ttl` seconds are evicted; the store is
+# written to a small CSV snapshot so a restarted subscriber keeps going.
+#
+# A late breadcrumb (eventTime) lands between two points whose speed was
+# already computed without it. The store also keeps every trip's points of
+# the last `history` seconds of ACT_TIME (in memory only), so correct_late
+# can measure the late point from the point before it and correct the speed
+# of the point after it. Points further back than that stay uncorrected.
+
+STATE_PATH = os.getenv("TRIP_STATE", "trip-state.csv")
+STATE_TTL = float(os.getenv("TRIP_STATE_TTL", 3 * 3600))
+STATE_HISTORY = float(os.getenv("TRIP_STATE_HISTORY", 1800))
+
+
+class TripStateStore:
+    """
+    Last (METERS, ACT_TIME) of every active trip, keyed by EVENT_NO_TRIP,
+    and the trips' points of the last `history` seconds for late points.
+    `path` is where snapshot() writes and where the state is restored from;
+    None keeps it in memory only. Safe to share between threads.
+    """
+    def __init__(self, path=None, ttl=STATE_TTL, clock=time.time, history=STATE_HISTORY):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self.history = history
+        self._lock = threading.Lock()
+        self._state = _empty_state()
+        self._recent = _empty_points()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def lookup(self, trips):
+        """
+        The stored meters and act_time for every trip in `trips`, as two
+        float arrays that are NaN for unknown (or missing) trips.
+        """
+        trips = _trip_ids(trips)
+        with self._lock:
+            state = self._state
+            positions = state.index.get_indexer(pd.Index(trips))
+            meters = state['meters'].to_numpy()
+            act_time = state['act_time'].to_numpy()
+
+        found = positions >= 0
+        last_meters = np.full(len(trips), np.nan)
+        last_time = np.full(len(trips), np.nan)
+        last_meters[found] = meters[positions[found]]
+        last_time[found] = act_time[positions[found]]
+        return last_meters, last_time
+
+    def update(self, trips, meters, act_time):
+        """
+        Records the last point of each trip (one row per trip). A point older
+        than the one already stored for its trip is ignored.
+        """
+        trips = _trip_ids(trips)
+        meters = np.asarray(meters, dtype=float)
+        act_time = np.asarray(act_time, dtype=float)
+        known = ~(np.isnan(trips) | np.isnan(meters) | np.isnan(act_time))
+        # A trip id with a fractional part isn't a trip, and would collide
+        # with the whole id it truncates to
+        known &= np.trunc(trips) == trips
+        if not known.any():
+            return
+
+        points = pd.DataFrame({
+            'meters': meters[known],
+            'act_time': act_time[known],
+            'updated': self.clock(),
+        }, index=pd.Index(trips[known].astype(np.int64), name='trip_id'))
+
+        with self._lock:
+            stored = self._state['act_time'].reindex(points.index).to_numpy()
+            points = points[~(stored > points['act_time'].to_numpy())]
+            self._state = pd.concat([self._state.drop(points.index, errors='ignore'), points])
+
+    def remember(self, trips, meters, act_time):
+        """
+        Keeps the points of a window (one row per point) for late points to be
+        measured against. Points more than `history` seconds behind their
+        trip's newest point are let go.
+        """
+        points = pd.DataFrame({
+            'trip_id': _trip_ids(trips),
+            'meters': np.asarray(meters, dtype=float),
+            'act_time': np.asarray(act_time, dtype=float),
+        })
+        points = points[points.notna().all(axis=1).to_numpy()]
+        if points.empty:
+            return
+
+        with self._lock:
+            recent = pd.concat([self._recent, points], ignore_index=True)
+            newest = recent.groupby('trip_id')['act_time'].transform('max')
+            self._recent = recent[(recent['act_time'] >= newest - self.history).to_numpy()]
+
+    def recent(self, trips):
+        """The remembered points (trip_id, meters, act_time) of the trips in `trips`."""
+        trips = _trip_ids(trips)
+        with self._lock:
+            recent = self._recent
+        return recent[recent['trip_id'].isin(trips[~np.isnan(trips)]).to_numpy()]
+
+    def evict(self, now=None):
+        """Drops the trips not updated in the last `ttl` seconds. Returns how many."""
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            expired = self._state['updated'].to_numpy() < now - self.ttl
+            self._state = self._state[~expired]
+            active = self._recent['trip_id'].isin(self._state.index.to_numpy(dtype=float))
+            self._recent = self._recent[active.to_numpy()]
+        return int(expired.sum())
+
+    def snapshot(self):
+        """Writes the state to `path` (through a temporary file, so a crash leaves the old one)."""
+        if self.path is None:
+            return
+        with self._lock:
+            state = self._state
+        temp_path = f"{self.path}.tmp"
+        state.to_csv(temp_path)
+        os.replace(temp_path, self.path)
+
+    def load(self):
+        state = pd.read_csv(self.path, index_col='trip_id')
+        with self._lock:
+            self._state = state.astype({'meters': float, 'act_time': float, 'updated': float})
+
+    def checkpoint(self):
+        """Evicts the inactive trips and writes a snapshot; called once per window."""
+        self.evict()
+        self.snapshot()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._state)
+
+
+def carry_speed(state, trips, meters, times, speed, first, last):
+    """
+    Replaces the first speed of every trip with the speed since the trip's
+    last point in `state`, and stores the trips' last points. `meters`,
+    `times` and `speed` are in trip/time order; `first` and `last` are the
+    positions of every trip's first and last row, and `trips` its id.
+    """
+    last_meters, last_time = state.lookup(trips)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        carried = (meters[first] - last_meters) / (times[first] - last_time)
+    # Only points strictly before this window's first one
+    earlier = last_time < times[first]
+    speed[first[earlier]] = carried[earlier]
+
+    state.update(trips, meters[last], times[last])
+    state.remember(np.repeat(trips, last - first + 1), meters, times)
+
+
+def correct_late(state, trips, meters, times):
+    """
+    Measures late points (arrays in row order) against the points `state`
+    remembers of their trips. Returns (speed, successors): the speed of every
+    late point since the point just before it, NaN when no remembered point
+    of its trip is older; and a DataFrame (trip_id, act_time, speed, after)
+    with the corrected speed of every remembered point that directly follows
+    a late one, `after` being the position of that late point. The late
+    points are then remembered too.
+    """
+    trips = _trip_ids(trips)
+    meters = np.asarray(meters, dtype=float)
+    times = np.asarray(times, dtype=float)
+    stored = state.recent(trips)
+
+    # The remembered points first, so a late point at the same ACT_TIME follows them
+    all_trips = np.r_[stored['trip_id'].to_numpy(), trips]
+    groups = TripGroups(all_trips, np.r_[stored['act_time'].to_numpy(), times])
+    ordered_trips = groups.sort(all_trips)
+    ordered_meters = groups.sort(np.r_[stored['meters'].to_numpy(), meters])
+    ordered_times = groups.sort(np.r_[stored['act_time'].to_numpy(), times])
+    rows = groups.sort(np.r_[np.full(len(stored), -1), np.arange(len(trips))])
+    late = rows >= 0
+
+    speed = np.full(len(rows), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed[1:] = np.diff(ordered_meters) / np.diff(ordered_times)
+    speed[groups.is_first] = np.nan
+
+    # Only trips with a remembered point before the late one are known well enough
+    previous_stored = np.maximum.accumulate(np.where(late, -1, groups.positions))
+    corrected = late & (previous_stored >= groups.first) & ~np.isnan(ordered_trips)
+    late_speed = np.full(len(trips), np.nan)
+    late_speed[rows[corrected]] = speed[corrected]
+
+    follows = np.flatnonzero(~late[1:] & corrected[:-1] & ~groups.is_first[1:]) + 1
+    successors = pd.DataFrame({
+        'trip_id': ordered_trips[follows],
+        'act_time': ordered_times[follows],
+        'speed': speed[follows],
+        'after': rows[follows - 1],
+    })
+
+    state.remember(trips, meters, times)
+    return late_speed, successors
+
+
+def update_speeds(table, conn, keys, data_iter):
+    """
+    pandas to_sql `method` that sets the speed of the rows already in the
+    table (matched on trip_id and tstamp) instead of inserting new ones.
+    Used for the points after a late one, see correct_late.
+    """
+    from sqlalchemy import bindparam
+
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    if not rows:
+        return 0
+    columns = table.table.c
+    statement = (
+        table.table.update()
+        .where(columns.trip_id == bindparam('match_trip_id'), columns.tstamp == bindparam('match_tstamp'))
+        .values(speed=bindparam('new_speed'))
+    )
+    parameters = [
+        {'match_trip_id': row['trip_id'], 'match_tstamp': row['tstamp'], 'new_speed': row['speed']}
+        for row in rows
+    ]
+    return conn.execute(statement, parameters).rowcount
+
+
+def _empty_state():
+    return pd.DataFrame(
+        {'meters': pd.Series(dtype=float), 'act_time': pd.Series(dtype=float), 'updated': pd.Series(dtype=float)},
+        index=pd.Index([], dtype=np.int64, name='trip_id'),
+    )
+
+
+def _empty_points():
+    return pd.DataFrame({
+        'trip_id': pd.Series(dtype=float),
+        'meters': pd.Series(dtype=float),
+        'act_time': pd.Series(dtype=float),
+    })
+
+
+def _trip_ids(trips):
+    return pd.to_numeric(pd.Series(np.asarray(trips)), errors='coerce').to_numpy(dtype=float)
+
+
+_default_state = None
+_default_lock = threading.Lock()
+
+
+def default_trip_state():
+    """The process-wide store snapshotted at STATE_PATH, loaded on first use."""
+    global _default_state
+    with _default_lock:
+        if _default_state is None:
+            _default_state = TripStateStore(STATE_PATH)
+        return _default_state
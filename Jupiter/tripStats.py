@@ -0,0 +1,198 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from breadcrumbRules import SPEED_LIMIT
+
+# Per-trip summaries for the trip_stats table (see SQL/trip_stats.sql).
+#
+# Trip distance, duration, average/max speed and bounding box used to need a
+# scan of every breadcrumb of the trip. Instead, the Transformer summarizes
+# each window per trip while it still has METERS, and the partial summaries
+# are merged (in memory within a window, and in the table by the upsert). All
+# of them are sums, minimums or maximums, so the order in which windows, or
+# late breadcrumbs, arrive doesn't change the result.
+#
+# `points` is a sum, so loading the same breadcrumbs twice (a replay retried
+# after a crash, or resumed from a checkpoint that missed the last file)
+# would count them twice. Every part merged into trip_stats is recorded in
+# trip_stats_parts under PART_KEY, and a part that is already there is
+# skipped. A re-load that splits the breadcrumbs into different windows than
+# the first load is not caught, just as the breadcrumb rows themselves are
+# inserted again.
+
+TRIP_STATS_TABLE = "trip_stats"
+TRIP_STATS_PARTS_TABLE = "trip_stats_parts"
+
+# What identifies one window's part of a trip
+PART_KEY = ('trip_id', 'first_tstamp', 'last_tstamp', 'points')
+
+# How two partial summaries of the same trip combine
+MERGE = {
+    'points': 'sum',
+    'first_tstamp': 'min',
+    'last_tstamp': 'max',
+    'min_meters': 'min',
+    'max_meters': 'max',
+    'max_speed': 'max',
+    'min_latitude': 'min',
+    'max_latitude': 'max',
+    'min_longitude': 'min',
+    'max_longitude': 'max',
+}
+
+# The same merge in SQL, for the rows already in trip_stats
+MERGE_SQL = {
+    'points': "trip_stats.points + EXCLUDED.points",
+    'first_tstamp': "LEAST(trip_stats.first_tstamp, EXCLUDED.first_tstamp)",
+    'last_tstamp': "GREATEST(trip_stats.last_tstamp, EXCLUDED.last_tstamp)",
+    'min_meters': "LEAST(trip_stats.min_meters, EXCLUDED.min_meters)",
+    'max_meters': "GREATEST(trip_stats.max_meters, EXCLUDED.max_meters)",
+    'max_speed': "GREATEST(trip_stats.max_speed, EXCLUDED.max_speed)",
+    'min_latitude': "LEAST(trip_stats.min_latitude, EXCLUDED.min_latitude)",
+    'max_latitude': "GREATEST(trip_stats.max_latitude, EXCLUDED.max_latitude)",
+    'min_longitude': "LEAST(trip_stats.min_longitude, EXCLUDED.min_longitude)",
+    'max_longitude': "GREATEST(trip_stats.max_longitude, EXCLUDED.max_longitude)",
+}
+_DISTANCE_SQL = (
+    "GREATEST(trip_stats.max_meters, EXCLUDED.max_meters) - LEAST(trip_stats.min_meters, EXCLUDED.min_meters)"
+)
+_DURATION_SQL = (
+    "EXTRACT(EPOCH FROM GREATEST(trip_stats.last_tstamp, EXCLUDED.last_tstamp)"
+    " - LEAST(trip_stats.first_tstamp, EXCLUDED.first_tstamp))"
+)
+MERGE_SQL['distance'] = _DISTANCE_SQL
+MERGE_SQL['duration'] = _DURATION_SQL
+MERGE_SQL['avg_speed'] = f"({_DISTANCE_SQL}) / NULLIF({_DURATION_SQL}, 0)"
+
+
+def summarize_trips(df):
+    """
+    One row per trip_id of a transformed window (renamed columns, METERS
+    still present) with the MERGE columns. Speeds above SPEED_LIMIT are
+    left out: validateSpeed replaces them with values between their valid
+    neighbours, so they can't raise the maximum.
+    """
+    speed = df['speed'].where(df['speed'] <= SPEED_LIMIT)
+    meters = pd.to_numeric(df['METERS'], errors='coerce')
+    grouped = df.assign(speed=speed, METERS=meters).groupby('trip_id', sort=False)
+    return grouped.agg(
+        points=('tstamp', 'size'),
+        first_tstamp=('tstamp', 'min'),
+        last_tstamp=('tstamp', 'max'),
+        min_meters=('METERS', 'min'),
+        max_meters=('METERS', 'max'),
+        max_speed=('speed', 'max'),
+        min_latitude=('latitude', 'min'),
+        max_latitude=('latitude', 'max'),
+        min_longitude=('longitude', 'min'),
+        max_longitude=('longitude', 'max'),
+    ).reset_index()
+
+
+def merge_summaries(summaries):
+    """Combines partial summaries (DataFrames from summarize_trips) into one row per trip."""
+    combined = pd.concat(summaries, ignore_index=True)
+    return combined.groupby('trip_id', sort=False).agg(MERGE).reset_index()
+
+
+def with_derived(summary):
+    """Adds the distance (m), duration (s) and avg_speed (m/s) columns of trip_stats."""
+    duration = (summary['last_tstamp'] - summary['first_tstamp']).dt.total_seconds()
+    distance = summary['max_meters'] - summary['min_meters']
+    return summary.assign(
+        distance=distance,
+        duration=duration,
+        avg_speed=distance / duration.replace(0, np.nan),
+    )
+
+
+class TripStats:
+    """
+    Accumulates the per-trip summaries added since the last drain();
+    stages.transform_batch uses one per window. Safe to share between threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = None
+
+    def add(self, summary):
+        # trip_stats.trip_id is an integer; a trip id that isn't a whole
+        # number was made up by a repair and isn't a trip. A part without
+        # timestamps can't be recorded in trip_stats_parts either.
+        trips = pd.to_numeric(summary['trip_id'], errors='coerce')
+        keep = ((trips == np.trunc(trips)) & summary['first_tstamp'].notna()).to_numpy()
+        if not keep.all():
+            print(f"Leaving {int((~keep).sum())} trips without a whole-number trip_id or timestamps out of trip_stats")
+            summary = summary[keep]
+        if summary.empty:
+            return
+        with self._lock:
+            if self._pending is None:
+                self._pending = summary
+            else:
+                self._pending = merge_summaries([self._pending, summary])
+
+    def drain(self):
+        """The trip_stats rows accumulated so far (None if there are none); starts over."""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        return None if pending is None else with_derived(pending)
+
+    def __len__(self):
+        with self._lock:
+            return 0 if self._pending is None else len(self._pending)
+
+
+def upsert_trip_stats(table, conn, keys, data_iter):
+    """
+    pandas to_sql `method` that inserts trip_stats rows in one statement and
+    merges them (MERGE_SQL) into the rows of trips already in the table.
+    Rows whose part (PART_KEY) was merged by an earlier load are skipped.
+    """
+    from sqlalchemy import literal_column
+    from sqlalchemy.dialects.postgresql import insert
+
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    if not rows:
+        return 0
+    new_parts = _record_parts(conn, rows)
+    rows = [row for row in rows if _part_key(row) in new_parts]
+    if not rows:
+        return 0
+
+    statement = insert(table.table).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=['trip_id'],
+        set_={column: literal_column(sql) for column, sql in MERGE_SQL.items() if column in keys},
+    )
+    return conn.execute(statement).rowcount
+
+
+def _record_parts(conn, rows):
+    """Records the parts of `rows` in trip_stats_parts; returns the keys that weren't there yet."""
+    from sqlalchemy import Column, DateTime, Integer, MetaData, Table
+    from sqlalchemy.dialects.postgresql import insert
+
+    parts = Table(
+        TRIP_STATS_PARTS_TABLE, MetaData(),
+        Column('trip_id', Integer), Column('first_tstamp', DateTime),
+        Column('last_tstamp', DateTime), Column('points', Integer),
+    )
+    statement = (
+        insert(parts)
+        .values([dict(zip(PART_KEY, _part_key(row))) for row in rows])
+        .on_conflict_do_nothing()
+        .returning(*(parts.c[column] for column in PART_KEY))
+    )
+    return {_part_key(dict(zip(PART_KEY, part))) for part in conn.execute(statement)}
+
+
+def _part_key(row):
+    return (
+        int(row['trip_id']),
+        pd.Timestamp(row['first_tstamp']).to_pydatetime(),
+        pd.Timestamp(row['last_tstamp']).to_pydatetime(),
+        int(row['points']),
+    )
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Makes the repository's `common` package importable when this directory's
+# scripts are run directly (python sub.py). Import it before any
+# `from common... import`.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -1,8 +1,24 @@
+import numpy as np
 import pandas as pd
 
+# The service_type and tripdir_type enums of the schema, in declaration order,
+# so a column's category codes are the enum's positions
+SERVICE_TYPE = pd.CategoricalDtype(['Weekday', 'Saturday', 'Sunday'])
+TRIPDIR_TYPE = pd.CategoricalDtype(['Out', 'Back'])
+
+# service_key letters -> SERVICE_TYPE code ('M' is MLK day, run as a weekday)
+SERVICE_KEY_CODES = {
+    'W': 0,
+    'M': 0,
+    'S': 1,
+    'U': 2,
+}
+
 class stopEventTransformer:
     def __init__(self, df: pd.DataFrame):
-        self.df = df.copy()
+        # Not copied: dropDuplicates builds a new frame before anything is
+        # changed, so the caller's frame is left as it is
+        self.df = df
         
     def transform(self):
         self.dropDuplicates()
@@ -20,38 +36,32 @@ class stopEventTransformer:
 
     def renameServiceKeyValues(self):
         '''
-        Renames service_key values to their respective DB schema enum
+        Maps service_key values to a SERVICE_TYPE categorical
         We expect the values: 'S', 'U', 'W', & special case of 'M' (MLK day)
         Convert these values to the following: "Weekday", "Saturday", "Sunday"
+        Anything else becomes missing. Only the distinct keys are looked at.
         '''
-        service_key_map = {
-            'S': 'Saturday',
-            'U': 'Sunday',
-            'W': 'Weekday',
-            'M': 'Weekday',
-        }
-
         # Check if 'service_key' column exists in the dataframe
         if 'service_key' in self.df.columns:
-            # Replace the values in the 'service_key' column
-            self.df['service_key'] = self.df['service_key'].replace(service_key_map)
+            codes, keys = pd.factorize(self.df['service_key'])
+            # factorize marks missing values with -1, which picks the trailing -1
+            lookup = np.array([SERVICE_KEY_CODES.get(str(key).strip(), -1) for key in keys] + [-1], dtype=np.int8)
+            self.df['service_key'] = pd.Categorical.from_codes(lookup[codes], dtype=SERVICE_TYPE)
         else:
             print("Error: 'service_key' column not found in dataframe")
 
     def renameDirectionValues(self):
         '''
-        Renames direction values to their respective DB schema enum
-        We expect the values: "0", "1"
+        Maps direction values to a TRIPDIR_TYPE categorical
+        We expect the values: 0, 1 (numbers or strings)
         Converts these values to the following: "Out", "Back"
+        The values are the category codes, so nothing is converted to strings.
         '''
-        direction_map = {
-            '0': 'Out',
-            '1': 'Back'
-        }
         # Check if 'direction' column exists in the dataframe
         if 'direction' in self.df.columns:
-            # Replace the values in the 'direction' column
-            self.df['direction'] = self.df['direction'].astype(str).replace(direction_map)
+            direction = pd.to_numeric(self.df['direction'], errors='coerce').to_numpy(dtype=float)
+            codes = np.where(np.isin(direction, (0, 1)), direction, -1).astype(np.int8)
+            self.df['direction'] = pd.Categorical.from_codes(codes, dtype=TRIPDIR_TYPE)
         else:
             print("Error: 'direction' column not found in dataframe")
     
@@ -1,16 +1,43 @@
 import pandas as pd
 
+import commonPath
+from common.validationReport import ValidationReport
+from common.validationEngine import ValidationEngine, NotNull, OneOf, Range, DROP
+
+REQUIRED_COLUMNS = ['trip_id', 'vehicle_number', 'route_number', 'direction', 'service_key']
+
+# service_key strings that mean the value is missing (compared stripped and lower-cased)
+MISSING_SERVICE_KEYS = ('nan', 'none', '')
+
+STOP_EVENT_RULES = [
+    Range('trip_id', 'trip_id', DROP, lower=0),
+    OneOf('direction', 'direction', DROP, values=(0, 1)),
+    # Missing vehicle and route numbers are kept
+    Range('vehicle_number', 'vehicle_number', DROP, lower=0, missing_ok=True),
+    Range('route_number', 'route_number', DROP, lower=0, missing_ok=True),
+    NotNull('service_key', 'service_key', DROP, placeholders=MISSING_SERVICE_KEYS),
+]
+
+STOP_EVENT_ENGINE = ValidationEngine(STOP_EVENT_RULES)
+
 class StopEventValidator:
     def __init__(self, df: pd.DataFrame):
         self.df = df
+        # Per-rule rows checked/dropped and wall time, see validationReport
+        self.report = ValidationReport('stop_event', 'validate', len(df))
 
     def validate(self):
+        """
+        Runs every rule in STOP_EVENT_RULES in one pass and removes the rows
+        that break any of them in a single filter.
+        """
         self.validate_columns_exist()
-        self.validate_trip_id()
-        self.validate_direction()
-        self.validate_vehicle_number()
-        self.validate_route_number()
-        self.validate_service_key()
+
+        self.df, counts = STOP_EVENT_ENGINE.run(self.df)
+        for name, rule_counts in counts.items():
+            self.report.add(name, rule_counts, self.report.rows_in)
+
+        self.report.finish(len(self.df))
         return self.df
 
     def validate_columns_exist(self):
@@ -25,78 +52,8 @@ class StopEventValidator:
         - 'service_key'
 
         Raises:
-            AssertionError: If any of the required columns are missing.
-        """
-        required_columns = {'trip_id', 'vehicle_number', 'route_number', 'direction', 'service_key'}
-        missing_columns = required_columns - set(self.df.columns)
-        assert not missing_columns, f"Missing required columns: {missing_columns}"
-
-    def validate_trip_id(self):
-        """
-        Validates that the 'trip_id' column contains no negative values.
-        Removes rows with negative 'trip_id' values.
-        """
-        try:
-            assert (self.df['trip_id'] >= 0).all(), "trip_id contains negative values"
-        except AssertionError:
-            self.df = self.df[self.df['trip_id'] >= 0].reset_index(drop=True)
-
-    def validate_direction(self):
-        """
-        Validates that all values in the 'direction' column are either 0 or 1.
-        Removes rows with invalid direction values.
-        """
-        try:
-            valid_directions = {0, 1}
-            invalid_mask = ~self.df['direction'].isin(valid_directions)
-            assert not invalid_mask.any(), f"Invalid direction values found: {set(self.df.loc[invalid_mask, 'direction'])}"
-        except AssertionError:
-            self.df = self.df[self.df['direction'].isin(valid_directions)].reset_index(drop=True)
-
-    def validate_route_number(self):
-        """
-        Validates that the 'route_number' column contains no negative values.
-        Removes rows with negative 'route_number' values.
-        """
-        try:
-            invalid_mask = self.df['route_number'].apply(lambda val: str(val).lstrip('-').isdigit() and int(val) < 0)
-            assert not invalid_mask.any(), f"route_number contains negative values: {self.df.loc[invalid_mask, 'route_number'].tolist()}"
-        except AssertionError:
-            self.df = self.df[~invalid_mask].reset_index(drop=True)
-
-    def validate_vehicle_number(self):
+            ValueError: If any of the required columns are missing.
         """
-        Validates that the 'vehicle_number' column contains no negative values.
-        Removes rows with negative 'vehicle_number' values.
-        """
-        try:
-            invalid_mask = self.df['vehicle_number'].apply(lambda val: str(val).lstrip('-').isdigit() and int(val) < 0)
-            assert not invalid_mask.any(), f"vehicle_number contains negative values: {self.df.loc[invalid_mask, 'vehicle_number'].tolist()}"
-        except AssertionError:
-            self.df = self.df[~invalid_mask].reset_index(drop=True)
-
-    def validate_service_key(self):
-        """
-        Removes rows whose 'service_key' is missing.
-
-        Missing is defined as:
-          • a true NaN / pd.NA
-          • the string 'nan', 'NaN', 'None', or '' (case-insensitive)
-        """
-        # A mask that is True for any kind of “missing” value
-        invalid_mask = (
-            self.df['service_key'].isna() |                     # real NaN / None
-            self.df['service_key']
-                .astype(str)
-                .str.strip()                                    # handle '  nan  '
-                .str.lower()
-                .isin({'nan', 'none', ''})                      # string placeholders
-        )
-
-        try:
-            assert not invalid_mask.any(), (
-                f"'service_key' contains missing values: "
-                f"{self.df.loc[invalid_mask, 'service_key'].tolist()}"
-            )
-        except AssertionError:
-            self.df = self.df[~invalid_mask].reset_index(drop=True)
\ No newline at end of file
+        missing_columns = [column for column in REQUIRED_COLUMNS if column not in self.df.columns]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {missing_columns}")
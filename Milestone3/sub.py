@@ -2,39 +2,36 @@ import json
 import os
 from datetime import datetime
 import pandas as pd
-from google.cloud import pubsub_v1, storage
+from google.cloud import pubsub_v1
 from concurrent.futures import TimeoutError
 from insert import DataFrameSQLInserter
 from stopEventValidation import StopEventValidator
 from stopEventTransformation import stopEventTransformer
 from ast import literal_eval 
+import commonPath
+from common.messageBuffer import MessageBuffer
+from common.uploader import BackgroundUploader, GCSBackend
+from common.validationReport import emit_report
 
-class GCSUploader:
-    def __init__(self, bucket_name):
-        self.storage_client = storage.Client()
-        self.bucket = self.storage_client.bucket(bucket_name)
-
-    def upload(self, source_file_path, destination_blob_name):
-        blob = self.bucket.blob(destination_blob_name)
-        blob.upload_from_filename(source_file_path)
-        print(f"File {source_file_path} uploaded to {destination_blob_name}.")
-        return f"gs://{self.bucket.name}/{destination_blob_name}"
-    
 class StopEventPipeline:
     def __init__(self, db_uri):
         self.db_uri = db_uri
 
-    def validate_load(self, raw_messages):
-        try:
-            parsed_messages = [literal_eval(msg) for msg in raw_messages]
-            df = pd.DataFrame(parsed_messages)
+    def decode(self, raw_messages):
+        parsed_messages = [literal_eval(msg) for msg in raw_messages]
+        df = pd.DataFrame(parsed_messages)
+
+        numeric_cols = ['trip_id', 'vehicle_number', 'route_number', 'direction']
+        for col in numeric_cols:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
 
-            numeric_cols = ['trip_id', 'vehicle_number', 'route_number', 'direction']
-            for col in numeric_cols:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df
 
+    def validate_load(self, df):
+        try:
             stopEvent = StopEventValidator(df)
             validated_df = stopEvent.validate()
+            emit_report(stopEvent.report)
             transformer = stopEventTransformer(validated_df)
             validated_transformed_df = transformer.transform()
 
@@ -49,18 +46,26 @@ class PubSubFetcher:
         self.project_id = project_id
         self.subscription_id = subscription_id
         self.timeout = timeout
-        self.uploader = GCSUploader(bucket_name)
+        self.uploader = BackgroundUploader(GCSBackend(bucket_name))
         self.pipeline = StopEventPipeline(db_uri)
-        self.messages = []
+        self.messages = MessageBuffer()
 
     def _callback(self, message: pubsub_v1.subscriber.message.Message):
         self.messages.append(message.data.decode('utf-8'))
         message.ack()
 
     def fetch_and_process(self):
+        self.uploader.start()
+        try:
+            self._fetch_loop()
+        finally:
+            # Let queued archives finish uploading before exiting
+            self.uploader.stop()
+
+    def _fetch_loop(self):
         while True:
             today_date = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-            filename = f"data-{today_date}.json"
+            filename = f"data-{today_date}.parquet"
             gcs_filename = f"breadcrumb_data/{filename}"
 
             subscriber = pubsub_v1.SubscriberClient()
@@ -75,26 +80,37 @@ class PubSubFetcher:
                     streaming_pull_future.cancel()
                     streaming_pull_future.result()
 
-            data_to_save = {
-                "message_count": len(self.messages),
-                "messages": self.messages
-            }
-
-            with open(filename, "w") as f:
-                json.dump(data_to_save, f, indent=2)
-
-            print(f"{len(self.messages)} messages saved to {filename}.")
-
-            # Upload to GCS
-            gcs_path = self.uploader.upload(filename, gcs_filename)
+            # Take the finished window; callbacks still in flight land in the next one
+            messages = self.messages.swap()
+
+            if not messages:
+                print("No messages received in this window.")
+                continue
+
+            # Archive the decoded window as Parquet (typed columns, zstd), sorted
+            # so the per-row-group statistics on vehicle and trip are selective
+            try:
+                df = self.pipeline.decode(messages)
+                df.sort_values(['vehicle_number', 'trip_id'], kind='stable').to_parquet(
+                    filename, engine="pyarrow", compression="zstd", index=False
+                )
+            except Exception as e:
+                # Keep the raw messages so the window can still be replayed
+                print(f"Error decoding window, archiving raw messages instead: {e}")
+                df = None
+                filename = f"data-{today_date}.json"
+                gcs_filename = f"breadcrumb_data/{filename}"
+                with open(filename, "w") as f:
+                    json.dump({"message_count": len(messages), "messages": messages}, f)
+
+            print(f"{len(messages)} messages saved to {filename}.")
+
+            # Upload to GCS in the background; the local file is deleted once uploaded
+            self.uploader.submit(filename, gcs_filename)
 
             # Validate & load to DB
-            self.pipeline.validate_load(self.messages)
-
-            # Clean up
-            os.remove(filename)
-            print(f"Deleted local file: {filename}")
-            self.messages.clear()
+            if df is not None:
+                self.pipeline.validate_load(df)
 
 if __name__ == "__main__":
     project_id = "data-engineering-455419"
@@ -0,0 +1,5 @@
+# Modules shared by the breadcrumb pipeline (Jupiter) and the stop-event
+# pipeline (Milestone3): the validation engine and its report, the per-trip
+# interpolation kernels, the double-buffered message list and the background
+# uploader. Both programs are run from their own directory, so they put the
+# repository root on sys.path through their commonPath module first.
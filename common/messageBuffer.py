@@ -0,0 +1,30 @@
+import threading
+
+# Collects messages from the Pub/Sub callback threads. Callbacks append to the
+# active buffer while the main loop swaps it out at a window boundary and gets
+# the finished window back as-is, with no copy and no risk of messages from the
+# next window being appended (or cleared) underneath it.
+
+class MessageBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = []
+
+    def append(self, message):
+        """Called from the subscriber's callback threads."""
+        with self._lock:
+            self._active.append(message)
+
+    def swap(self):
+        """
+        Atomically replaces the active buffer with an empty one and returns the
+        previous buffer. The returned list is no longer shared with the callbacks,
+        so the caller owns it and can decode it in place.
+        """
+        fresh = []
+        with self._lock:
+            batch, self._active = self._active, fresh
+        return batch
+
+    def __len__(self):
+        return len(self._active)
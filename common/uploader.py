@@ -0,0 +1,204 @@
+import os
+import queue
+import shutil
+import threading
+import time
+
+# Uploads sealed archive files in the background so the subscriber never waits
+# on GCS. Files are queued by the pipeline, uploaded by a small pool of worker
+# threads sharing one client, retried with backoff, and only deleted locally
+# once the upload succeeded.
+
+_STOP = object()
+
+
+class GCSBackend:
+    """
+    Uploads to a GCS bucket with a single storage client reused for every file.
+    Files larger than `parallel_threshold` are sent as parallel chunks.
+    """
+    def __init__(self, bucket_name, chunk_size=32 * 1024 * 1024, parallel_threshold=64 * 1024 * 1024, max_workers=4):
+        from google.cloud import storage
+
+        self.storage_client = storage.Client()
+        self.bucket = self.storage_client.bucket(bucket_name)
+        self.chunk_size = chunk_size
+        self.parallel_threshold = parallel_threshold
+        self.max_workers = max_workers
+
+    def upload_file(self, source_file_path, destination_blob_name):
+        blob = self.bucket.blob(destination_blob_name)
+
+        if os.path.getsize(source_file_path) >= self.parallel_threshold:
+            from google.cloud.storage import transfer_manager
+
+            transfer_manager.upload_chunks_concurrently(
+                source_file_path,
+                blob,
+                chunk_size=self.chunk_size,
+                max_workers=self.max_workers,
+            )
+        else:
+            blob.upload_from_filename(source_file_path)
+
+        return f"gs://{self.bucket.name}/{destination_blob_name}"
+
+    def upload_bytes(self, data, destination_blob_name):
+        blob = self.bucket.blob(destination_blob_name)
+        blob.upload_from_string(data)
+        return f"gs://{self.bucket.name}/{destination_blob_name}"
+
+    def download_file(self, blob_name, destination_file_path):
+        """Downloads a blob; returns False if it doesn't exist."""
+        blob = self.bucket.blob(blob_name)
+        if not blob.exists():
+            return False
+        os.makedirs(os.path.dirname(destination_file_path) or ".", exist_ok=True)
+        blob.download_to_filename(destination_file_path)
+        return True
+
+    def list(self, prefix):
+        return [blob.name for blob in self.storage_client.list_blobs(self.bucket, prefix=prefix)]
+
+
+class LocalBackend:
+    """
+    Stand-in for GCSBackend that "uploads" into a local directory.
+    Used for tests and benchmarks.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def upload_file(self, source_file_path, destination_blob_name):
+        destination = self._prepare(destination_blob_name)
+        shutil.copyfile(source_file_path, destination + ".tmp")
+        os.replace(destination + ".tmp", destination)
+        return destination
+
+    def upload_bytes(self, data, destination_blob_name):
+        destination = self._prepare(destination_blob_name)
+        with open(destination + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(destination + ".tmp", destination)
+        return destination
+
+    def download_file(self, blob_name, destination_file_path):
+        source = os.path.join(self.root, blob_name)
+        if not os.path.exists(source):
+            return False
+        os.makedirs(os.path.dirname(destination_file_path) or ".", exist_ok=True)
+        shutil.copyfile(source, destination_file_path)
+        return True
+
+    def list(self, prefix):
+        names = []
+        for directory, _, files in os.walk(os.path.join(self.root, prefix)):
+            for name in files:
+                names.append(os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/"))
+        return sorted(names)
+
+    def _prepare(self, destination_blob_name):
+        destination = os.path.join(self.root, destination_blob_name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        return destination
+
+
+class UploadJob:
+    def __init__(self, destination, source_file_path=None, data=None, delete_after=True, on_success=None):
+        self.destination = destination
+        self.source_file_path = source_file_path
+        self.data = data
+        self.delete_after = delete_after
+        self.on_success = on_success
+        self.attempts = 0
+
+
+class BackgroundUploader:
+    """
+    Queue of sealed files (or in-memory payloads) uploaded by worker threads.
+    """
+    def __init__(self, backend, workers=2, retries=3, backoff=2.0, maxsize=64):
+        self.backend = backend
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.jobs = queue.Queue(maxsize=maxsize)
+
+        self.uploaded = 0
+        self.failed = 0
+        self.bytes_uploaded = 0
+        self._stats_lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"uploader-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, source_file_path, destination, delete_after=True, on_success=None):
+        """
+        Queues a file for upload. The local file is removed only after it uploads.
+        `on_success(backend)` is called on the worker thread once the upload is done.
+        """
+        self.jobs.put(UploadJob(destination, source_file_path=source_file_path,
+                                delete_after=delete_after, on_success=on_success))
+
+    def submit_bytes(self, data, destination):
+        """Queues an in-memory payload for upload."""
+        self.jobs.put(UploadJob(destination, data=data))
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def stop(self):
+        """Waits for every queued upload to finish, then stops the workers."""
+        for _ in self._threads:
+            self.jobs.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is _STOP:
+                return
+            self._upload(job)
+
+    def _upload(self, job):
+        while True:
+            job.attempts += 1
+            try:
+                if job.data is not None:
+                    uri = self.backend.upload_bytes(job.data, job.destination)
+                    size = len(job.data)
+                else:
+                    size = os.path.getsize(job.source_file_path)
+                    uri = self.backend.upload_file(job.source_file_path, job.destination)
+                break
+            except Exception as e:
+                if job.attempts > self.retries:
+                    # Leave the local file in place so it can be uploaded by hand
+                    print(f"Giving up on upload of {job.destination} after {job.attempts} attempts: {e}")
+                    with self._stats_lock:
+                        self.failed += 1
+                    return
+                delay = self.backoff * 2 ** (job.attempts - 1)
+                print(f"Upload of {job.destination} failed ({e}), retrying in {delay:.0f}s...")
+                time.sleep(delay)
+
+        print(f"Uploaded {job.destination} to {uri}.")
+        with self._stats_lock:
+            self.uploaded += 1
+            self.bytes_uploaded += size
+
+        if job.on_success is not None:
+            try:
+                job.on_success(self.backend)
+            except Exception as e:
+                print(f"Error after uploading {job.destination}: {e}")
+
+        if job.source_file_path is not None and job.delete_after:
+            os.remove(job.source_file_path)
+            print(f"Deleted local file: {job.source_file_path}")
@@ -0,0 +1,499 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, ClassVar, Optional
+
+import numpy as np
+import pandas as pd
+
+from common.tripInterpolation import TripGroups
+
+# Single-pass, declarative validation.
+#
+# A validator is described as a list of rule specs (Range, OneOf, NotNull,
+# Check) saying which column is checked, what counts as invalid and what to
+# do with the offending rows. The engine evaluates all of them up front --
+# every column is read (and coerced to numbers) once and shared by all the
+# rules on it -- combines the drop masks into one filter, and then repairs
+# each column once, instead of each rule rescanning, re-indexing and
+# interpolating the frame on its own. Adding a rule (say an HDOP threshold)
+# is one more line in the list, not another pass over the frame.
+#
+# Most windows are clean. Before building masks, every rule that can is
+# checked from a summary of its column (min, max, nulls); if nothing is
+# invalid the drop/repair machinery is skipped entirely (the fast path).
+#
+# This module is shared by the breadcrumb (Jupiter) and stop-event
+# (Milestone3) validators; the rule lists live next to each validator.
+
+# What happens to rows that break a rule
+DROP = "drop"                # remove the row
+INTERPOLATE = "interpolate"  # blank the value and interpolate it linearly within its trip
+FILL = "fill"                # blank the value and copy the nearest valid value of its trip
+CLAMP = "clamp"              # move the value to the nearest bound (Range rules only)
+CHECK = "check"              # only count
+
+POLICIES = (DROP, INTERPOLATE, FILL, CLAMP, CHECK)
+
+
+@dataclass
+class Rule:
+    """
+    A named check on one column. If `convert` is given, the column is replaced
+    by convert(column) before any rule is evaluated.
+    """
+    name: str
+    column: str
+    policy: str = DROP
+    convert: Optional[Callable] = None
+
+    # Whether the rule wants the column coerced to a float array
+    numeric: ClassVar[bool] = False
+
+    def __post_init__(self):
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown policy {self.policy!r} for rule {self.name}")
+        if self.policy == CLAMP and not isinstance(self, Range):
+            raise ValueError(f"Only Range rules can clamp (rule {self.name})")
+
+    def requires(self):
+        return [self.column]
+
+    def invalid(self, values, df):
+        """Returns a boolean array, True for the rows breaking the rule."""
+        raise NotImplementedError
+
+    def clean(self, values, df):
+        """
+        Cheap check from a summary of the column: True if no row can break the
+        rule, False if some row does, None if the rule can't tell without its mask.
+        """
+        return None
+
+
+@dataclass
+class NotNull(Rule):
+    """Missing values (NaN/None/NaT, or one of the `placeholders` strings) are invalid."""
+    placeholders: tuple = ()
+
+    def invalid(self, values, df):
+        if not self.placeholders:
+            return pd.isna(values).to_numpy()
+
+        # Compare the distinct values only, stripped and lower-cased
+        codes, uniques = pd.factorize(values)
+        placeholder = (
+            pd.Series(uniques, dtype=object).astype(str).str.strip().str.lower()
+            .isin(self.placeholders).to_numpy()
+        )
+        # factorize marks real NaN / None with -1, which picks the trailing True
+        return np.append(placeholder, True)[codes]
+
+    def clean(self, values, df):
+        if self.placeholders:
+            return None
+        return not values.isna().any()
+
+
+@dataclass
+class Range(Rule):
+    """
+    Values outside [lower, upper] (None = unbounded) are invalid, as are
+    non-numeric or missing values unless `missing_ok`. With `integer`, values
+    with a fractional part are invalid too.
+    """
+    lower: Optional[float] = None
+    upper: Optional[float] = None
+    integer: bool = False
+    missing_ok: bool = False
+
+    numeric: ClassVar[bool] = True
+
+    def invalid(self, values, df):
+        missing = np.isnan(values)
+        mask = np.zeros(len(values), dtype=bool) if self.missing_ok else missing.copy()
+        if self.lower is not None:
+            mask |= values < self.lower
+        if self.upper is not None:
+            mask |= values > self.upper
+        if self.integer:
+            mask |= ~missing & (np.trunc(values) != values)
+        return mask
+
+    def clamp(self, values):
+        return values.clip(self.lower, self.upper)
+
+    def clean(self, values, df):
+        if len(values) == 0:
+            return True
+
+        # min/max propagate NaN, so one sweep each also finds missing values
+        low = values.min()
+        high = values.max()
+        if np.isnan(low):
+            if not self.missing_ok:
+                return False
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                return True
+            low = values.min()
+            high = values.max()
+
+        if self.lower is not None and low < self.lower:
+            return False
+        if self.upper is not None and high > self.upper:
+            return False
+        if self.integer:
+            return not bool((np.trunc(values) != values).any())
+        return True
+
+
+@dataclass
+class OneOf(Rule):
+    """Values not in `values` are invalid."""
+    values: tuple = ()
+
+    def invalid(self, values, df):
+        return ~values.isin(list(self.values)).to_numpy()
+
+
+@dataclass
+class Check(Rule):
+    """
+    Any other check: `func(df)` returns a boolean mask. `columns` lists every
+    column it reads (defaults to `column`). `summary(df)`, if given, is a cheaper
+    way to tell that no row breaks the check (see Rule.clean).
+    """
+    func: Optional[Callable] = None
+    columns: tuple = ()
+    summary: Optional[Callable] = None
+
+    def requires(self):
+        return list(self.columns) or [self.column]
+
+    def invalid(self, values, df):
+        return np.asarray(self.func(df), dtype=bool)
+
+    def clean(self, values, df):
+        if self.summary is None:
+            return None
+        return self.summary(df)
+
+
+class _Columns:
+    """Reads each column of df once per evaluation pass; numeric rules share one coercion."""
+    def __init__(self, df):
+        self.df = df
+        self.numeric = {}
+
+    def values(self, rule):
+        if not rule.numeric:
+            return self.df[rule.column]
+        if rule.column not in self.numeric:
+            self.numeric[rule.column] = pd.to_numeric(self.df[rule.column], errors='coerce').to_numpy(dtype=float)
+        return self.numeric[rule.column]
+
+
+class PandasFrames:
+    """
+    How the engine reads and changes a frame. ValidationEngine.run only goes
+    through these methods, so another DataFrame library runs the same rules,
+    policies and counts by overriding them (Jupiter/frameBackend.PolarsFrames).
+    values() always returns a pandas Series.
+    """
+    def wrap(self, df):
+        return df
+
+    def unwrap(self, frame, df):
+        """The validated frame as a pandas DataFrame; `df` is the frame run() was given."""
+        return frame.reset_index(drop=True)
+
+    def columns(self, frame):
+        return frame.columns
+
+    def height(self, frame):
+        return len(frame)
+
+    def values(self, frame, column):
+        return frame[column]
+
+    def assign(self, frame, columns):
+        return frame.assign(**columns)
+
+    def filter(self, frame, keep):
+        return frame.loc[keep].reset_index(drop=True)
+
+    def convert(self, frame, rules):
+        return self.assign(frame, {rule.column: rule.convert(self.values(frame, rule.column)) for rule in rules})
+
+    def scan(self, frame, rules, charge):
+        """
+        The fast path: returns (clean, masks). Rules that can are checked from
+        column summaries, the rest from their masks, which are returned so
+        they don't have to be built again if the frame isn't clean.
+        """
+        columns = _Columns(frame)
+        masks = {}
+        for rule in rules:
+            started = time.perf_counter()
+            verdict = rule.clean(columns.values(rule), frame)
+            if verdict is None:
+                masks[rule.name] = rule.invalid(columns.values(rule), frame)
+                verdict = not masks[rule.name].any()
+            charge([rule], started)
+            if not verdict:
+                return False, masks
+        return True, masks
+
+    def invalid(self, frame, rules, charge):
+        """Boolean arrays, True for the rows breaking each rule."""
+        columns = _Columns(frame)
+        masks = {}
+        for rule in rules:
+            started = time.perf_counter()
+            masks[rule.name] = rule.invalid(columns.values(rule), frame)
+            charge([rule], started)
+        return masks
+
+
+PANDAS_FRAMES = PandasFrames()
+
+
+class ValidationEngine:
+    """
+    Runs `rules` over a frame. Repairs are done within the groups of
+    `group_by`, ordered by `order_by`, when those columns are present.
+    The group_by column itself is repaired within the groups of `parent_by`
+    (e.g. a trip id from the same vehicle's breadcrumbs), or across the
+    window if there is no parent_by column.
+    """
+    def __init__(self, rules, group_by='EVENT_NO_TRIP', order_by='ACT_TIME', parent_by=None, fast_path=True):
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Rule names must be unique: {names}")
+        self.rules = rules
+        self.group_by = group_by
+        self.order_by = order_by
+        self.parent_by = parent_by
+        self.fast_path = fast_path
+
+        # How often the fast path fired, across every run of this engine
+        self.runs = 0
+        self.fast_path_runs = 0
+        self._stats_lock = threading.Lock()
+
+    def fast_path_rate(self):
+        """Fraction of runs that skipped the drop/repair machinery."""
+        with self._stats_lock:
+            return self.fast_path_runs / self.runs if self.runs else 0.0
+
+    def columns(self):
+        """Every column the rules read, plus group_by/order_by/parent_by, in rule order."""
+        columns = [col for rule in self.rules for col in rule.requires()]
+        grouping = [col for col in (self.group_by, self.order_by, self.parent_by) if col is not None]
+        return tuple(dict.fromkeys(columns + grouping))
+
+    def run(self, df, frames=None):
+        """
+        Validates and repairs df. Returns (validated_df, counts) where counts maps
+        each rule name to {'checked', 'invalid', 'dropped', 'repaired',
+        'unrepaired', 'seconds'}; rules whose columns are missing get
+        {'missing': True}. 'seconds' is the wall time spent on the rule, with
+        shared work (the drop filter, repairing a column) split between the
+        rules that needed it. 'fast_path' says whether the frame was found
+        clean from column summaries and passed through unchanged.
+
+        `frames` (a PandasFrames) is what reads and changes the frame;
+        validated_df is always a pandas DataFrame.
+        """
+        frames = frames or PANDAS_FRAMES
+        frame = frames.wrap(df)
+        present = set(frames.columns(frame))
+
+        counts = {}
+        active = []
+        for rule in self.rules:
+            if all(col in present for col in rule.requires()):
+                active.append(rule)
+            else:
+                counts[rule.name] = {'missing': True}
+
+        checked = frames.height(frame)
+        seconds = {rule.name: 0.0 for rule in active}
+
+        def charge(rules, started):
+            if rules:
+                share = (time.perf_counter() - started) / len(rules)
+                for rule in rules:
+                    seconds[rule.name] += share
+
+        # e.g. OPD_DATE strings become datetime64 here and stay that way
+        # through the Transformer, so they are never formatted back and re-parsed
+        converted = [rule for rule in active if rule.convert is not None]
+        if converted:
+            started = time.perf_counter()
+            frame = frames.convert(frame, converted)
+            charge(converted, started)
+
+        masks = {}
+
+        # 0. Fast path: rules that can are checked from column summaries, the
+        # rest from their masks (kept for step 1 if the frame isn't clean)
+        if self.fast_path:
+            clean, masks = frames.scan(frame, active, charge)
+            self._count_run(clean)
+            if clean:
+                for rule in active:
+                    counts[rule.name] = {
+                        'checked': checked, 'invalid': 0, 'dropped': 0, 'repaired': 0,
+                        'unrepaired': 0, 'seconds': seconds[rule.name], 'fast_path': True,
+                    }
+                return frames.unwrap(frame, df), counts
+        else:
+            self._count_run(False)
+
+        # 1. Evaluate every rule against the original frame
+        masks.update(frames.invalid(frame, [rule for rule in active if rule.name not in masks], charge))
+
+        drop = np.zeros(checked, dtype=bool)
+        for rule in active:
+            if rule.policy == DROP:
+                drop |= masks[rule.name]
+
+        # 2. One filter for all the drop rules
+        started = time.perf_counter()
+        keep = ~drop
+        if drop.any():
+            frame = frames.filter(frame, keep)
+        charge([rule for rule in active if rule.policy == DROP and masks[rule.name].any()], started)
+        height = frames.height(frame)
+
+        # 3. Clamp, then blank every value to be repaired and repair each column once
+        repairs = {}
+        for rule in active:
+            invalid = masks[rule.name]
+            counts[rule.name] = {
+                'checked': checked,
+                'invalid': int(invalid.sum()),
+                'dropped': int(invalid.sum()) if rule.policy == DROP else int((invalid & drop).sum()),
+                'repaired': 0,
+                # Check-only rules leave every offending row in place
+                'unrepaired': int(invalid[keep].sum()) if rule.policy == CHECK else 0,
+            }
+            remaining = invalid[keep]
+            if not remaining.any():
+                continue
+
+            if rule.policy == CLAMP:
+                started = time.perf_counter()
+                values = pd.to_numeric(frames.values(frame, rule.column), errors='coerce')
+                frame = frames.assign(frame, {rule.column: values.mask(remaining, rule.clamp(values))})
+                charge([rule], started)
+            elif rule.policy in (INTERPOLATE, FILL):
+                blank, _, rules = repairs.get(rule.column, (np.zeros(height, dtype=bool), rule.policy, []))
+                repairs[rule.column] = (blank | remaining, rule.policy, rules + [rule])
+
+        # The trip column itself can't be repaired within trips, so it is
+        # repaired within its parent groups first and the trips are grouped after
+        if self.group_by in repairs:
+            started = time.perf_counter()
+            blank, policy, rules = repairs.pop(self.group_by)
+            values = frames.values(frame, self.group_by).mask(blank)
+            groups = self._groups(frames, frame, self.parent_by)
+            if policy == INTERPOLATE:
+                values = groups.interpolate(values)
+            else:
+                values = groups.fill(values)
+            frame = frames.assign(frame, {self.group_by: values})
+            charge(rules, started)
+
+        if repairs:
+            started = time.perf_counter()
+            groups = self._groups(frames, frame, self.group_by)
+            charge([rule for _, _, rules in repairs.values() for rule in rules], started)
+
+            for column, (blank, policy, rules) in repairs.items():
+                started = time.perf_counter()
+                values = frames.values(frame, column).mask(blank)
+                if policy == INTERPOLATE:
+                    values = groups.interpolate(values)
+                else:
+                    values = groups.fill(values)
+                frame = frames.assign(frame, {column: values})
+                charge(rules, started)
+
+        # 4. Count what was fixed and what couldn't be
+        repaired = [rule for rule in active
+                    if rule.policy in (INTERPOLATE, FILL, CLAMP) and masks[rule.name][keep].any()]
+        still_invalid = frames.invalid(frame, repaired, charge)
+        for rule in repaired:
+            remaining = masks[rule.name][keep]
+            counts[rule.name]['unrepaired'] = int((still_invalid[rule.name] & remaining).sum())
+            counts[rule.name]['repaired'] = int(remaining.sum()) - counts[rule.name]['unrepaired']
+
+        for rule in active:
+            counts[rule.name]['seconds'] = seconds[rule.name]
+            counts[rule.name]['fast_path'] = False
+
+        return frames.unwrap(frame, df), counts
+
+    def _count_run(self, fast):
+        with self._stats_lock:
+            self.runs += 1
+            self.fast_path_runs += int(fast)
+
+    def run_chunks(self, chunks, frames=None):
+        """
+        Validates a stream of frames ordered by `group_by` (and by `order_by`
+        within each group), e.g. the row groups of an archive file, so a large
+        backfill never has to be validated in one piece. Yields
+        (validated_df, counts) per chunk, like run().
+
+        The rows of the last group of every chunk may continue in the next
+        chunk, so they are held back and validated with it. Every yielded
+        frame therefore holds whole groups, and interpolation, fills and
+        per-trip checks at chunk edges see the same neighbours as in one pass.
+        """
+        carry = None
+        for chunk in chunks:
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+                carry = None
+            if chunk.empty:
+                continue
+
+            if self.group_by in chunk.columns:
+                tail = _last_group_start(chunk[self.group_by])
+                if tail == 0:
+                    # The whole chunk is one group so far
+                    carry = chunk
+                    continue
+                carry = chunk.iloc[tail:]
+                chunk = chunk.iloc[:tail]
+
+            yield self.run(chunk, frames)
+
+        if carry is not None:
+            yield self.run(carry, frames)
+
+    def _groups(self, frames, frame, group_by):
+        """Sorts the window once by group and time; without the group column it is one group."""
+        present = set(frames.columns(frame))
+        if group_by is not None and group_by in present:
+            trips = frames.values(frame, group_by)
+        else:
+            trips = np.zeros(frames.height(frame))
+        times = frames.values(frame, self.order_by) if self.order_by in present else None
+        return TripGroups(trips, times)
+
+
+def _last_group_start(groups):
+    """Position of the first row of the trailing run of equal values (missing values count as equal)."""
+    values = groups.to_numpy()
+    last = values[-1]
+    if pd.isna(last):
+        same = pd.isna(values)
+    else:
+        same = values == last
+    different = np.flatnonzero(~same)
+    return int(different[-1]) + 1 if len(different) else 0
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Structured outcome of a validation run.
+#
+# Instead of printing a few lines per rule, validators record what every rule
+# did (rows checked, invalid, dropped, repaired, left unrepaired) and how long
+# it took into a ValidationReport. The report is appended as one JSON line to
+# VALIDATION_REPORT (validation-report.ndjson by default), so rule cost and
+# data quality can be tracked across windows.
+
+REPORT_PATH = os.getenv("VALIDATION_REPORT", "validation-report.ndjson")
+
+_write_lock = threading.Lock()
+
+
+class RuleResult:
+    """
+    Counts for one rule. `repaired` covers interpolated and filled values.
+    """
+    def __init__(self, checked=0):
+        self.checked = checked
+        self.invalid = 0
+        self.dropped = 0
+        self.repaired = 0
+        self.unrepaired = 0
+        self.missing = False
+        self.seconds = 0.0
+
+    def to_dict(self):
+        if self.missing:
+            return {'missing': True, 'seconds': round(self.seconds, 6)}
+        return {
+            'checked': self.checked,
+            'invalid': self.invalid,
+            'dropped': self.dropped,
+            'repaired': self.repaired,
+            'unrepaired': self.unrepaired,
+            'seconds': round(self.seconds, 6),
+        }
+
+
+class ValidationReport:
+    """
+    Per-rule results of validating one DataFrame.
+    `dataset` is e.g. 'breadcrumb' or 'stop_event', `stage` says which pass it was.
+    """
+    def __init__(self, dataset, stage, rows):
+        self.dataset = dataset
+        self.stage = stage
+        self.rows_in = rows
+        self.rows_out = rows
+        self.rules = {}
+        # Whether the engine passed every frame through its clean fast path
+        self.fast_path = None
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    @contextmanager
+    def rule(self, name, checked):
+        """
+        Times the body and yields the rule's RuleResult for it to fill in.
+        `checked` is the number of rows the rule looks at:
+
+            with report.rule('meters', len(df)) as result:
+                result.invalid = ...
+        """
+        result = self.rules.setdefault(name, RuleResult(checked))
+        started = time.perf_counter()
+        try:
+            yield result
+        finally:
+            result.seconds += time.perf_counter() - started
+
+    def add(self, name, counts, checked, seconds=0.0):
+        """
+        Records a rule from a counts dict like the ones ValidationEngine.run
+        returns. Calling it again for the same rule (e.g. per chunk) adds up.
+        """
+        result = self.rules.setdefault(name, RuleResult())
+        result.checked += checked
+        result.missing = bool(counts.get('missing'))
+        result.invalid += counts.get('invalid', 0)
+        result.dropped += counts.get('dropped', 0)
+        result.repaired += counts.get('repaired', 0)
+        result.unrepaired += counts.get('unrepaired', 0)
+        result.seconds += counts.get('seconds', seconds)
+        if 'fast_path' in counts:
+            self.fast_path = counts['fast_path'] and self.fast_path is not False
+        return result
+
+    def finish(self, rows_out):
+        self.rows_out = rows_out
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    def passed(self):
+        """True if every invalid value was dropped or repaired."""
+        return all(not result.unrepaired for result in self.rules.values())
+
+    def rows_dropped(self):
+        return self.rows_in - self.rows_out
+
+    def to_dict(self):
+        return {
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'dataset': self.dataset,
+            'stage': self.stage,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rows_dropped': self.rows_dropped(),
+            'rows_repaired': sum(result.repaired for result in self.rules.values()),
+            'seconds': round(self.seconds, 6),
+            'fast_path': self.fast_path,
+            'rules': {name: result.to_dict() for name, result in self.rules.items()},
+        }
+
+
+def emit_report(report, path=None):
+    """Appends the report as a JSON line. path=None uses REPORT_PATH."""
+    line = json.dumps(report.to_dict()) + "\n"
+    with _write_lock:
+        with open(path or REPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(line)
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# The Jupiter modules import each other by their bare names (they're run as
+# scripts from their directory), and `common` lives at the repository root.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "Jupiter")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Milestone3 goes last: its insert, main, pub and commonPath share their
+# names with Jupiter modules, which must win for the Jupiter tests
+MILESTONE3 = os.path.join(ROOT, "Milestone3")
+if MILESTONE3 not in sys.path:
+    sys.path.append(MILESTONE3)
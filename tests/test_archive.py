@@ -0,0 +1,30 @@
+import os
+
+from archive import RollingArchiveWriter, read_archive, PARTIAL_SUFFIX
+
+
+def test_segments_are_sealed_at_rotation(tmp_path):
+    writer = RollingArchiveWriter(str(tmp_path), fsync_interval=0.0)
+    writer.open("first")
+    writer.write("a")
+    writer.write("b")
+    # Still being written: only the .part file exists
+    assert os.listdir(tmp_path) == [f"data-first.ndjson.gz{PARTIAL_SUFFIX}"]
+
+    path, count = writer.rotate("second")
+    assert count == 2
+    assert read_archive(path) == ["a", "b"]
+
+    writer.write("c")
+    path, count = writer.seal()
+    assert (os.path.basename(path), count) == ("data-second.ndjson.gz", 1)
+    assert read_archive(path) == ["c"]
+    assert writer.seal() == (None, 0)
+
+
+def test_a_message_between_windows_opens_a_segment(tmp_path):
+    writer = RollingArchiveWriter(str(tmp_path))
+    writer.write("late")
+    path, count = writer.seal()
+    assert count == 1
+    assert read_archive(path) == ["late"]
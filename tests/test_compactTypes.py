@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from benchmark import make_window
+from compactTypes import CompactStats, compact_frame, widen_for_insert
+
+
+def test_round_trip_restores_values_and_dtypes():
+    df = make_window(rows=5_000, trips=50)
+    stats = CompactStats()
+    compacted = compact_frame(df, stats=stats)
+
+    assert compacted['EVENT_NO_TRIP'].dtype == np.int32
+    # Whole-number floats are downcast too
+    assert compacted['GPS_SATELLITES'].dtype == np.int8
+    assert isinstance(compacted['VEHICLE_ID'].dtype, pd.CategoricalDtype)
+    assert stats.saved_per_million() > 0
+
+    widened = widen_for_insert(compacted)
+    expected = df.assign(GPS_HDOP=df['GPS_HDOP'].astype(np.float32))
+    pdt.assert_frame_equal(widened, expected, check_dtype=False)
+    for column in ['EVENT_NO_TRIP', 'EVENT_NO_STOP', 'VEHICLE_ID', 'METERS', 'ACT_TIME']:
+        assert widened[column].dtype == np.int64
+
+
+def test_float32_coordinates_round_back_exactly():
+    df = pd.DataFrame({'GPS_LATITUDE': [45.123456, 45.5], 'GPS_LONGITUDE': [-122.654321, -122.6]})
+    compacted = compact_frame(df, coordinate_decimals=5, stats=None)
+    assert compacted['GPS_LATITUDE'].dtype == np.float32
+
+    widened = widen_for_insert(compacted, coordinate_decimals=5)
+    np.testing.assert_array_equal(widened['GPS_LATITUDE'], [45.12346, 45.5])
+    np.testing.assert_array_equal(widened['GPS_LONGITUDE'], [-122.65432, -122.6])
+
+
+def test_columns_that_would_lose_values_are_left_alone():
+    df = pd.DataFrame({'METERS': [1.0, np.nan, 2.5], 'EVENT_NO_TRIP': [1.0, 2.0, 3.0]})
+    compacted = compact_frame(df, stats=None)
+    assert compacted['METERS'].dtype == np.float64
+    assert pd.api.types.is_integer_dtype(compacted['EVENT_NO_TRIP'])
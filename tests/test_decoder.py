@@ -0,0 +1,40 @@
+import pandas.testing as pdt
+
+from benchmark import make_messages, make_window
+from decoder import decode_messages, FIELDS
+from stages import DECODE_COLUMNS
+
+
+def test_projected_decode_matches_the_full_decode():
+    messages = make_messages(make_window(rows=2_000, trips=20))
+    full = decode_messages(messages)
+    projected = decode_messages(messages, DECODE_COLUMNS)
+
+    assert list(full.columns) == FIELDS
+    assert list(projected.columns) == list(DECODE_COLUMNS)
+    pdt.assert_frame_equal(projected, full[list(DECODE_COLUMNS)])
+
+    # Coordinates parse to the same float Python does
+    longitudes = [float(msg.split('GPS_LONGITUDE: ')[1].split(',')[0]) for msg in messages]
+    assert full['GPS_LONGITUDE'].tolist() == longitudes
+
+
+def test_messages_out_of_field_order_are_still_decoded():
+    messages = [
+        'EVENT_NO_TRIP: 1, EVENT_NO_STOP: 2, OPD_DATE: 08MAY2025:00:00:00, VEHICLE_ID: 3, METERS: 4, '
+        'ACT_TIME: 5, GPS_LONGITUDE: -122.5, GPS_LATITUDE: 45.5, GPS_SATELLITES: 6.0, GPS_HDOP: None',
+        'VEHICLE_ID: 7, EVENT_NO_TRIP: 8, EVENT_NO_STOP: 9, OPD_DATE: 08MAY2025:00:00:00, METERS: 10, '
+        'ACT_TIME: 11, GPS_LONGITUDE: -122.6, GPS_LATITUDE: 45.6',
+        'EVENT_NO_TRIP: 12, EVENT_NO_STOP: 13, OPD_DATE: 08MAY2025:00:00:00, VEHICLE_ID: 3, METERS: 14, '
+        'ACT_TIME: 15, GPS_LONGITUDE: -122.7, GPS_LATITUDE: 45.7, GPS_SATELLITES: 6.0, GPS_HDOP: 0.5',
+    ]
+    df = decode_messages(messages, DECODE_COLUMNS)
+
+    assert df['EVENT_NO_TRIP'].tolist() == [1, 8, 12]
+    assert df['VEHICLE_ID'].tolist() == [3, 7, 3]
+    assert df['ACT_TIME'].tolist() == [5, 11, 15]
+    assert df['GPS_LATITUDE'].tolist() == [45.5, 45.6, 45.7]
+    assert df['EVENT_NO_TRIP'].dtype == 'int64'
+
+    full = decode_messages(messages)
+    assert full['GPS_HDOP'].isna().tolist() == [True, True, False]
@@ -0,0 +1,96 @@
+import pandas as pd
+
+from eventTime import EventTimeBuffer
+
+
+def window(trips, times):
+    return pd.DataFrame({'EVENT_NO_TRIP': trips, 'ACT_TIME': times})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_points_are_held_until_the_watermark_passes_them():
+    buffer = EventTimeBuffer(lateness=10, idle=600, clock=Clock())
+
+    # Watermark of trip 1 is 20 - 10 = 10
+    release = buffer.push(window([1, 1, 1], [20, 5, 10]))
+    assert release.on_time['ACT_TIME'].tolist() == [5, 10]
+    assert buffer.pending_rows() == 1
+
+    # Out of order within the trip; released in time order
+    release = buffer.push(window([1, 1], [40, 15]))
+    assert release.on_time['ACT_TIME'].tolist() == [15, 20]
+    assert len(release.late) == 0
+    assert buffer.pending_rows() == 1
+
+
+def test_points_behind_what_was_released_are_late():
+    buffer = EventTimeBuffer(lateness=0, idle=600, clock=Clock())
+    buffer.push(window([1, 1], [10, 20]))
+
+    release = buffer.push(window([1, 2], [15, 5]))
+    assert release.late['ACT_TIME'].tolist() == [15]
+    assert release.on_time['EVENT_NO_TRIP'].tolist() == [2]
+    assert buffer.late_rows == 1
+
+
+def test_idle_trips_are_released_in_full():
+    clock = Clock()
+    buffer = EventTimeBuffer(lateness=60, idle=100, clock=clock)
+    assert len(buffer.push(window([1, 1], [10, 20]))) == 0
+
+    clock.now = 200
+    release = buffer.push(window([2], [5]))
+    assert release.on_time['EVENT_NO_TRIP'].tolist() == [1, 1]
+    assert release.on_time['ACT_TIME'].tolist() == [10, 20]
+
+
+def test_flush_releases_everything_in_trip_time_order():
+    buffer = EventTimeBuffer(lateness=60, idle=600, clock=Clock())
+    buffer.push(window([2, 1, 2, 1], [30, 20, 10, 40]))
+
+    release = buffer.flush()
+    assert release.on_time['EVENT_NO_TRIP'].tolist() == [1, 1, 2, 2]
+    assert release.on_time['ACT_TIME'].tolist() == [20, 40, 10, 30]
+    assert buffer.pending_rows() == 0
+
+
+def breadcrumbs(times, meters):
+    rows = len(times)
+    return pd.DataFrame({
+        'EVENT_NO_TRIP': [1] * rows,
+        'VEHICLE_ID': [10] * rows,
+        'GPS_LATITUDE': [45.5] * rows,
+        'GPS_LONGITUDE': [-122.6] * rows,
+        'METERS': meters,
+        'ACT_TIME': times,
+        'OPD_DATE': pd.to_datetime(['2025-05-08'] * rows),
+    })
+
+
+def test_a_late_point_corrects_the_loaded_point_after_it(tmp_path, monkeypatch):
+    import common.validationReport
+    import stages
+    from tripState import TripStateStore
+
+    monkeypatch.setattr(common.validationReport, 'REPORT_PATH', str(tmp_path / "report.ndjson"))
+    db_uri = f"sqlite:///{tmp_path / 'breadcrumbs.db'}"
+    buffer = EventTimeBuffer(lateness=0, idle=600, clock=Clock())
+    state = TripStateStore(clock=Clock())
+
+    loaded = stages.transform_release(buffer.push(breadcrumbs([10, 20], [0, 100])), state)
+    assert stages.load_batch(loaded, db_uri) == 2
+
+    # 20 m in the 5 s after the point at 10 s, then 80 m in the 5 s to the one at 20 s
+    late = stages.transform_release(buffer.push(breadcrumbs([15], [20])), state)
+    assert late['speed'].tolist() == [4.0]
+    assert stages.load_batch(late, db_uri) == 1
+
+    stored = pd.read_sql("SELECT tstamp, speed FROM breadcrumb ORDER BY tstamp", db_uri)
+    assert stored['speed'].tolist() == [10.0, 4.0, 16.0]
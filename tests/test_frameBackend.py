@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+pytest.importorskip("polars")
+
+from benchmark import make_window
+from frameBackend import frame_backend
+from tripState import TripStateStore
+
+
+def dirty_window():
+    df = make_window(rows=20_000, trips=200, dirty=0.05, seed=1)
+    rng = np.random.default_rng(1)
+    rows = len(df)
+    df.loc[rng.random(rows) < 0.01, 'GPS_LATITUDE'] = np.nan
+    df.loc[rng.random(rows) < 0.01, 'OPD_DATE'] = 'not a date'
+    df.loc[rng.random(rows) < 0.01, 'EVENT_NO_STOP'] = -5
+    df.loc[rng.random(rows) < 0.005, 'EVENT_NO_TRIP'] = -1
+    return df
+
+
+def rule_counts(report):
+    return {name: {key: value for key, value in counts.items() if key != 'seconds'}
+            for name, counts in report.to_dict()['rules'].items()}
+
+
+@pytest.mark.parametrize("make", [dirty_window, lambda: make_window(rows=5_000, trips=50, dirty=0)])
+def test_polars_validate_matches_pandas(make):
+    df = make()
+    expected, expected_report = frame_backend('pandas').validate(df.copy())
+    actual, actual_report = frame_backend('polars').validate(df.copy())
+
+    pdt.assert_frame_equal(actual, expected, check_dtype=False)
+    assert rule_counts(actual_report) == rule_counts(expected_report)
+
+
+def test_polars_transform_matches_pandas():
+    validated, _ = frame_backend('pandas').validate(dirty_window())
+    first, second = validated.iloc[:10_000], validated.iloc[10_000:]
+
+    results = {}
+    for name in ('pandas', 'polars'):
+        backend = frame_backend(name)
+        state = TripStateStore()
+        frames = [backend.transform(window.copy(), state)[0] for window in (first, second)]
+        results[name] = pd.concat(frames, ignore_index=True)
+
+    pdt.assert_frame_equal(results['polars'], results['pandas'], check_dtype=False)
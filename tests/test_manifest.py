@@ -0,0 +1,53 @@
+import json
+
+from common.uploader import LocalBackend
+from manifest import ArchiveManifest, manifest_path
+
+
+def entry(name, min_time, max_time, vehicles, service_date="2025-05-08"):
+    return {
+        'path': f"breadcrumb_data/service_date={service_date}/hour=13/{name}.parquet",
+        'local_path': f"/tmp/{name}.parquet",
+        'service_date': service_date,
+        'rows': 10,
+        'min_time': min_time,
+        'max_time': max_time,
+        'vehicles': vehicles,
+        'sha256': name,
+    }
+
+
+def bucket_entries(bucket, service_date="2025-05-08"):
+    with open(bucket / manifest_path(service_date), encoding="utf-8") as f:
+        return [json.loads(line)['sha256'] for line in f]
+
+
+def test_publish_keeps_the_entries_already_in_the_bucket(tmp_path):
+    bucket = LocalBackend(str(tmp_path / "bucket"))
+    first_host = ArchiveManifest(str(tmp_path / "host1"))
+    first_host.publish(entry("a", "2025-05-08T13:00:00", "2025-05-08T13:30:00", [3001]), bucket)
+
+    # A new host starts with an empty working directory
+    second_host = ArchiveManifest(str(tmp_path / "host2"))
+    second_host.publish(entry("b", "2025-05-08T13:30:00", "2025-05-08T14:00:00", [3002]), bucket)
+    second_host.publish(entry("c", "2025-05-08T14:00:00", "2025-05-08T14:30:00", [3003]), bucket)
+
+    assert bucket_entries(tmp_path / "bucket") == ["a", "b", "c"]
+    assert [e['sha256'] for e in second_host.entries()] == ["a", "b", "c"]
+    # local_path is only meaningful on the host that wrote the file
+    assert 'local_path' not in second_host.entries()[0]
+
+
+def test_select_returns_only_overlapping_files(tmp_path):
+    manifest = ArchiveManifest(str(tmp_path))
+    manifest.add(entry("a", "2025-05-08T13:00:00", "2025-05-08T13:30:00", [3001, 3002]))
+    manifest.add(entry("b", "2025-05-08T13:30:00", "2025-05-08T14:00:00", [3002]))
+    manifest.add(entry("c", "2025-05-09T08:00:00", "2025-05-09T09:00:00", [3001], service_date="2025-05-09"))
+
+    def selected(**kwargs):
+        return [e['sha256'] for e in manifest.select(**kwargs)]
+
+    assert selected() == ["a", "b", "c"]
+    assert selected(start="2025-05-08T13:45:00", end="2025-05-08T15:00:00") == ["b"]
+    assert selected(vehicles=[3001]) == ["a", "c"]
+    assert selected(start="2025-05-09T00:00:00", vehicles=[3002]) == []
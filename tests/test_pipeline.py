@@ -0,0 +1,73 @@
+import threading
+
+from pipeline import Pipeline, Stage
+
+
+def test_items_pass_through_every_stage_in_order():
+    out = []
+    pipeline = Pipeline([
+        Stage("double", lambda x: [v * 2 for v in x]),
+        Stage("collect", out.append),
+    ])
+    pipeline.start()
+    for i in range(5):
+        pipeline.submit([i, i])
+    pipeline.stop()
+
+    assert out == [[2 * i, 2 * i] for i in range(5)]
+    report = {line["stage"]: line for line in pipeline.report()}
+    assert report["double"]["items"] == 5
+    assert report["double"]["rows"] == 10
+
+
+def test_none_drops_the_item():
+    out = []
+    pipeline = Pipeline([
+        Stage("filter", lambda x: x if x % 2 else None),
+        Stage("collect", out.append),
+    ])
+    pipeline.start()
+    for i in range(6):
+        pipeline.submit(i)
+    pipeline.stop()
+
+    assert out == [1, 3, 5]
+
+
+def test_errors_are_counted_and_the_stage_keeps_going():
+    out = []
+    pipeline = Pipeline([
+        Stage("invert", lambda x: 1 / x),
+        Stage("collect", out.append),
+    ])
+    pipeline.start()
+    for i in (1, 0, 2):
+        pipeline.submit(i)
+    pipeline.stop()
+
+    assert out == [1.0, 0.5]
+    assert pipeline.report()[0]["errors"] == 1
+
+
+def test_a_full_queue_blocks_the_producer():
+    release = threading.Event()
+    pipeline = Pipeline([Stage("slow", lambda x: release.wait(), maxsize=1)])
+    pipeline.start()
+
+    submitted = []
+
+    def produce():
+        for i in range(4):
+            pipeline.submit(i)
+            submitted.append(i)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    producer.join(timeout=0.2)
+    # One item in the worker, one in the queue; the third put waits
+    assert len(submitted) < 4
+
+    release.set()
+    producer.join()
+    pipeline.stop()
+    assert pipeline.report()[0]["max_queue_depth"] == 1
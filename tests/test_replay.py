@@ -0,0 +1,22 @@
+from replay import Checkpoint
+
+
+def test_checkpoint_survives_a_restart(tmp_path):
+    path = str(tmp_path / "checkpoint.ndjson")
+    entry = {'path': "breadcrumb_data/a.parquet", 'sha256': "abc"}
+    rewritten = {'path': "breadcrumb_data/a.parquet", 'sha256': "def"}
+
+    checkpoint = Checkpoint(path)
+    assert not checkpoint.is_done(entry)
+    checkpoint.mark(entry, rows=10)
+
+    restarted = Checkpoint(path)
+    assert restarted.is_done(entry)
+    # A file rewritten under the same name is loaded again
+    assert not restarted.is_done(rewritten)
+
+
+def test_checkpoint_without_a_path_is_in_memory(tmp_path):
+    checkpoint = Checkpoint(None)
+    checkpoint.mark({'path': "a", 'sha256': "x"}, rows=1)
+    assert checkpoint.is_done({'path': "a", 'sha256': "x"})
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from stopEventTransformation import stopEventTransformer, SERVICE_TYPE, TRIPDIR_TYPE
+
+
+def stop_events():
+    return pd.DataFrame({
+        'trip_id': [1, 2, 3, 4, 5, 6, 6],
+        'vehicle_number': [10] * 7,
+        'route_number': [20] * 7,
+        'direction': [0, 1, '1', '0', 2, None, 0],
+        'service_key': ['W', 'M', 'S', ' U ', 'X', None, 'W'],
+    })
+
+
+def test_service_key_and_direction_become_enum_categoricals():
+    df = stop_events()
+    transformed = stopEventTransformer(df).transform()
+
+    assert transformed['trip_id'].tolist() == [1, 2, 3, 4, 5, 6]
+    assert transformed['service_key'].dtype == SERVICE_TYPE
+    assert transformed['direction'].dtype == TRIPDIR_TYPE
+    # 'M' (MLK day) runs as a weekday; unknown and missing keys become missing
+    assert transformed['service_key'].tolist()[:4] == ['Weekday', 'Weekday', 'Saturday', 'Sunday']
+    assert transformed['service_key'].isna().tolist()[4:] == [True, True]
+    # 0/1 as numbers or strings; anything else becomes missing
+    assert transformed['direction'].tolist()[:4] == ['Out', 'Back', 'Back', 'Out']
+    assert transformed['direction'].isna().tolist()[4:] == [True, True]
+    # The codes are the enum positions
+    assert transformed['direction'].cat.codes.tolist()[:4] == [0, 1, 1, 0]
+
+    assert 'vehicle_id' in transformed.columns and 'route_id' in transformed.columns
+    # The caller's frame is left as it was
+    pd.testing.assert_frame_equal(df, stop_events())
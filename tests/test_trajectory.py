@@ -0,0 +1,60 @@
+import numpy as np
+
+from trajectory import simplify, _segment_distance, METERS_PER_DEGREE
+
+
+def douglas_peucker(x, y, tolerance):
+    """Textbook recursive Douglas-Peucker on one trip; returns the kept mask."""
+    keep = np.zeros(len(x), dtype=bool)
+    keep[[0, -1]] = True
+
+    def split(first, last):
+        if last - first < 2:
+            return
+        inside = np.arange(first + 1, last)
+        distance = _segment_distance(x, y, inside, np.full(len(inside), first), np.full(len(inside), last))
+        worst = int(np.argmax(distance))
+        if distance[worst] > tolerance:
+            keep[inside[worst]] = True
+            split(first, inside[worst])
+            split(inside[worst], last)
+
+    split(0, len(x) - 1)
+    return keep
+
+
+def test_straight_line_keeps_only_its_ends():
+    latitude = np.linspace(45.5, 45.51, 20)
+    longitude = np.full(20, -122.6)
+    keep, deviation = simplify(np.zeros(20), np.arange(20), latitude, longitude, tolerance=1.0)
+
+    assert np.flatnonzero(keep).tolist() == [0, 19]
+    assert np.isnan(deviation[keep]).all()
+    assert (deviation[~keep] < 1e-6).all()
+
+
+def test_matches_recursive_douglas_peucker_per_trip():
+    rng = np.random.default_rng(3)
+    trips = np.repeat([1, 2, 3], [40, 25, 60])
+    times = np.concatenate([np.arange(40), np.arange(25), np.arange(60)]) * 5
+    latitude = 45.5 + np.cumsum(rng.normal(0, 1e-4, len(trips)))
+    longitude = -122.6 + np.cumsum(rng.normal(0, 1e-4, len(trips)))
+
+    # Shuffled like a window interleaving several trips
+    order = rng.permutation(len(trips))
+    keep, _ = simplify(trips[order], times[order], latitude[order], longitude[order], tolerance=5.0)
+    keep = keep[np.argsort(order)]
+
+    scale = np.cos(np.radians(latitude.mean()))
+    x = longitude * METERS_PER_DEGREE * scale
+    y = latitude * METERS_PER_DEGREE
+    for trip in (1, 2, 3):
+        rows = trips == trip
+        np.testing.assert_array_equal(keep[rows], douglas_peucker(x[rows], y[rows], 5.0))
+
+
+def test_missing_coordinates_are_kept_with_their_neighbours():
+    latitude = np.linspace(45.5, 45.51, 10)
+    latitude[5] = np.nan
+    keep, _ = simplify(np.zeros(10), np.arange(10), latitude, np.full(10, -122.6), tolerance=1.0)
+    assert keep[[0, 4, 5, 6, 9]].all()
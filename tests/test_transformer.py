@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from benchmark import legacy_speed, make_window
+from transformer import Transformer
+
+
+def speed(df):
+    transformer = Transformer(df.copy())
+    transformer.createSpeed()
+    return transformer.get_dataframe()['speed']
+
+
+def test_create_speed_matches_the_per_trip_version():
+    # Trips interleaved in ACT_TIME order, as a window arrives
+    df = make_window(rows=5_000, trips=100, dirty=0, seed=3)
+    df = df.sort_values('ACT_TIME', kind='stable')
+    assert not df['EVENT_NO_TRIP'].is_monotonic_increasing
+
+    np.testing.assert_allclose(speed(df).to_numpy(), legacy_speed(df).reindex(df.index).to_numpy())
+
+
+def test_create_speed_orders_each_trip_by_act_time():
+    # The per-trip version took rows in arrival order; createSpeed sorts every
+    # trip by ACT_TIME first, so it matches the per-trip version on sorted rows
+    df = make_window(rows=2_000, trips=20, dirty=0, seed=4)
+    shuffled = df.sample(frac=1, random_state=4)
+    ordered = shuffled.sort_values(['EVENT_NO_TRIP', 'ACT_TIME'])
+
+    expected = legacy_speed(ordered).reindex(shuffled.index)
+    np.testing.assert_allclose(speed(shuffled).to_numpy(), expected.to_numpy())
+
+
+def test_single_row_trips_have_no_speed():
+    df = pd.DataFrame({'EVENT_NO_TRIP': [1, 2, 2], 'METERS': [0, 0, 50], 'ACT_TIME': [10, 10, 20]})
+    assert speed(df).tolist()[1:] == [5.0, 5.0]
+    assert np.isnan(speed(df).iloc[0])
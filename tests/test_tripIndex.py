@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from dataValidation import Validation
+from stages import record_trips
+from tripIndex import TripVehicleIndex
+
+
+def test_check_compares_with_recorded_trips_only_after_record(tmp_path):
+    index = TripVehicleIndex(str(tmp_path / "index.sqlite"))
+
+    # Within one batch a new trip is compared to its first row
+    assert index.check([1, 1, 2], [10, 11, 20]).tolist() == [False, True, False]
+    assert len(index) == 0
+
+    index.record([1, 2], [10, 20])
+    assert index.check([1, 2, 3], [12, 20, 30]).tolist() == [True, False, False]
+    assert len(index) == 2
+
+
+def test_bad_trip_ids_are_neither_checked_nor_recorded(tmp_path):
+    index = TripVehicleIndex(str(tmp_path / "index.sqlite"))
+    trips = [5.5, -1, np.nan, 5]
+    vehicles = [99, 99, 99, 10]
+
+    assert index.check(trips, vehicles).tolist() == [False, False, False, False]
+    index.record(trips, vehicles)
+    assert len(index) == 1
+    # 5.5 was not truncated to 5 and recorded with vehicle 99
+    assert index.check([5], [10]).tolist() == [False]
+
+
+def test_repaired_window_is_recorded(tmp_path):
+    index = TripVehicleIndex(str(tmp_path / "index.sqlite"))
+    df = pd.DataFrame({
+        'EVENT_NO_TRIP': [7, 7.5, 7, 8],
+        'EVENT_NO_STOP': [1, 1, 1, 2],
+        'OPD_DATE': ['08MAY2025:00:00:00'] * 4,
+        'VEHICLE_ID': [10, 10, 10, 20],
+        'METERS': [0, 10, 20, 0],
+        'ACT_TIME': [1, 2, 3, 1],
+        'GPS_LATITUDE': [45.5] * 4,
+        'GPS_LONGITUDE': [-122.6] * 4,
+    })
+    validator = Validation(df, index)
+    validator.validateBeforeTransform()
+    assert validator.rule_counts['trip_vehicle_history']['invalid'] == 0
+
+    record_trips(index, validator.get_dataframe())
+    assert len(index) == 2
+    assert index.check([7, 8], [10, 21]).tolist() == [False, True]
+
+
+def test_validate_batch_fills_the_index_it_is_given(tmp_path, monkeypatch):
+    import common.validationReport
+    import stages
+    from benchmark import make_window
+
+    monkeypatch.setattr(common.validationReport, 'REPORT_PATH', str(tmp_path / "report.ndjson"))
+    # The default index would be opened here if the given one were ignored
+    monkeypatch.chdir(tmp_path)
+
+    index = TripVehicleIndex(str(tmp_path / "index.sqlite"))
+    assert len(index) == 0
+    stages.validate_batch(make_window(rows=1_000, trips=20, dirty=0), index)
+
+    assert len(index) == 20
+    assert not (tmp_path / "trip-index.sqlite").exists()
+    assert stages.fast_path_rate() > 0
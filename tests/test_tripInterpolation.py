@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from common.tripInterpolation import TripGroups
+
+
+def test_interpolation_stays_inside_each_trip():
+    # Two trips interleaved in arrival order, times out of order
+    trips = [1, 2, 1, 2, 1, 2]
+    times = [30, 1, 10, 2, 20, 3]
+    values = [3.0, 100.0, 1.0, np.nan, np.nan, 300.0]
+
+    repaired = TripGroups(trips, times).interpolate(values)
+    # Trip 1 in time order is 1, NaN, 3; trip 2 is 100, NaN, 300
+    np.testing.assert_array_equal(repaired, [3.0, 100.0, 1.0, 200.0, 2.0, 300.0])
+
+
+def test_edges_take_the_nearest_value_and_empty_trips_stay_missing():
+    trips = [1, 1, 1, 2, 2]
+    values = [np.nan, 5.0, np.nan, np.nan, np.nan]
+
+    repaired = TripGroups(trips, [1, 2, 3, 1, 2]).interpolate(values)
+    np.testing.assert_array_equal(repaired, [5.0, 5.0, 5.0, np.nan, np.nan])
+
+
+def test_matches_groupby_interpolate():
+    rng = np.random.default_rng(7)
+    rows = 2_000
+    df = pd.DataFrame({
+        'trip': rng.integers(0, 50, rows),
+        'time': rng.permutation(rows),
+        'value': rng.random(rows),
+    })
+    df.loc[rng.random(rows) < 0.2, 'value'] = np.nan
+
+    expected = (
+        df.sort_values(['trip', 'time'])
+        .groupby('trip', group_keys=False)['value']
+        .apply(lambda values: values.interpolate(limit_direction='both'))
+        .sort_index()
+        .to_numpy()
+    )
+    np.testing.assert_allclose(TripGroups(df['trip'], df['time']).interpolate(df['value']), expected)
+
+
+def test_fill_copies_the_previous_value_for_any_dtype():
+    trips = [1, 1, 1, np.nan, np.nan]
+    dates = pd.to_datetime(['2025-05-08', None, '2025-05-09', None, '2025-05-10']).to_numpy()
+
+    filled = TripGroups(trips, [1, 2, 3, 1, 2]).fill(dates)
+    # Rows without a trip are a group of their own
+    assert list(pd.DatetimeIndex(filled).strftime('%m-%d')) == ['05-08', '05-08', '05-09', '05-10', '05-10']
@@ -0,0 +1,56 @@
+import numpy as np
+
+from tripState import TripStateStore, correct_late
+
+
+def test_update_keeps_the_latest_point_per_trip():
+    state = TripStateStore(clock=lambda: 0.0)
+    state.update([1, 2], [100, 200], [50, 60])
+    state.update([1, 2], [90, 250], [40, 70])
+
+    meters, act_time = state.lookup([1, 2, 3])
+    np.testing.assert_array_equal(meters, [100, 250, np.nan])
+    np.testing.assert_array_equal(act_time, [50, 70, np.nan])
+
+
+def test_fractional_trip_ids_are_not_stored():
+    state = TripStateStore(clock=lambda: 0.0)
+    # 7.5 would truncate to 7 and collide with the real trip 7
+    state.update([7, 7.5], [100, 300], [50, 80])
+
+    assert len(state) == 1
+    meters, act_time = state.lookup([7])
+    np.testing.assert_array_equal(meters, [100])
+    np.testing.assert_array_equal(act_time, [50])
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "state.csv")
+    state = TripStateStore(path, clock=lambda: 0.0)
+    state.update([1, 2], [100, 200], [50, 60])
+    state.snapshot()
+
+    restored = TripStateStore(path, clock=lambda: 0.0)
+    restored.load()
+    np.testing.assert_array_equal(restored.lookup([1, 2])[0], [100, 200])
+
+
+def test_late_points_are_measured_from_the_remembered_points():
+    state = TripStateStore(clock=lambda: 0.0)
+    state.remember([1, 1, 1], [0, 100, 300], [10, 20, 30])
+
+    # Trip 2 has no point before its late one
+    speed, successors = correct_late(state, [1, 2], [20, 50], [15, 5])
+    np.testing.assert_array_equal(speed, [4.0, np.nan])
+    assert successors[['trip_id', 'act_time', 'speed', 'after']].values.tolist() == [[1, 20, 16.0, 0]]
+    # The late point is remembered for the next one
+    assert 15 in state.recent([1])['act_time'].tolist()
+
+
+def test_points_behind_the_history_are_let_go():
+    state = TripStateStore(clock=lambda: 0.0, history=60)
+    state.remember([1, 1, 2], [0, 100, 0], [10, 50, 10])
+    state.remember([1], [500], [100])
+
+    assert state.recent([1])['act_time'].tolist() == [50, 100]
+    assert state.recent([2])['act_time'].tolist() == [10]
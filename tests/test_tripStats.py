@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from tripStats import TripStats, merge_summaries, _part_key
+
+
+def summary(trip_id, points, first, last, max_speed):
+    return pd.DataFrame({
+        'trip_id': [trip_id],
+        'points': [points],
+        'first_tstamp': [pd.Timestamp(first)],
+        'last_tstamp': [pd.Timestamp(last)],
+        'min_meters': [0.0],
+        'max_meters': [100.0 * points],
+        'max_speed': [max_speed],
+        'min_latitude': [45.5],
+        'max_latitude': [45.6],
+        'min_longitude': [-122.7],
+        'max_longitude': [-122.6],
+    })
+
+
+def test_merge_is_order_independent():
+    parts = [
+        summary(1, 10, '2025-05-08 08:00', '2025-05-08 08:10', 12.0),
+        summary(1, 5, '2025-05-08 07:55', '2025-05-08 08:20', 15.0),
+        summary(2, 3, '2025-05-08 09:00', '2025-05-08 09:01', 4.0),
+    ]
+    forward = merge_summaries(parts).sort_values('trip_id').reset_index(drop=True)
+    backward = merge_summaries(parts[::-1]).sort_values('trip_id').reset_index(drop=True)
+    pd.testing.assert_frame_equal(forward, backward)
+
+    trip = forward.iloc[0]
+    assert trip['points'] == 15
+    assert trip['first_tstamp'] == pd.Timestamp('2025-05-08 07:55')
+    assert trip['last_tstamp'] == pd.Timestamp('2025-05-08 08:20')
+    assert trip['max_speed'] == 15.0
+
+
+def test_fractional_trip_ids_are_left_out():
+    stats = TripStats()
+    stats.add(summary(1.0, 10, '2025-05-08 08:00', '2025-05-08 08:10', 12.0))
+    stats.add(summary(1.5, 4, '2025-05-08 08:00', '2025-05-08 08:10', 12.0))
+
+    rows = stats.drain()
+    assert rows['trip_id'].tolist() == [1.0]
+    assert rows['duration'].tolist() == [600.0]
+    assert stats.drain() is None
+
+
+def test_part_key_matches_what_postgres_returns():
+    row = summary(1, 10, '2025-05-08 08:00', '2025-05-08 08:10', 12.0).iloc[0].to_dict()
+    returned = {'trip_id': 1, 'points': 10,
+                'first_tstamp': pd.Timestamp('2025-05-08 08:00').to_pydatetime(),
+                'last_tstamp': pd.Timestamp('2025-05-08 08:10').to_pydatetime()}
+    assert _part_key(row) == _part_key(returned)
+
+
+def test_each_window_loads_its_own_summary_with_its_breadcrumbs(tmp_path, monkeypatch):
+    import common.validationReport
+    import stages
+    from benchmark import make_window
+
+    monkeypatch.setattr(common.validationReport, 'REPORT_PATH', str(tmp_path / "report.ndjson"))
+    db_uri = f"sqlite:///{tmp_path / 'breadcrumbs.db'}"
+    window = make_window(rows=400, trips=4, dirty=0)
+    first = window[window['EVENT_NO_TRIP'] == window['EVENT_NO_TRIP'].min()]
+
+    # Both windows are transformed before either is loaded, as in the pipeline
+    loaded = stages.transform_batch(first.copy(), summarize=True)
+    pending = stages.transform_batch(window.drop(first.index), summarize=True)
+    assert loaded.attrs[stages.TRIP_SUMMARY]['trip_id'].tolist() == loaded['trip_id'].unique().tolist()
+
+    upserted = []
+    def record(table, conn, keys, data_iter):
+        upserted.extend(row[keys.index('trip_id')] for row in data_iter)
+    monkeypatch.setattr(stages, 'upsert_trip_stats', record)
+    assert stages.load_batch(loaded, db_uri) == len(first)
+    assert sorted(upserted) == sorted(loaded['trip_id'].unique())
+
+    # A failed upsert takes the window's breadcrumbs with it
+    def fail(table, conn, keys, data_iter):
+        raise RuntimeError("upsert failed")
+    monkeypatch.setattr(stages, 'upsert_trip_stats', fail)
+    with pytest.raises(RuntimeError):
+        stages.load_batch(pending, db_uri)
+    stored = pd.read_sql("SELECT COUNT(*) AS rows FROM breadcrumb", db_uri)
+    assert stored['rows'].tolist() == [len(first)]
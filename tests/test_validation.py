@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from dataValidation import Validation
+
+
+def window():
+    # Two vehicles whose breadcrumbs interleave in time, one bad trip id each
+    return pd.DataFrame({
+        'EVENT_NO_TRIP': [100, 200, -1, 200, 100, 200.5],
+        'EVENT_NO_STOP': [1, 1, 2, -3, 3, 3],
+        'OPD_DATE': ['08MAY2025:00:00:00'] * 6,
+        'VEHICLE_ID': [10, 20, 10, 20, 10, 20],
+        'METERS': [0, 0, 50, 40, 100, 80],
+        'ACT_TIME': [1, 1, 2, 2, 3, 3],
+        'GPS_LATITUDE': [45.5] * 6,
+        'GPS_LONGITUDE': [-122.6] * 6,
+    })
+
+
+def test_bad_trip_ids_take_the_vehicles_trip():
+    validator = Validation(window())
+    assert validator.validateBeforeTransform()
+
+    df = validator.get_dataframe()
+    assert df['EVENT_NO_TRIP'].tolist() == [100, 200, 100, 200, 100, 200]
+    assert df['EVENT_NO_STOP'].tolist() == [1, 1, 2, 2, 3, 3]
+    assert validator.rule_counts['event_no_trip']['repaired'] == 2
+
+
+def test_id_methods_match_the_engine():
+    engine = Validation(window())
+    engine.validateBeforeTransform()
+
+    methods = Validation(window())
+    assert methods.validateEventNoTrip()
+    assert methods.validateEventNoStop()
+
+    columns = ['EVENT_NO_TRIP', 'EVENT_NO_STOP']
+    np.testing.assert_array_equal(
+        methods.get_dataframe()[columns].to_numpy(float),
+        engine.get_dataframe()[columns].to_numpy(float),
+    )
@@ -0,0 +1,54 @@
+import pandas as pd
+import pandas.testing as pdt
+
+from benchmark import make_window
+from breadcrumbRules import BREADCRUMB_RULES
+from common.validationEngine import ValidationEngine
+
+
+def engine():
+    return ValidationEngine(BREADCRUMB_RULES, parent_by='VEHICLE_ID')
+
+
+def test_run_chunks_carries_a_group_across_chunks():
+    df = make_window(rows=2_000, trips=20, dirty=0, seed=2)
+    df = df.sort_values(['EVENT_NO_TRIP', 'ACT_TIME'], ignore_index=True)
+
+    # Split inside a trip, with bad latitudes on both sides of the edge that
+    # can only be interpolated from the other chunk
+    edge = 1_000
+    trip = df.loc[edge, 'EVENT_NO_TRIP']
+    assert df.loc[edge - 2, 'EVENT_NO_TRIP'] == trip == df.loc[edge + 1, 'EVENT_NO_TRIP']
+    df.loc[[edge - 1, edge], 'GPS_LATITUDE'] = 50.0
+
+    expected, _ = engine().run(df.copy())
+    parts = [validated for validated, _ in engine().run_chunks([df.iloc[:edge], df.iloc[edge:]])]
+
+    # The split trip is validated whole, in one of the yielded frames
+    rows = [int((part['EVENT_NO_TRIP'] == trip).sum()) for part in parts]
+    assert sorted(rows)[-1] == int((df['EVENT_NO_TRIP'] == trip).sum())
+    assert rows.count(0) == len(parts) - 1
+    pdt.assert_frame_equal(pd.concat(parts, ignore_index=True), expected.reset_index(drop=True))
+    assert expected.loc[[edge - 1, edge], 'GPS_LATITUDE'].between(45, 46).all()
+
+
+def test_fast_path_reports_clean_and_dirty_windows():
+    validator = engine()
+    clean = make_window(rows=1_000, trips=10, dirty=0)
+
+    validated, counts = validator.run(clean.copy())
+    assert all(rule_counts['fast_path'] for rule_counts in counts.values())
+    assert all(rule_counts['invalid'] == 0 for rule_counts in counts.values())
+    # The same result as the full pass
+    full, _ = ValidationEngine(BREADCRUMB_RULES, parent_by='VEHICLE_ID', fast_path=False).run(clean.copy())
+    pdt.assert_frame_equal(validated, full)
+
+    dirty = clean.copy()
+    dirty.loc[5, 'GPS_LATITUDE'] = 50.0
+    _, counts = validator.run(dirty)
+    assert not any(rule_counts['fast_path'] for rule_counts in counts.values())
+    assert counts['latitude_range']['invalid'] == 1
+    assert counts['latitude_range']['repaired'] == 1
+
+    assert (validator.runs, validator.fast_path_runs) == (2, 1)
+    assert validator.fast_path_rate() == 0.5